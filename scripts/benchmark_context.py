@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""提示词上下文基准测试脚本
+
+对同一批问题分别用普通 top_k 检索和 MMR + 合并相邻文档块构建上下文，
+报告每个问题节省的 token 数（均值/p50/合计）、合并的相邻文档块段数和检索耗时。
+token 数使用 MODEL_NAME（或 TOKENIZER_MODEL）对应的本地分词器统计。
+
+用法:
+    python scripts/benchmark_context.py                          # 问题取自向量数据库中随机文档块的首句
+    python scripts/benchmark_context.py --queries questions.txt  # 每行一个问题
+    python scripts/benchmark_context.py --top-k 5 --lambda 0.5 --candidates 30
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.config import settings
+from src.core.retrieval import RetrievalPipeline
+from src.services.tokenizers import create_tokenizer
+from src.services.vector_store import VectorStore
+
+_SENTENCE_RE = re.compile(r'[^。！？!?.\n]{8,}')
+
+
+def load_queries(args, vector_store: VectorStore):
+    """读取问题文件，未指定时取随机文档块的首句作为问题"""
+    if args.queries:
+        lines = Path(args.queries).read_text(encoding='utf-8').splitlines()
+        return [line.strip() for line in lines if line.strip()]
+
+    contents = [item['content'] for item in vector_store.backend.iterate()]
+    rng = np.random.default_rng(args.seed)
+    queries = []
+    for i in rng.permutation(len(contents)):
+        match = _SENTENCE_RE.search(contents[i])
+        if match:
+            queries.append(match.group().strip())
+        if len(queries) >= args.num_queries:
+            break
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MMR 与相邻文档块合并的上下文 token 基准测试")
+    parser.add_argument('--collection', default='documents', help='集合名称')
+    parser.add_argument('--queries', help='问题文件，每行一个问题')
+    parser.add_argument('--num-queries', type=int, default=50, help='未指定问题文件时生成的问题数量')
+    parser.add_argument('--top-k', type=int, default=settings.top_k, help='每个问题使用的文档块数')
+    parser.add_argument('--lambda', dest='mmr_lambda', type=float, default=settings.mmr_lambda,
+                        help='MMR 相关性权重')
+    parser.add_argument('--candidates', type=int, default=settings.mmr_candidates, help='MMR 候选数量')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    args = parser.parse_args()
+
+    vector_store = VectorStore(settings.vector_db_path, collection_name=args.collection)
+    queries = load_queries(args, vector_store)
+    if not queries:
+        print(f"集合 {args.collection} 中没有文档块，请先运行 python run.py load")
+        return
+
+    baseline = RetrievalPipeline(vector_store, top_k=args.top_k)
+    diverse = RetrievalPipeline(vector_store, top_k=args.top_k, mmr_lambda=args.mmr_lambda,
+                                mmr_candidates=args.candidates, merge_adjacent=True)
+
+    tokenizer = create_tokenizer()
+    print(f"{len(queries)} 个问题，top_k={args.top_k}，λ={args.mmr_lambda}，候选={args.candidates}，"
+          f"分词器={tokenizer.get_name()}\n")
+    baseline_results = baseline.run_batch(queries)
+    diverse_results = diverse.run_batch(queries)
+
+    baseline_tokens = np.array([tokenizer.count(result.build_context()) for result in baseline_results])
+    diverse_tokens = np.array([tokenizer.count(result.build_context()) for result in diverse_results])
+    saved = baseline_tokens - diverse_tokens
+    merged = sum(len(chunk.metadata.get('chunk_ids', [])) > 1
+                 for result in diverse_results for chunk in result)
+
+    print(f"{'':<20}{'基线':>12}{'MMR+合并':>12}")
+    print("-" * 44)
+    print(f"{'上下文 token 均值':<20}{baseline_tokens.mean():>12.1f}{diverse_tokens.mean():>12.1f}")
+    print(f"{'上下文 token p50':<20}{np.percentile(baseline_tokens, 50):>12.1f}"
+          f"{np.percentile(diverse_tokens, 50):>12.1f}")
+    print(f"{'检索耗时 (ms)':<20}{baseline_results[0].timings['total_ms']:>12.1f}"
+          f"{diverse_results[0].timings['total_ms']:>12.1f}")
+    print()
+    print(f"每个问题节省 token: 均值 {saved.mean():.1f}，p50 {np.percentile(saved, 50):.1f}，"
+          f"合计 {int(saved.sum())}（{saved.sum() / max(1, baseline_tokens.sum()):.1%}）")
+    print(f"合并的相邻文档块段数: {merged}")
+
+
+if __name__ == "__main__":
+    main()
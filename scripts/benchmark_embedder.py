@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""嵌入运行时基准测试脚本
+
+对比 torch（SentenceTransformer）、ONNX fp32 和 ONNX int8 的批量吞吐（句/秒）、
+单查询延迟（p50/p95）以及与 torch 参考模型的余弦一致性。ONNX 模型需先运行
+python run.py export-onnx 导出。指定 --workers 时额外测试多进程并行编码的吞吐扩展性。
+
+用法:
+    python scripts/benchmark_embedder.py
+    python scripts/benchmark_embedder.py --threads 1 2 4 --sentences 1000
+    python scripts/benchmark_embedder.py --workers 1 2 4 8 --sentences 5000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.config import settings
+from src.services.embedders import (OnnxEmbedder, SentenceTransformerEmbedder, onnx_model_dir,
+                                    verify_agreement)
+from src.services.parallel_embedding import ParallelEncoder
+from src.services.vector_backends import VectorBackendFactory
+
+SAMPLE_SENTENCES = [
+    "什么是检索增强生成？",
+    "向量数据库按照余弦相似度返回最相近的文档块。",
+    "How do I configure the embedding runtime?",
+    "文档加载后按固定长度切分，相邻块之间保留重叠部分以免截断句子。",
+    "The service exposes /query, /upload and /status endpoints.",
+    "模型量化把权重从 float32 压缩为 int8，通常只带来很小的精度损失。",
+]
+
+
+def load_sentences(count: int):
+    """优先使用向量数据库中的文档块，不足时用示例句子补齐"""
+    sentences = []
+    try:
+        backend = VectorBackendFactory.create_backend(settings.vector_backend, settings.vector_db_path, "documents")
+        for item in backend.iterate():
+            sentences.append(item['content'])
+            if len(sentences) >= count:
+                break
+    except Exception as e:
+        print(f"读取向量数据库失败，使用示例句子: {e}")
+
+    while len(sentences) < count:
+        sentences.append(SAMPLE_SENTENCES[len(sentences) % len(SAMPLE_SENTENCES)] + f" #{len(sentences)}")
+    return sentences
+
+
+def measure(embedder, sentences, queries):
+    """返回 (句/秒, 单查询延迟毫秒数组)"""
+    embedder.warmup()
+    embedder.encode(sentences[:8])
+
+    start = time.perf_counter()
+    embedder.encode(sentences)
+    throughput = len(sentences) / (time.perf_counter() - start)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embedder.encode([query])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return throughput, np.array(latencies)
+
+
+def measure_workers(workers: int, sentences, batch_size: int) -> float:
+    """多进程并行编码吞吐（句/秒），不含进程启动和模型加载"""
+    batches = [sentences[i:i + batch_size] for i in range(0, len(sentences), batch_size)]
+    with ParallelEncoder(workers) as encoder:
+        # 每个进程先编码一批，确保模型都已加载
+        for future in [encoder.submit(batches[0]) for _ in range(encoder.workers)]:
+            future.result()
+
+        start = time.perf_counter()
+        pending = []
+        for batch in batches:
+            pending.append(encoder.submit(batch))
+            if len(pending) >= encoder.max_pending:
+                pending.pop(0).result()
+        for future in pending:
+            future.result()
+        return len(sentences) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入运行时吞吐、延迟与一致性基准测试")
+    parser.add_argument('--sentences', type=int, default=500, help='吞吐测试的句子数量')
+    parser.add_argument('--queries', type=int, default=100, help='单查询延迟测试次数')
+    parser.add_argument('--threads', type=int, nargs='+', default=[settings.embedding_intra_op_threads],
+                        help='要测试的 onnxruntime 算子内线程数（0 为默认值）')
+    parser.add_argument('--batch-size', type=int, default=settings.embedding_batch_size, help='编码批大小')
+    parser.add_argument('--workers', type=int, nargs='*', default=[], help='要测试的并行编码进程数')
+    parser.add_argument('--ingest-batch-size', type=int, default=settings.ingest_batch_size,
+                        help='并行编码时每个进程每次处理的句子数')
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.sentences)
+    queries = [SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)] for i in range(args.queries)]
+    model_dir = onnx_model_dir(settings.embedding_onnx_path, settings.embedding_model)
+
+    reference = SentenceTransformerEmbedder(settings.embedding_model, batch_size=args.batch_size)
+    candidates = [("torch", reference)]
+    if model_dir.exists():
+        for threads in args.threads:
+            for quantized in (False, True):
+                embedder = OnnxEmbedder(settings.embedding_model, str(model_dir), quantized=quantized,
+                                        intra_op_threads=threads, batch_size=args.batch_size)
+                label = f"onnx-{'int8' if quantized else 'fp32'}/threads={threads or 'auto'}"
+                candidates.append((label, embedder))
+    else:
+        print(f"未找到ONNX模型 {model_dir}，只测试 torch（先运行 python run.py export-onnx）\n")
+
+    print(f"模型: {settings.embedding_model}，{len(sentences)} 个句子，批大小 {args.batch_size}\n")
+    print(f"{'运行时':<28}{'句/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'平均余弦':>10}{'最低余弦':>10}")
+    print("-" * 78)
+
+    for label, embedder in candidates:
+        try:
+            throughput, latencies = measure(embedder, sentences, queries)
+        except Exception as e:
+            print(f"{label:<28}失败: {e}")
+            continue
+        if embedder is reference:
+            mean_cosine = min_cosine = 1.0
+        else:
+            agreement = verify_agreement(reference, embedder, sentences)
+            mean_cosine, min_cosine = agreement['mean_cosine'], agreement['min_cosine']
+        print(f"{label:<28}{throughput:>10.1f}{np.percentile(latencies, 50):>10.2f}"
+              f"{np.percentile(latencies, 95):>10.2f}{mean_cosine:>10.4f}{min_cosine:>10.4f}")
+
+    if args.workers:
+        print(f"\n并行编码（{settings.embedding_runtime}，每批 {args.ingest_batch_size} 句）")
+        print(f"{'进程数':<10}{'句/秒':>12}{'加速比':>10}")
+        print("-" * 32)
+        baseline = None
+        for workers in args.workers:
+            throughput = measure_workers(workers, sentences, args.ingest_batch_size)
+            baseline = baseline or throughput
+            print(f"{workers:<10}{throughput:>12.1f}{throughput / baseline:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""导入内存基准测试脚本
+
+在临时目录中生成不同大小的纯文本语料，对比一次性加载（load_all_documents + split_documents）
+与流式加载（iter_documents(stream=True) + iter_chunks，按 INGEST_BATCH_SIZE 分批消费）
+解析和分割阶段的 Python 堆峰值（tracemalloc）。流式加载的峰值应与语料大小无关。
+
+不加载嵌入模型；编码和写入阶段同样按批进行，在途批次数有上限。
+
+用法:
+    python scripts/benchmark_ingestion_memory.py
+    python scripts/benchmark_ingestion_memory.py --sizes 8 32 128 --files 4
+"""
+
+import argparse
+import itertools
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.config import settings
+from src.services.document_loader import DocumentLoader, TextSplitter
+
+SENTENCE = "检索增强生成把知识库中的相关片段放进提示词。The quick brown fox jumps over the lazy dog.\n"
+
+
+def write_corpus(directory: Path, size_mb: int, files: int):
+    """写入 files 个纯文本文件，共约 size_mb MB"""
+    repeats = size_mb * 1024 * 1024 // files // len(SENTENCE.encode('utf-8'))
+    for i in range(files):
+        with open(directory / f"doc_{i}.txt", 'w', encoding='utf-8') as file:
+            for _ in range(repeats):
+                file.write(SENTENCE)
+
+
+def peak_materialized(loader: DocumentLoader, splitter: TextSplitter) -> int:
+    tracemalloc.start()
+    documents = loader.load_all_documents(workers=1)
+    chunks = splitter.split_documents(documents)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del documents, chunks
+    return peak
+
+
+def peak_streaming(loader: DocumentLoader, splitter: TextSplitter, batch_size: int) -> int:
+    tracemalloc.start()
+    chunks = (chunk
+              for result in loader.iter_documents(workers=1, stream=True)
+              for chunk in splitter.iter_chunks(result.document))
+    for _ in iter(lambda: list(itertools.islice(chunks, batch_size)), []):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导入内存基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[4, 16, 64], help='语料大小列表（MB）')
+    parser.add_argument('--files', type=int, default=4, help='每份语料的文件数')
+    parser.add_argument('--batch-size', type=int, default=settings.ingest_batch_size, help='每批文档块数')
+    args = parser.parse_args()
+
+    splitter = TextSplitter(settings.chunk_size, settings.chunk_overlap)
+    print(f"{'语料(MB)':>10}{'一次性峰值(MB)':>18}{'流式峰值(MB)':>16}")
+    print("-" * 44)
+    for size_mb in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_corpus(Path(tmp), size_mb, args.files)
+            loader = DocumentLoader(tmp)
+            materialized = peak_materialized(loader, splitter)
+            streaming = peak_streaming(loader, splitter, args.batch_size)
+        print(f"{size_mb:>10}{materialized / 1024 / 1024:>18.1f}{streaming / 1024 / 1024:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
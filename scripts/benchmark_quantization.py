@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""量化检索基准测试脚本
+
+对比 int8 / binary 量化编码 + 全精度重打分与 float32 精确检索的 recall@k、
+单次查询延迟（p50/p95）和常驻内存的向量数据大小。
+
+用法:
+    python scripts/benchmark_quantization.py                       # 使用当前向量数据库中的向量
+    python scripts/benchmark_quantization.py --synthetic 200000    # 使用随机生成的向量
+    python scripts/benchmark_quantization.py --rescore 1 2 4 8
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.config import settings
+from src.services.vector_backends import NumpyBackend, VectorBackendFactory
+
+
+def load_vectors(args) -> np.ndarray:
+    """加载基准向量"""
+    if args.synthetic:
+        print(f"生成 {args.synthetic} 个 {args.dim} 维随机向量...")
+        rng = np.random.default_rng(args.seed)
+        centers = rng.normal(size=(max(1, args.synthetic // 1000), args.dim))
+        vectors = centers[rng.integers(len(centers), size=args.synthetic)]
+        vectors += 0.3 * rng.normal(size=vectors.shape)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors.astype(np.float32)
+
+    print(f"从 {settings.vector_db_path} 读取向量...")
+    backend = VectorBackendFactory.create_backend(settings.vector_backend, settings.vector_db_path, "documents")
+    vectors = [item['embedding'] for item in backend.iterate(include_embeddings=True)]
+    if not vectors:
+        print("向量数据库为空，请先加载文档或使用 --synthetic")
+        sys.exit(1)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def measure(backend: NumpyBackend, queries: np.ndarray, top_k: int, search_params: dict):
+    """逐条查询，返回每个查询的结果ID和延迟（毫秒）"""
+    results = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        hits = backend.query([query], top_k, search_params=search_params)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([hit['id'] for hit in hits])
+    return results, np.array(latencies)
+
+
+def format_bytes(size: int) -> str:
+    return f"{size / (1 << 20):.1f}MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量化检索召回率、延迟与内存基准测试")
+    parser.add_argument('--synthetic', type=int, default=0, help='使用随机生成的向量数量（默认读取向量数据库）')
+    parser.add_argument('--dim', type=int, default=384, help='随机向量维度')
+    parser.add_argument('--queries', type=int, default=200, help='查询数量')
+    parser.add_argument('--top-k', type=int, default=10, help='recall@k 的 k')
+    parser.add_argument('--rescore', type=int, nargs='+', default=[1, 2, 4, 8], help='要测试的重打分倍数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(len(vectors), size=args.queries)]
+    queries = (queries + 0.05 * rng.normal(size=queries.shape)).astype(np.float32)
+    ids = [str(i) for i in range(len(vectors))]
+    float_bytes = vectors.nbytes
+
+    print(f"{'模式':<18}{'recall@' + str(args.top_k):>12}{'p50(ms)':>10}{'p95(ms)':>10}{'常驻向量':>12}{'压缩比':>8}")
+    print("-" * 70)
+
+    exact_results = None
+    for quantization in ("none", "int8", "binary"):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            backend = NumpyBackend(tmp_dir, "benchmark", quantization=quantization)
+            backend.add(ids, vectors, [""] * len(vectors), [{} for _ in ids])
+
+            if quantization == "none":
+                exact_results, latencies = measure(backend, queries, args.top_k, {})
+                print(f"{'float32':<18}{1.0:>12.4f}{np.percentile(latencies, 50):>10.3f}"
+                      f"{np.percentile(latencies, 95):>10.3f}{format_bytes(float_bytes):>12}{1.0:>8.1f}")
+                continue
+
+            stats = backend.index_stats()['quantization']
+            for rescore in args.rescore:
+                results, latencies = measure(backend, queries, args.top_k, {'rescore': rescore})
+                recall = np.mean([
+                    len(set(found) & set(expected)) / len(expected)
+                    for found, expected in zip(results, exact_results)
+                ])
+                print(f"{quantization + '/rescore=' + str(rescore):<18}{recall:>12.4f}"
+                      f"{np.percentile(latencies, 50):>10.3f}{np.percentile(latencies, 95):>10.3f}"
+                      f"{format_bytes(stats['code_bytes']):>12}{stats['compression_ratio']:>8.1f}")
+
+    print("\n量化模式下全精度向量只通过内存映射读取重打分的候选行，不需要常驻内存。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""启动耗时分析脚本
+
+1. 导入耗时：在独立进程中用 python -X importtime 导入各入口模块，报告总耗时和最慢的第三方包
+2. 启动阶段耗时：在独立进程中依次执行 创建VectorStore → count() → 第一次编码（加载模型）→ 创建AIAgent
+
+用法:
+    python scripts/profile_startup.py
+    python scripts/profile_startup.py --top 15 --skip-model
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+MODULES = [
+    "src.core.config",
+    "src.core.llm_adapter",
+    "src.services.vector_store",
+    "src.core.agent",
+    "src.cli.cli",
+    "src.api.main",
+]
+
+
+def profile_import(module: str):
+    """在独立进程中导入模块，返回 (墙钟耗时秒, [(包名, 累计微秒), ...], 错误信息)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 按顶层包汇总，包的累计耗时已包含其子模块
+        top = name.strip().split(".")[0]
+        if top != "src":
+            packages[top] = max(packages.get(top, 0), int(cumulative))
+
+    error = None
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1]
+    return elapsed, sorted(packages.items(), key=lambda item: item[1], reverse=True), error
+
+
+def run_stages(skip_model: bool):
+    """在子进程中执行：逐阶段计时并输出 JSON"""
+    timings = {}
+
+    start = time.perf_counter()
+    from src.core.config import settings
+    from src.services.vector_store import VectorStore
+    timings["import_vector_store"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector_store = VectorStore(settings.vector_db_path)
+    timings["create_vector_store"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector_store.count()
+    timings["count"] = time.perf_counter() - start
+    timings["model_loaded_after_count"] = vector_store.model_loaded
+
+    if not skip_model:
+        start = time.perf_counter()
+        vector_store.embed_query("启动耗时分析")
+        timings["first_encode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from src.core.agent import AIAgent
+    AIAgent(vector_store)
+    timings["create_agent"] = time.perf_counter() - start
+
+    print(json.dumps(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导入与启动耗时分析")
+    parser.add_argument('--top', type=int, default=10, help='每个模块显示最慢的第三方包数量')
+    parser.add_argument('--skip-model', action='store_true', help='不测量嵌入模型加载耗时')
+    parser.add_argument('--stages-child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stages_child:
+        sys.path.insert(0, str(PROJECT_ROOT))
+        run_stages(args.skip_model)
+        return
+
+    print("=== 导入耗时（独立进程，含解释器启动）===\n")
+    for module in MODULES:
+        elapsed, packages, error = profile_import(module)
+        print(f"{module:<28}{elapsed * 1000:>10.0f} ms")
+        if error:
+            print(f"    导入失败: {error}")
+        for name, cumulative in packages[:args.top]:
+            print(f"    {name:<24}{cumulative / 1000:>10.1f} ms")
+        print()
+
+    print("=== 启动阶段耗时（独立进程）===\n")
+    command = [sys.executable, str(Path(__file__).resolve()), "--stages-child"]
+    if args.skip_model:
+        command.append("--skip-model")
+    result = subprocess.run(command, cwd=PROJECT_ROOT, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONUNBUFFERED="1"))
+    if result.returncode != 0:
+        print(result.stderr.strip())
+        sys.exit(1)
+
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    for stage, value in timings.items():
+        if isinstance(value, bool):
+            print(f"{stage:<28}{str(value):>10}")
+        else:
+            print(f"{stage:<28}{value * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
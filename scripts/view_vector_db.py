@@ -1,6 +1,15 @@
 #!/usr/bin/env python3
-"""查看向量数据库内容的脚本"""
+"""查看向量数据库内容的脚本
 
+默认只读取存储后端，不加载嵌入模型；指定 --search 时才加载模型做检索测试。
+
+用法:
+    python scripts/view_vector_db.py
+    python scripts/view_vector_db.py --limit 20
+    python scripts/view_vector_db.py --search "系统"
+"""
+
+import argparse
 import sys
 from pathlib import Path
 
@@ -10,11 +19,12 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from src.services.vector_store import VectorStore
 from src.core.config import settings
 import json
+from itertools import islice
 
 
 def view_database_info():
     """查看数据库基本信息"""
-    print("=== ChromaDB 向量数据库信息 ===\n")
+    print("=== 向量数据库信息 ===\n")
     
     vector_store = VectorStore(settings.vector_db_path)
     
@@ -22,11 +32,9 @@ def view_database_info():
     print(f"数据库路径: {settings.vector_db_path}")
     print(f"集合名称: {vector_store.collection_name}")
     print(f"文档总数: {vector_store.count()}")
-    print(f"嵌入模型: all-MiniLM-L6-v2")
+    print(f"嵌入模型: {settings.embedding_model}")
     
-    # 集合信息
-    collection_metadata = vector_store.collection.metadata
-    print(f"集合描述: {collection_metadata.get('description', 'N/A')}")
+    print(f"存储后端: {vector_store.backend.get_name()}")
     
     return vector_store
 
@@ -36,18 +44,15 @@ def view_all_documents(vector_store, limit=10):
     print(f"\n=== 文档内容 (前 {limit} 个) ===\n")
     
     try:
-        # 获取所有文档
-        results = vector_store.collection.get(limit=limit)
+        # 获取前 limit 个文档
+        items = list(islice(vector_store.backend.iterate(batch_size=limit), limit))
         
-        if not results['documents']:
+        if not items:
             print("数据库中没有文档")
             return
         
-        for i, (doc_id, document, metadata) in enumerate(zip(
-            results['ids'], 
-            results['documents'], 
-            results['metadatas']
-        )):
+        for i, item in enumerate(items):
+            doc_id, document, metadata = item['id'], item['content'], item['metadata']
             print(f"📄 文档 {i+1}:")
             print(f"   ID: {doc_id}")
             print(f"   内容长度: {len(document)} 字符")
@@ -95,9 +100,9 @@ def view_collection_stats(vector_store):
     
     try:
         # 获取所有文档的元数据来统计
-        results = vector_store.collection.get()
+        metadatas = [item['metadata'] for item in vector_store.backend.iterate()]
         
-        if not results['metadatas']:
+        if not metadatas:
             print("没有元数据可统计")
             return
         
@@ -105,7 +110,7 @@ def view_collection_stats(vector_store):
         file_types = {}
         filenames = set()
         
-        for metadata in results['metadatas']:
+        for metadata in metadatas:
             if metadata and 'filename' in metadata:
                 filename = metadata['filename']
                 filenames.add(filename)
@@ -114,7 +119,7 @@ def view_collection_stats(vector_store):
                 ext = Path(filename).suffix.lower()
                 file_types[ext] = file_types.get(ext, 0) + 1
         
-        print(f"文档块总数: {len(results['documents'])}")
+        print(f"文档块总数: {len(metadatas)}")
         print(f"源文件数量: {len(filenames)}")
         print(f"文件类型分布:")
         for ext, count in file_types.items():
@@ -130,6 +135,12 @@ def view_collection_stats(vector_store):
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="查看向量数据库内容")
+    parser.add_argument('--limit', type=int, default=5, help='显示的文档块数量')
+    parser.add_argument('--search', help='检索测试的问题（会加载嵌入模型）')
+    parser.add_argument('--top-k', type=int, default=3, help='检索测试返回的文档块数量')
+    args = parser.parse_args()
+    
     try:
         # 查看基本信息
         vector_store = view_database_info()
@@ -138,10 +149,11 @@ def main():
         view_collection_stats(vector_store)
         
         # 查看文档内容
-        view_all_documents(vector_store, limit=5)
+        view_all_documents(vector_store, limit=args.limit)
         
         # 搜索测试
-        search_documents(vector_store, "系统", top_k=3)
+        if args.search:
+            search_documents(vector_store, args.search, top_k=args.top_k)
         
     except Exception as e:
         print(f"错误: {e}")
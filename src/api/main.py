@@ -1,16 +1,22 @@
 """FastAPI服务主文件"""
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
 import uvicorn
 import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 from ..core.config import settings
-from ..core.agent import AIAgent
-from ..services.document_loader import DocumentLoader, TextSplitter
-from ..services.vector_store import VectorStore
+from ..core.collection_manager import CollectionManager, validate_collection_name
+from ..services.document_loader import SUPPORTED_EXTENSIONS
+from ..services.filters import MetadataFilter
+from ..services.metrics import render_prometheus
+from ..services.snapshot import export_snapshot, import_snapshot
 
 
 # 创建FastAPI应用
@@ -29,29 +35,91 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 初始化组件
-vector_store = VectorStore(settings.vector_db_path)
-agent = AIAgent(vector_store)
-document_loader = DocumentLoader(settings.documents_path)
-text_splitter = TextSplitter(settings.chunk_size, settings.chunk_overlap)
+# 初始化组件（嵌入模型、存储后端和LLM SDK都在第一次使用时加载）
+# 所有集合共享一个嵌入模型，未指定集合的请求使用默认集合
+collections = CollectionManager(settings.vector_db_path)
+vector_store = collections.default.vector_store
+agent = collections.default.agent
 
 
 # 请求模型
 class QueryRequest(BaseModel):
     query: str
     conversation_history: Optional[List[Dict[str, str]]] = None
+    # 检索参数，如 {"nprobe": 16} 或 {"exact": true}
+    search_params: Optional[Dict[str, Any]] = None
+    # 元数据过滤条件，如 {"type": ".pdf", "path_prefix": "knowledge_base/manuals", "tags": ["x-s20"]}
+    filters: Optional[Dict[str, Any]] = None
+    # 集合（知识库）名称，默认使用 DEFAULT_COLLECTION
+    collection: Optional[str] = None
 
 
 class QueryResponse(BaseModel):
     answer: str
     retrieved_docs: List[Dict]
     has_context: bool
+    timings: Optional[Dict[str, float]] = None
+    # 提示词各部分 token 数（模板、对话历史、文档块）及被丢弃和截断的文档块数
+    token_usage: Optional[Dict[str, int]] = None
+    # 抽取式压缩统计（启用时），ratio 为压缩后/压缩前的字符数之比
+    compression: Optional[Dict[str, float]] = None
+    cached: bool = False
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    max_concurrency: Optional[int] = None
+    search_params: Optional[Dict[str, Any]] = None
+    filters: Optional[Dict[str, Any]] = None
+    collection: Optional[str] = None
+
+
+class BatchQueryResponse(BaseModel):
+    results: List[QueryResponse]
 
 
 class StatusResponse(BaseModel):
     status: str
     document_count: int
     message: str
+    sync: Optional[Dict[str, int]] = None
+    backend: Optional[str] = None
+    index: Optional[Dict[str, Any]] = None
+    model_loaded: Optional[bool] = None
+    collection: Optional[str] = None
+
+
+def validate_filters(filters: Optional[Dict[str, Any]]):
+    """校验过滤条件，不支持的字段返回 400"""
+    try:
+        MetadataFilter.from_dict(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@contextmanager
+def collection_scope(name: Optional[str], create: bool = False):
+    """在请求期间使用集合：名称不合法返回 400，集合不存在返回 404"""
+    try:
+        handle = collections.acquire(name, create=create)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        yield handle
+    finally:
+        collections.release(handle)
+
+
+@app.on_event("startup")
+async def preload_models():
+    """在后台线程预加载模型，服务启动不等待模型加载完成"""
+    if not settings.preload_models:
+        return
+    threading.Thread(target=vector_store.warmup, name="embedding-preload", daemon=True).start()
+    if agent.retrieval.reranker is not None:
+        agent.retrieval.reranker.warmup()
 
 
 # API路由
@@ -76,127 +144,325 @@ async def query(request: QueryRequest):
     Returns:
         包含答案和相关文档的响应
     """
-    try:
-        result = agent.chat(request.query, request.conversation_history)
-        return QueryResponse(**result)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    validate_filters(request.filters)
+    with collection_scope(request.collection) as handle:
+        try:
+            # 在线程池中执行，使并发请求的查询编码可以合并为微批
+            result = await run_in_threadpool(
+                handle.agent.chat, request.query, request.conversation_history, request.search_params,
+                request.filters
+            )
+            return QueryResponse(**result)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch(request: BatchQueryRequest):
+    """
+    批量查询知识库
+    
+    所有问题一次批量检索，LLM调用以有限并发执行。
+    
+    Args:
+        request: 包含问题列表和最大并发数的请求
+    
+    Returns:
+        与输入顺序一致的答案列表
+    """
+    if len(request.queries) > settings.batch_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多查询 {settings.batch_max_queries} 个问题"
+        )
+    if request.max_concurrency is not None and request.max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency 必须为正整数")
+    
+    validate_filters(request.filters)
+    with collection_scope(request.collection) as handle:
+        try:
+            results = await run_in_threadpool(
+                handle.agent.chat_batch, request.queries, request.max_concurrency, request.search_params,
+                request.filters
+            )
+            return BatchQueryResponse(results=[QueryResponse(**result) for result in results])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...), tags: Optional[str] = Form(None),
+                          collection: Optional[str] = Form(None)):
     """
     上传文档到知识库
     
     Args:
         file: 上传的文件
+        tags: 自定义标签，逗号分隔，可用于检索时按标签过滤
+        collection: 集合名称，集合不存在时自动创建
     
     Returns:
         上传状态
     """
-    try:
-        # 保存文件
-        file_path = Path(settings.documents_path) / file.filename
-        
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # 加载文档
-        doc = document_loader.load_document(file_path)
-        
-        if not doc:
-            raise HTTPException(status_code=400, detail="不支持的文件格式")
+    with collection_scope(collection, create=True) as handle:
+        try:
+            file_path = handle.document_loader.documents_path / file.filename
+            
+            if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                raise HTTPException(status_code=400, detail="不支持的文件格式")
+            
+            # 保存文件
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(file_path, "wb") as f:
+                content = await file.read()
+                f.write(content)
+            
+            if tags is not None:
+                handle.document_loader.set_tags(file_path, tags.split(','))
+            
+            # 增量同步该文件（重复上传同名文件时替换旧文档块），在线程池中执行，不阻塞并发查询
+            stats = await run_in_threadpool(handle.indexer.sync, [file_path])
+            
+            return {
+                "status": "success",
+                "message": f"文档 {file.filename} 上传成功",
+                "chunks": stats['embedded_chunks'],
+                "sync": stats,
+                "collection": handle.name
+            }
         
-        # 分割文档
-        chunks = text_splitter.split_documents([doc])
-        
-        # 添加到向量数据库
-        vector_store.add_documents(chunks)
-        
-        return {
-            "status": "success",
-            "message": f"文档 {file.filename} 上传成功",
-            "chunks": len(chunks)
-        }
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/reload", response_model=StatusResponse)
-async def reload_documents():
+async def reload_documents(full: bool = False, collection: Optional[str] = None):
     """
     重新加载所有文档
     
+    默认按文件内容哈希增量同步，只解析和嵌入新增或修改过的文件。
+    
+    Args:
+        full: 是否全量重建（在影子索引中重建后原子切换，重建期间查询读取旧索引）
+        collection: 集合名称，同步该集合的文档目录，集合不存在时自动创建
+    
     Returns:
         加载状态
     """
-    try:
-        # 清空向量数据库
-        vector_store.clear()
-        
-        # 加载所有文档
-        documents = document_loader.load_all_documents()
-        
-        if not documents:
+    with collection_scope(collection, create=True) as handle:
+        try:
+            # 重建和同步在线程池中执行，期间事件循环继续处理查询
+            stats = await run_in_threadpool(handle.indexer.rebuild if full else handle.indexer.sync)
+            document_count = stats['added'] + stats['updated'] + stats['skipped']
+            
+            if not document_count:
+                return StatusResponse(
+                    status="warning",
+                    document_count=0,
+                    message="没有找到文档",
+                    sync=stats,
+                    collection=handle.name
+                )
+            
             return StatusResponse(
-                status="warning",
-                document_count=0,
-                message="没有找到文档"
+                status="success",
+                document_count=document_count,
+                message=(
+                    f"同步完成: 新增 {stats['added']} 个、更新 {stats['updated']} 个、"
+                    f"删除 {stats['removed']} 个、跳过 {stats['skipped']} 个文档"
+                ),
+                sync=stats,
+                collection=handle.name
             )
         
-        # 分割文档
-        chunks = text_splitter.split_documents(documents)
-        
-        # 添加到向量数据库
-        vector_store.add_documents(chunks)
-        
-        return StatusResponse(
-            status="success",
-            document_count=len(documents),
-            message=f"成功加载 {len(documents)} 个文档，共 {len(chunks)} 个文档块"
-        )
-    
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/status", response_model=StatusResponse)
-async def get_status():
+async def get_status(collection: Optional[str] = None):
     """
     获取系统状态
     
+    Args:
+        collection: 集合名称，默认集合可省略
+    
     Returns:
         系统状态信息
     """
+    with collection_scope(collection) as handle:
+        try:
+            store = handle.vector_store
+            doc_count = store.count()
+            return StatusResponse(
+                status="running",
+                document_count=doc_count,
+                message=f"系统正在运行，共有 {doc_count} 个文档块",
+                backend=store.backend.get_name(),
+                index={**store.backend.index_stats(), "generation": store.generation.name},
+                model_loaded=store.model_loaded,
+                collection=handle.name
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/collections")
+async def list_collections():
+    """
+    列出所有集合
+    
+    Returns:
+        集合名称列表和当前打开的集合
+    """
+    return {
+        "default": collections.default_name,
+        "collections": collections.list_collections(),
+        "handles": collections.stats()
+    }
+
+
+@app.get("/cache/stats")
+async def get_cache_stats(collection: Optional[str] = None):
+    """
+    获取缓存命中统计
+    
+    查询向量缓存、文档块嵌入缓存和重排序得分缓存由所有集合共享，语义答案缓存每个集合一份。
+    
+    Args:
+        collection: 集合名称，返回该集合的答案缓存统计，默认集合可省略
+    
+    Returns:
+        各缓存的命中/未命中次数
+    """
+    with collection_scope(collection) as handle:
+        store = handle.vector_store
+        handle_agent = handle.agent
+        return {
+            "collection": handle.name,
+            "query_embedding": store.query_cache.stats(),
+            "document_embedding": store.embedding_cache.stats() if store.embedding_cache else None,
+            "answer": handle_agent.answer_cache.stats() if handle_agent.answer_cache else None,
+            "rerank": handle_agent.retrieval.reranker.stats() if handle_agent.retrieval.reranker else None
+        }
+
+
+@app.get("/metrics")
+async def get_metrics(format: str = "json", collection: Optional[str] = None):
+    """
+    获取查询编码微批处理指标
+    
+    查询编码由所有集合共享的编码器完成，指标覆盖所有集合的查询。
+    
+    Args:
+        format: json（默认）或 prometheus
+        collection: 集合名称，默认集合可省略
+    
+    Returns:
+        排队等待时间（毫秒）和批大小直方图，JSON 格式另含打开的集合和淘汰统计
+    """
+    with collection_scope(collection) as handle:
+        batcher = handle.vector_store.query_batcher
+    if format == "prometheus":
+        histograms = {}
+        if batcher is not None:
+            histograms = {
+                "query_encode_queue_wait_ms": batcher.queue_wait_ms,
+                "query_encode_batch_size": batcher.batch_size
+            }
+        return PlainTextResponse(render_prometheus(histograms), media_type="text/plain; version=0.0.4")
+    
+    return {
+        "collection": handle.name,
+        "query_encoding": batcher.stats() if batcher else None,
+        "collections": collections.stats()
+    }
+
+
+def snapshot_dir(name: str) -> Path:
+    """快照目录，名称规则与集合名相同，不允许指向 SNAPSHOT_PATH 之外"""
     try:
-        doc_count = vector_store.count()
-        return StatusResponse(
-            status="running",
-            document_count=doc_count,
-            message=f"系统正在运行，共有 {doc_count} 个文档块"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return Path(settings.snapshot_path) / validate_collection_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/snapshot/export")
+async def snapshot_export(collection: Optional[str] = None, name: Optional[str] = None):
+    """
+    导出集合当前索引为快照
+    
+    Args:
+        collection: 集合名称，默认集合可省略
+        name: 快照名称，保存在 SNAPSHOT_PATH/<name>，默认与集合同名
+    
+    Returns:
+        快照清单
+    """
+    with collection_scope(collection) as handle:
+        path = snapshot_dir(name or handle.name)
+        try:
+            manifest = await run_in_threadpool(export_snapshot, handle.vector_store, str(path))
+            return {"status": "success", "snapshot": path.name, "manifest": manifest}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/snapshot/import")
+async def snapshot_import(collection: Optional[str] = None, name: Optional[str] = None, verify: bool = True):
+    """
+    导入快照为集合的新一代索引（原子切换，导入期间查询读取旧索引）
+    
+    Args:
+        collection: 集合名称，集合不存在时自动创建
+        name: 快照名称（SNAPSHOT_PATH/<name>），默认与集合同名
+        verify: 是否校验文件 SHA-256
+    
+    Returns:
+        快照清单
+    """
+    with collection_scope(collection, create=True) as handle:
+        path = snapshot_dir(name or handle.name)
+        if not path.exists():
+            raise HTTPException(status_code=404, detail=f"快照不存在: {path.name}")
+        try:
+            manifest = await run_in_threadpool(import_snapshot, handle.vector_store, str(path), verify)
+            return {
+                "status": "success",
+                "document_count": manifest['count'],
+                "collection": handle.name,
+                "manifest": manifest
+            }
+        except ValueError as e:
+            # 快照格式、校验和或嵌入模型不匹配
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.delete("/clear")
-async def clear_database():
+async def clear_database(collection: Optional[str] = None):
     """
     清空知识库
     
+    Args:
+        collection: 集合名称，默认集合可省略
+    
     Returns:
         清空状态
     """
-    try:
-        vector_store.clear()
-        return {
-            "status": "success",
-            "message": "知识库已清空"
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    with collection_scope(collection) as handle:
+        try:
+            await run_in_threadpool(handle.vector_store.clear)
+            return {
+                "status": "success",
+                "message": "知识库已清空",
+                "collection": handle.name
+            }
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 
 # 启动函数
@@ -2,54 +2,53 @@
 import argparse
 import sys
 from pathlib import Path
+from typing import Optional
 
 from ..core.config import settings
-from ..core.agent import AIAgent
-from ..services.document_loader import DocumentLoader, TextSplitter
+from ..core.collection_manager import CollectionManager
+from ..services.embedders import create_embedder, export_onnx, onnx_model_dir, verify_agreement
+from ..services.embedding_cache import content_hash
+from ..services.embedding_service import EmbeddingServer
+from ..services.snapshot import export_snapshot, import_snapshot
 from ..services.vector_store import VectorStore
 
 
-def load_documents():
-    """加载文档到向量数据库"""
+DEFAULT_EMBEDDING_SOCKET = "/tmp/ai-agent-embedding.sock"
+
+
+def load_documents(full: bool = False, workers: Optional[int] = None, collection: Optional[str] = None,
+                   parse_workers: Optional[int] = None):
+    """加载文档到向量数据库（默认增量同步），集合不存在时自动创建"""
     print("=== 加载文档 ===\n")
     
     # 初始化组件
-    document_loader = DocumentLoader(settings.documents_path)
-    text_splitter = TextSplitter(settings.chunk_size, settings.chunk_overlap)
-    vector_store = VectorStore(settings.vector_db_path)
+    handle = CollectionManager().get(collection, create=True)
+    indexer = handle.indexer
     
-    # 清空现有数据
-    print("清空现有向量数据库...")
-    vector_store.clear()
-    
-    # 加载所有文档
-    print(f"从 {settings.documents_path} 加载文档...")
-    documents = document_loader.load_all_documents()
-    
-    if not documents:
-        print("警告: 没有找到文档")
-        return
-    
-    # 分割文档
-    print("\n分割文档...")
-    chunks = text_splitter.split_documents(documents)
-    print(f"生成了 {len(chunks)} 个文档块")
-    
-    # 添加到向量数据库
-    print("\n添加到向量数据库...")
-    vector_store.add_documents(chunks)
+    print(f"从 {handle.document_loader.documents_path} 加载文档到集合 {handle.name}...")
+    if full:
+        # 写入影子索引，完成后切换，重建期间旧索引仍可查询
+        print("在影子索引中全量重建...")
+        stats = indexer.rebuild(workers=workers, parse_workers=parse_workers)
+    else:
+        stats = indexer.sync(workers=workers, parse_workers=parse_workers)
     
-    print(f"\n✓ 成功！加载了 {len(documents)} 个文档")
+    print(f"\n✓ 完成！新增 {stats['added']} 个、更新 {stats['updated']} 个、"
+          f"删除 {stats['removed']} 个、跳过 {stats['skipped']} 个文档")
+    if stats['failed']:
+        print(f"  {stats['failed']} 个文档解析失败（保留原有文档块），原因见上方输出")
+    print(f"  嵌入 {stats['embedded_chunks']} 个文档块，删除 {stats['deleted_chunks']} 个文档块")
 
 
-def query_interactive():
+def query_interactive(collection: Optional[str] = None):
     """交互式查询"""
     print("=== AI Agent 交互式问答 ===")
     print("输入 'quit' 或 'exit' 退出\n")
     
     # 初始化组件
-    vector_store = VectorStore(settings.vector_db_path)
-    agent = AIAgent(vector_store)
+    handle = CollectionManager().get(collection)
+    vector_store = handle.vector_store
+    agent = handle.agent
     
     # 检查是否有文档
     doc_count = vector_store.count()
@@ -98,42 +97,189 @@ def query_interactive():
             print(f"\n错误: {e}\n")
 
 
-def query_once(question: str):
+def query_once(question: str, collection: Optional[str] = None):
     """单次查询"""
-    vector_store = VectorStore(settings.vector_db_path)
-    agent = AIAgent(vector_store)
+    agent = CollectionManager().get(collection).agent
     
     result = agent.chat(question)
     print(result['answer'])
 
 
-def show_status():
-    """显示系统状态"""
+def show_status(collection: Optional[str] = None):
+    """显示系统状态（只读取存储后端，不加载嵌入模型）"""
     print("=== 系统状态 ===\n")
     
-    vector_store = VectorStore(settings.vector_db_path)
+    handle = CollectionManager().get(collection)
+    vector_store = handle.vector_store
     doc_count = vector_store.count()
     
     print(f"向量数据库路径: {settings.vector_db_path}")
-    print(f"文档目录: {settings.documents_path}")
+    print(f"集合: {handle.name}（当前索引 {vector_store.generation.name}）")
+    print(f"存储后端: {vector_store.backend.get_name()}")
+    print(f"文档目录: {handle.document_loader.documents_path}")
     print(f"文档块数量: {doc_count}")
+    print(f"嵌入模型: {settings.embedding_model}（{settings.embedding_runtime}）")
     print(f"模型: {settings.model_name}")
     print(f"检索Top-K: {settings.top_k}")
 
 
+def list_collections():
+    """列出所有集合及其文档块数量"""
+    print("=== 集合 ===\n")
+    
+    manager = CollectionManager()
+    for name in manager.list_collections():
+        handle = manager.get(name)
+        marker = "（默认）" if name == manager.default_name else ""
+        print(f"{name}{marker}: {handle.vector_store.count()} 个文档块，文档目录 {handle.document_loader.documents_path}")
+        if name != manager.default_name:
+            handle.vector_store.close()
+
+
+def compact_embedding_cache(prune: bool = False):
+    """压缩文档块嵌入缓存"""
+    print("=== 压缩嵌入缓存 ===\n")
+    
+    manager = CollectionManager()
+    cache = manager.encoder.embedding_cache
+    if cache is None:
+        print("嵌入缓存未启用")
+        return
+    
+    before = len(cache)
+    live_hashes = None
+    if prune:
+        # 嵌入缓存由所有集合共享，只保留任一集合当前索引中仍在使用的文档块
+        names = manager.list_collections()
+        live_hashes = set()
+        for name in names:
+            with manager.use(name) as handle:
+                live_hashes.update(content_hash(item['content']) for item in handle.vector_store.backend.iterate())
+        print(f"{len(names)} 个集合共使用 {len(live_hashes)} 个不同的文档块")
+    
+    cache.compact(live_hashes)
+    print(f"✓ 缓存条目: {before} -> {len(cache)}")
+
+
+def snapshot_command(action: str, path: Optional[str] = None, collection: Optional[str] = None,
+                     verify: bool = True):
+    """导出或导入集合的索引快照（默认路径为 SNAPSHOT_PATH/<集合名>）"""
+    handle = CollectionManager().get(collection, create=action == 'import')
+    path = path or str(Path(settings.snapshot_path) / handle.name)
+    
+    if action == 'export':
+        print(f"=== 导出索引快照 ===\n\n集合 {handle.name} -> {path}")
+        manifest = export_snapshot(handle.vector_store, path)
+    else:
+        print(f"=== 导入索引快照 ===\n\n{path} -> 集合 {handle.name}")
+        manifest = import_snapshot(handle.vector_store, path, verify=verify)
+    print(f"✓ {manifest['count']} 个文档块，嵌入模型 {manifest['embedding_model']}，维度 {manifest['dim']}")
+
+
+def export_onnx_model(quantize: bool = True, verify: bool = False):
+    """导出嵌入模型为 ONNX（可选 int8 动态量化）"""
+    print("=== 导出 ONNX 嵌入模型 ===\n")
+    
+    output_dir = onnx_model_dir(settings.embedding_onnx_path, settings.embedding_model)
+    print(f"导出 {settings.embedding_model} 到 {output_dir}...")
+    export_onnx(settings.embedding_model, str(output_dir), quantize=quantize)
+    print("✓ 导出完成")
+    
+    if verify:
+        # 与 SentenceTransformer 参考模型比较余弦相似度
+        sentences = [chunk['content'] for chunk in _sample_chunks()] or [
+            "什么是向量数据库？", "How does retrieval augmented generation work?",
+            "文档被切分为若干文本块后编码为向量。", "The quick brown fox jumps over the lazy dog."
+        ]
+        reference = create_embedder(runtime="torch")
+        for quantized in ([False, True] if quantize else [False]):
+            candidate = create_embedder(runtime="onnx", quantized=quantized)
+            agreement = verify_agreement(reference, candidate, sentences)
+            print(f"  {candidate.get_name()}: 平均余弦 {agreement['mean_cosine']:.4f}，"
+                  f"最低 {agreement['min_cosine']:.4f}（{agreement['sentences']} 个句子）")
+
+
+def run_embedding_server(socket_path: Optional[str] = None):
+    """启动本机共享嵌入服务"""
+    socket_path = socket_path or settings.embedding_service_socket or DEFAULT_EMBEDDING_SOCKET
+    server = EmbeddingServer(
+        socket_path,
+        create_embedder(use_service=False),
+        max_batch_size=settings.embedding_service_max_batch,
+        window_ms=settings.embedding_service_window_ms
+    )
+    print(f"=== 嵌入服务 ===\n\n模型: {server.embedder.get_name()}")
+    print(f"监听: {socket_path}（按 Ctrl+C 停止）")
+    print(f"API 工作进程设置 EMBEDDING_SERVICE_SOCKET={socket_path} 即可共用该服务")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n嵌入服务已停止")
+
+
+def _sample_chunks(limit: int = 200):
+    """从向量数据库取部分文档块作为校验样本"""
+    vector_store = VectorStore(settings.vector_db_path)
+    chunks = []
+    for item in vector_store.backend.iterate():
+        chunks.append(item)
+        if len(chunks) >= limit:
+            break
+    return chunks
+
+
 def main():
     parser = argparse.ArgumentParser(description="AI Agent 命令行工具")
     subparsers = parser.add_subparsers(dest='command', help='可用命令')
     
+    # 按集合操作的命令共用 --collection 参数
+    collection_parser = argparse.ArgumentParser(add_help=False)
+    collection_parser.add_argument('--collection', default=None,
+                                   help=f'集合（知识库）名称，默认 {settings.default_collection}')
+    
     # load命令
-    subparsers.add_parser('load', help='加载文档到向量数据库')
+    load_parser = subparsers.add_parser('load', parents=[collection_parser],
+                                        help='加载文档到向量数据库（默认增量同步）')
+    load_parser.add_argument('--full', action='store_true', help='在影子索引中全量重建后原子切换')
+    load_parser.add_argument('--workers', type=int, default=None,
+                             help='编码进程数（默认读取 INGEST_WORKERS，0 为全部CPU核）')
+    load_parser.add_argument('--parse-workers', type=int, default=None,
+                             help='解析进程数（默认读取 PARSE_WORKERS，0 为全部CPU核），单个文件超时或崩溃不影响其他文件')
     
     # query命令
-    query_parser = subparsers.add_parser('query', help='查询知识库')
+    query_parser = subparsers.add_parser('query', parents=[collection_parser], help='查询知识库')
     query_parser.add_argument('question', nargs='?', help='问题（如果不提供则进入交互模式）')
     
     # status命令
-    subparsers.add_parser('status', help='显示系统状态')
+    subparsers.add_parser('status', parents=[collection_parser], help='显示系统状态')
+    
+    # collections命令
+    subparsers.add_parser('collections', help='列出所有集合')
+    
+    # compact-cache命令
+    compact_parser = subparsers.add_parser('compact-cache', help='压缩文档块嵌入缓存')
+    compact_parser.add_argument('--prune', action='store_true', help='删除当前索引中已不存在的文档块向量')
+    
+    # snapshot命令
+    snapshot_parser = subparsers.add_parser('snapshot', help='导出/导入索引快照（新副本无需重新嵌入）')
+    snapshot_subparsers = snapshot_parser.add_subparsers(dest='snapshot_command', required=True)
+    snapshot_export_parser = snapshot_subparsers.add_parser('export', parents=[collection_parser],
+                                                            help='导出集合当前索引')
+    snapshot_export_parser.add_argument('path', nargs='?', help='快照目录（默认 SNAPSHOT_PATH/<集合名>）')
+    snapshot_import_parser = snapshot_subparsers.add_parser('import', parents=[collection_parser],
+                                                            help='导入快照（原子切换，集合不存在时自动创建）')
+    snapshot_import_parser.add_argument('path', nargs='?', help='快照目录（默认 SNAPSHOT_PATH/<集合名>）')
+    snapshot_import_parser.add_argument('--no-verify', action='store_true', help='跳过 SHA-256 校验')
+    
+    # export-onnx命令
+    export_parser = subparsers.add_parser('export-onnx', help='导出嵌入模型为 ONNX（EMBEDDING_RUNTIME=onnx 时使用）')
+    export_parser.add_argument('--no-quantize', action='store_true', help='不生成 int8 动态量化模型')
+    export_parser.add_argument('--verify', action='store_true', help='与参考模型比较余弦相似度')
+    
+    # embed-server命令
+    server_parser = subparsers.add_parser('embed-server', help='启动本机共享嵌入服务（Unix socket）')
+    server_parser.add_argument('--socket', default=None,
+                               help=f'socket 路径（默认读取 EMBEDDING_SERVICE_SOCKET 或 {DEFAULT_EMBEDDING_SOCKET}）')
     
     args = parser.parse_args()
     
@@ -143,14 +289,26 @@ def main():
     
     try:
         if args.command == 'load':
-            load_documents()
+            load_documents(full=args.full, workers=args.workers, collection=args.collection,
+                           parse_workers=args.parse_workers)
         elif args.command == 'query':
             if args.question:
-                query_once(args.question)
+                query_once(args.question, collection=args.collection)
             else:
-                query_interactive()
+                query_interactive(collection=args.collection)
         elif args.command == 'status':
-            show_status()
+            show_status(collection=args.collection)
+        elif args.command == 'collections':
+            list_collections()
+        elif args.command == 'compact-cache':
+            compact_embedding_cache(prune=args.prune)
+        elif args.command == 'snapshot':
+            snapshot_command(args.snapshot_command, path=args.path, collection=args.collection,
+                             verify=not getattr(args, 'no_verify', False))
+        elif args.command == 'export-onnx':
+            export_onnx_model(quantize=not args.no_quantize, verify=args.verify)
+        elif args.command == 'embed-server':
+            run_embedding_server(args.socket)
     except Exception as e:
         print(f"错误: {e}", file=sys.stderr)
         sys.exit(1)
@@ -1,8 +1,17 @@
 """AI Agent核心模块"""
-from typing import List, Dict
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Tuple
 
 from ..core.config import settings
+from ..core.context_packer import ContextPacker, PackedContext
 from ..core.llm_adapter import LLMFactory, LLMAdapter
+from ..core.retrieval import RetrievalPipeline, RetrievalResult
+from ..services.answer_cache import create_answer_cache
+from ..services.compression import create_compressor
+from ..services.reranker import create_reranker
+from ..services.tokenizers import create_tokenizer
 from ..services.vector_store import VectorStore
 
 
@@ -12,6 +21,18 @@ class AIAgent:
     def __init__(self, vector_store: VectorStore):
         self.vector_store = vector_store
         self.top_k = settings.top_k
+        self.retrieval = RetrievalPipeline(
+            vector_store,
+            top_k=self.top_k,
+            reranker=create_reranker(),
+            rerank_candidates=settings.rerank_candidates,
+            mmr_lambda=settings.mmr_lambda if settings.mmr_enabled else None,
+            mmr_candidates=settings.mmr_candidates,
+            merge_adjacent=settings.merge_adjacent_chunks
+        )
+        
+        # 语义答案缓存（按集合独立，索引版本变化时失效）
+        self.answer_cache = self._create_answer_cache(vector_store.collection_name)
         
         # 初始化LLM适配器
         self.llm_adapter = LLMFactory.create_adapter(
@@ -23,24 +44,74 @@ class AIAgent:
             model_name=settings.model_name
         )
         
+        # 抽取式压缩（使用向量存储已加载的嵌入模型，未启用时为 None）
+        self.compressor = create_compressor(vector_store.encoder)
+        
+        # 按模型分词器控制提示词大小
+        self.context_packer = ContextPacker(
+            create_tokenizer(settings.tokenizer_model or self.llm_adapter.get_model_name()),
+            budget=settings.prompt_token_budget,
+            history_budget=settings.history_token_budget
+        )
+        
         print(f"✓ 已初始化LLM: {self.llm_adapter.get_model_name()}")
     
-    def build_context(self, query: str) -> str:
-        """从向量数据库检索相关文档构建上下文"""
-        # 检索相关文档
-        results = self.vector_store.query(query, top_k=self.top_k)
+    @staticmethod
+    def _create_answer_cache(collection_name: str):
+        """创建集合的语义答案缓存，未启用时返回 None"""
+        if not settings.answer_cache_enabled:
+            return None
         
-        if not results:
-            return ""
-        
-        # 构建上下文
-        context_parts = []
-        for i, result in enumerate(results, 1):
-            filename = result['metadata'].get('filename', '未知')
-            content = result['content']
-            context_parts.append(f"[文档{i}: {filename}]\n{content}")
+        cache_path = Path(settings.answer_cache_path)
+        if collection_name != settings.default_collection:
+            cache_path = cache_path / collection_name
+        return create_answer_cache(
+            backend=settings.answer_cache_backend,
+            cache_path=str(cache_path),
+            threshold=settings.answer_cache_threshold,
+            max_entries=settings.answer_cache_max_entries,
+            ttl=settings.answer_cache_ttl
+        )
+    
+    def for_collection(self, vector_store: VectorStore) -> "AIAgent":
+        """创建检索另一个集合的 Agent，共享 LLM 适配器和重排序器，答案缓存按集合独立"""
+        agent = copy.copy(self)
+        agent.vector_store = vector_store
+        agent.retrieval = RetrievalPipeline(
+            vector_store,
+            top_k=self.top_k,
+            reranker=self.retrieval.reranker,
+            rerank_candidates=self.retrieval.rerank_candidates,
+            mmr_lambda=self.retrieval.mmr_lambda,
+            mmr_candidates=self.retrieval.mmr_candidates,
+            merge_adjacent=self.retrieval.merge_adjacent
+        )
+        agent.compressor = create_compressor(vector_store.encoder)
+        agent.answer_cache = self._create_answer_cache(vector_store.collection_name)
+        return agent
+    
+    def retrieve(self, query: str, search_params: Dict = None, filters: Dict = None) -> RetrievalResult:
+        """检索相关文档（嵌入、检索、格式化各执行一次）"""
+        return self.retrieval.run(query, top_k=self.top_k, search_params=search_params, filters=filters)
+    
+    def build_context(self, query: str) -> str:
+        """从向量数据库检索相关文档，按 token 预算构建上下文"""
+        return self.pack_context(query, self.retrieve(query)).context
+    
+    def pack_context(self, query: str, retrieval: RetrievalResult,
+                     conversation_history: List[Dict[str, str]] = None) -> PackedContext:
+        """
+        构建 generate_prompt 使用的上下文：启用压缩时先只保留文档块中与问题相关的句子，
+        再按 token 预算打包文档块和对话历史，模板部分按不含文档内容的提示词计数
+        """
+        chunks, compression = retrieval.chunks, None
+        if self.compressor is not None and chunks:
+            # 查询向量在检索时已写入缓存，这里不会重复编码
+            chunks, compression = self.compressor.compress(self.vector_store.embed_query(query), chunks)
         
-        return "\n\n".join(context_parts)
+        packed = self.context_packer.pack(chunks, self.generate_prompt(query, "{context}"), conversation_history)
+        packed.compression = compression
+        return packed
     
     def generate_prompt(self, query: str, context: str) -> str:
         """生成提示词"""
@@ -62,19 +133,110 @@ class AIAgent:
         
         return prompt
     
-    def chat(self, query: str, conversation_history: List[Dict[str, str]] = None) -> Dict[str, str]:
+    def chat(self, query: str, conversation_history: List[Dict[str, str]] = None,
+             search_params: Dict = None, filters: Dict = None) -> Dict[str, str]:
         """
         与AI进行对话
         
         Args:
             query: 用户问题
             conversation_history: 对话历史，格式为 [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}]
+            search_params: 单次请求的检索参数，如 {"nprobe": 16}
+            filters: 元数据过滤条件，如 {"type": ".pdf", "tags": ["manual"]}
         
         Returns:
             包含回答和检索到的文档的字典
         """
+        # 多轮对话的答案依赖上下文，只对单轮问题使用语义缓存；
+        # 语义缓存不区分过滤条件和检索参数，带过滤条件或检索参数的问题不使用缓存
+        use_cache = (self.answer_cache is not None and not conversation_history
+                     and not filters and not search_params)
+        if use_cache:
+            index_version = self.vector_store.version
+            query_embedding = self.vector_store.embed_query(query)
+            cached = self.answer_cache.lookup(query_embedding, index_version)
+            if cached:
+                return {
+                    "answer": cached["answer"],
+                    "retrieved_docs": cached["retrieved_docs"],
+                    "has_context": cached["has_context"],
+                    "cached": True
+                }
+        
         # 检索相关文档
-        context = self.build_context(query)
+        retrieval = self.retrieve(query, search_params=search_params, filters=filters)
+        
+        return self._generate(
+            query, retrieval, conversation_history,
+            cache_key=(query_embedding, index_version) if use_cache else None
+        )
+    
+    def chat_batch(self, queries: List[str], max_concurrency: int = None,
+                   search_params: Dict = None, filters: Dict = None) -> List[Dict]:
+        """
+        批量问答：一次批量检索，LLM调用以有限并发执行
+        
+        Args:
+            queries: 问题列表
+            max_concurrency: LLM调用的最大并发数，不超过 BATCH_MAX_CONCURRENCY
+            search_params: 检索参数，同 chat
+            filters: 元数据过滤条件，同 chat，作用于所有问题
+        
+        Returns:
+            与输入顺序一致的结果列表，每项格式同 chat
+        """
+        if not queries:
+            return []
+        
+        # 并发数限制在 [1, BATCH_MAX_CONCURRENCY]，避免请求方启动任意多的线程和LLM调用
+        max_concurrency = min(max(max_concurrency or settings.batch_max_concurrency, 1),
+                              settings.batch_max_concurrency)
+        results = [None] * len(queries)
+        pending = list(range(len(queries)))
+        query_embeddings = [None] * len(queries)
+        index_version = self.vector_store.version
+        use_cache = self.answer_cache is not None and not filters and not search_params
+        
+        # 先查语义缓存，只对未命中的问题检索和调用LLM
+        if use_cache:
+            query_embeddings = self.vector_store.embed_queries(queries)
+            pending = []
+            for i, query_embedding in enumerate(query_embeddings):
+                cached = self.answer_cache.lookup(query_embedding, index_version)
+                if cached:
+                    results[i] = {
+                        "answer": cached["answer"],
+                        "retrieved_docs": cached["retrieved_docs"],
+                        "has_context": cached["has_context"],
+                        "cached": True
+                    }
+                else:
+                    pending.append(i)
+        
+        if not pending:
+            return results
+        
+        retrievals = self.retrieval.run_batch(
+            [queries[i] for i in pending], top_k=self.top_k, search_params=search_params, filters=filters
+        )
+        
+        def generate(i: int, retrieval: RetrievalResult) -> Dict:
+            cache_key = (query_embeddings[i], index_version) if use_cache else None
+            return self._generate(queries[i], retrieval, cache_key=cache_key)
+        
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            answers = executor.map(generate, pending, retrievals)
+            for i, answer in zip(pending, answers):
+                results[i] = answer
+        
+        return results
+    
+    def _generate(self, query: str, retrieval: RetrievalResult,
+                  conversation_history: List[Dict[str, str]] = None,
+                  cache_key: Tuple = None) -> Dict:
+        """根据检索结果调用LLM生成回答，cache_key 为 (查询向量, 索引版本) 时写入语义缓存"""
+        packed = self.pack_context(query, retrieval, conversation_history)
+        context = packed.context
         
         # 生成提示词
         prompt = self.generate_prompt(query, context)
@@ -82,9 +244,8 @@ class AIAgent:
         # 构建消息列表
         messages = []
         
-        # 添加历史对话（如果有）
-        if conversation_history:
-            messages.extend(conversation_history[-10:])  # 只保留最近10轮对话
+        # 添加历史对话（最近10条中预算内的部分）
+        messages.extend(packed.history)
         
         # 添加当前问题
         messages.append({"role": "user", "content": prompt})
@@ -96,14 +257,22 @@ class AIAgent:
                 temperature=0.7,
                 max_tokens=2000
             )
+            retrieved_docs = packed.to_docs()
             
-            # 检索用到的文档
-            retrieved_docs = self.vector_store.query(query, top_k=self.top_k)
+            if cache_key is not None:
+                query_embedding, index_version = cache_key
+                self.answer_cache.store(
+                    query_embedding, index_version,
+                    answer, retrieved_docs, bool(context)
+                )
             
             return {
                 "answer": answer,
                 "retrieved_docs": retrieved_docs,
-                "has_context": bool(context)
+                "has_context": bool(context),
+                "timings": retrieval.timings,
+                "token_usage": packed.token_usage,
+                "compression": packed.compression
             }
         
         except Exception as e:
@@ -15,7 +15,11 @@ import asyncio
 # from baml_client.types import ChatResponse, DocumentAnalysis, ReasoningResult
 
 from ..services.vector_store import VectorStore
+from ..services.reranker import create_reranker
+from ..services.tokenizers import create_tokenizer
 from ..core.config import settings
+from ..core.context_packer import ContextPacker, PackedContext
+from ..core.retrieval import RetrievalPipeline, RetrievedChunk
 
 
 class BAMLAgent:
@@ -31,6 +35,20 @@ class BAMLAgent:
     def __init__(self, vector_store: VectorStore):
         self.vector_store = vector_store
         self.top_k = settings.top_k
+        self.retrieval = RetrievalPipeline(
+            vector_store,
+            top_k=self.top_k,
+            reranker=create_reranker(),
+            rerank_candidates=settings.rerank_candidates,
+            mmr_lambda=settings.mmr_lambda if settings.mmr_enabled else None,
+            mmr_candidates=settings.mmr_candidates,
+            merge_adjacent=settings.merge_adjacent_chunks
+        )
+        self.context_packer = ContextPacker(
+            create_tokenizer(),
+            budget=settings.prompt_token_budget,
+            history_budget=settings.history_token_budget
+        )
         print(f"✓ 已初始化 BAML Agent")
     
     async def chat(self, query: str, conversation_history: Optional[List[Dict[str, str]]] = None):
@@ -50,8 +68,10 @@ class BAMLAgent:
                 - category: 问题分类
         """
         # 1. 检索相关文档
-        docs = self.vector_store.query(query, top_k=self.top_k)
-        context = self._build_context(docs)
+        retrieval = self.retrieval.run(query, top_k=self.top_k)
+        packed = self._build_context(query, retrieval.chunks, conversation_history)
+        docs = packed.chunks
+        context = packed.context
         has_context = bool(docs)
         
         try:
@@ -60,7 +80,7 @@ class BAMLAgent:
             """
             if conversation_history:
                 # 使用多轮对话函数
-                history_str = self._format_history(conversation_history)
+                history_str = self._format_history(packed.history)
                 response = await b.MultiTurnChat(
                     query=query,
                     context=context,
@@ -82,8 +102,9 @@ class BAMLAgent:
                 "answer": "BAML Agent 需要先安装 BAML 并生成客户端代码",
                 "confidence": 0.0,
                 "has_context": has_context,
-                "sources": [doc['metadata'].get('filename', '') for doc in docs],
+                "sources": [doc.metadata.get('filename', '') for doc in docs],
                 "category": "Unknown",
+                "token_usage": packed.token_usage,
                 "note": "请运行: pip install baml-py && baml-cli generate"
             }
         
@@ -153,18 +174,10 @@ class BAMLAgent:
             print(f"推理时出错: {e}")
             return None
     
-    def _build_context(self, docs: List[Dict]) -> str:
-        """构建上下文字符串"""
-        if not docs:
-            return ""
-        
-        context_parts = []
-        for i, doc in enumerate(docs, 1):
-            filename = doc['metadata'].get('filename', '未知')
-            content = doc['content']
-            context_parts.append(f"[文档{i}: {filename}]\n{content}")
-        
-        return "\n\n".join(context_parts)
+    def _build_context(self, query: str, docs: List[RetrievedChunk],
+                       history: Optional[List[Dict[str, str]]] = None) -> PackedContext:
+        """按 token 预算打包文档块和对话历史（Prompt 模板在 .baml 文件中，模板部分只按问题计数）"""
+        return self.context_packer.pack(docs, query, history)
     
     def _format_history(self, history: List[Dict[str, str]]) -> str:
         """格式化对话历史"""
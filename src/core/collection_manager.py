@@ -0,0 +1,197 @@
+"""多集合（多租户）管理模块
+
+每个集合有独立的向量存储、BM25索引、文档目录和语义答案缓存；嵌入模型、查询向量缓存和
+文档块嵌入缓存由所有集合共享（TextEncoder），LLM 适配器和重排序器也只创建一份。
+打开的集合按 LRU 保留，超过上限或空闲超时的集合会被关闭，再次访问时重新打开。
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from ..core.config import settings
+from ..core.agent import AIAgent
+from ..services.document_loader import DocumentLoader, TextSplitter
+from ..services.encoder import TextEncoder
+from ..services.ingestion import DocumentIndexer
+from ..services.vector_store import VectorStore
+
+# 与 ChromaDB 集合名规则兼容：3-63 个字符，字母数字开头和结尾；
+# 物理索引名会追加 ".g<代号>"，集合名最多 55 个字符
+COLLECTION_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{1,53}[A-Za-z0-9]$')
+
+
+def validate_collection_name(name: str) -> str:
+    """校验集合名称，不合法时抛出 ValueError"""
+    if not COLLECTION_NAME_PATTERN.match(name or ''):
+        raise ValueError(f"集合名称不合法: {name!r}（3-55 个字母、数字、下划线或连字符，以字母或数字开头和结尾）")
+    return name
+
+
+class CollectionHandle:
+    """一个打开的集合：向量存储、文档加载器、索引器和 Agent（Agent 在第一次问答时创建）"""
+
+    def __init__(self, name: str, vector_store: VectorStore, documents_path: str, manager: "CollectionManager"):
+        self.name = name
+        self.vector_store = vector_store
+        self.document_loader = DocumentLoader(documents_path)
+        self.indexer = DocumentIndexer(
+            self.document_loader,
+            TextSplitter(settings.chunk_size, settings.chunk_overlap),
+            vector_store
+        )
+        self.last_used = time.monotonic()
+        self.active = 0
+        self._manager = manager
+        self._agent = None
+        self._agent_lock = threading.Lock()
+
+    @property
+    def agent(self) -> AIAgent:
+        if self._agent is None:
+            with self._agent_lock:
+                if self._agent is None:
+                    self._agent = self._manager._create_agent(self)
+        return self._agent
+
+
+class CollectionManager:
+    """
+    集合管理器
+
+    Args:
+        db_path: 向量数据库路径
+        encoder: 共享的文本编码器，默认新建
+        max_open: 同时打开的集合数上限
+        idle_seconds: 集合空闲多久后关闭，0 表示不按空闲时间关闭
+    """
+
+    def __init__(self, db_path: Optional[str] = None, encoder: Optional[TextEncoder] = None,
+                 max_open: Optional[int] = None, idle_seconds: Optional[float] = None):
+        self.db_path = db_path or settings.vector_db_path
+        self.encoder = encoder or TextEncoder()
+        self.max_open = settings.collection_cache_size if max_open is None else max_open
+        self.idle_seconds = settings.collection_idle_seconds if idle_seconds is None else idle_seconds
+        self.default_name = settings.default_collection
+        self._handles: "OrderedDict[str, CollectionHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+        # 默认集合常驻，不参与淘汰
+        self.default = self.get(self.default_name, create=True)
+
+    def documents_path(self, name: str) -> str:
+        """集合的文档目录"""
+        if name == self.default_name:
+            return settings.documents_path
+        return str(Path(settings.collections_documents_path) / name)
+
+    def exists(self, name: str) -> bool:
+        """集合是否已创建（默认集合总是存在）"""
+        return name == self.default_name or name in self._handles or \
+            (Path(self.db_path) / f"{name}.version").exists()
+
+    def list_collections(self) -> List[str]:
+        """列出所有已创建的集合"""
+        names = {self.default_name} | set(self._handles)
+        db_path = Path(self.db_path)
+        if db_path.exists():
+            names |= {path.stem for path in db_path.glob('*.version') if COLLECTION_NAME_PATTERN.match(path.stem)}
+        return sorted(names)
+
+    def index_params(self, name: str) -> Dict:
+        """集合的索引配置覆盖（COLLECTION_INDEX_PARAMS 中该集合的项）"""
+        return dict(settings.collection_index_params.get(name, {}))
+
+    def get(self, name: Optional[str] = None, create: bool = False,
+            index_params: Optional[Dict] = None) -> CollectionHandle:
+        """
+        获取集合句柄
+
+        Args:
+            name: 集合名称，None 表示默认集合
+            create: 集合不存在时是否创建；为 False 时不存在的集合抛出 LookupError
+            index_params: 打开集合时使用的索引配置，覆盖 COLLECTION_INDEX_PARAMS 中的同名键；
+                集合已打开时忽略
+        """
+        name = validate_collection_name(name or self.default_name)
+        with self._lock:
+            handle = self._handles.get(name)
+            if handle is None:
+                if not create and not self.exists(name):
+                    raise LookupError(f"集合不存在: {name}")
+                params = dict(self.index_params(name), **(index_params or {}))
+                vector_store = VectorStore(self.db_path, collection_name=name, encoder=self.encoder,
+                                           index_params=params)
+                if create and name != self.default_name:
+                    vector_store.create()
+                handle = CollectionHandle(name, vector_store, self.documents_path(name), self)
+                self._handles[name] = handle
+            else:
+                self._handles.move_to_end(name)
+            handle.last_used = time.monotonic()
+            self._evict()
+        return handle
+
+    def acquire(self, name: Optional[str] = None, create: bool = False) -> CollectionHandle:
+        """获取集合句柄并标记为使用中，使用中的集合不会被淘汰；用完后调用 release"""
+        while True:
+            handle = self.get(name, create=create)
+            with self._lock:
+                # 获取句柄与标记之间集合可能刚好被淘汰，此时重新打开
+                if self._handles.get(handle.name) is handle:
+                    handle.active += 1
+                    return handle
+
+    def release(self, handle: CollectionHandle):
+        with self._lock:
+            handle.active -= 1
+            handle.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self, name: Optional[str] = None, create: bool = False) -> Iterator[CollectionHandle]:
+        """在 with 块内使用集合"""
+        handle = self.acquire(name, create=create)
+        try:
+            yield handle
+        finally:
+            self.release(handle)
+
+    def _evict(self):
+        """关闭超出数量上限或空闲超时的集合（调用方持有锁）"""
+        now = time.monotonic()
+        for name in list(self._handles):
+            handle = self._handles[name]
+            if name == self.default_name or handle.active:
+                continue
+            over_capacity = len(self._handles) > self.max_open
+            idle = self.idle_seconds and now - handle.last_used > self.idle_seconds
+            if not over_capacity and not idle:
+                continue
+            del self._handles[name]
+            handle.vector_store.close()
+            self.evictions += 1
+
+    def evict_idle(self):
+        """立即关闭空闲超时的集合"""
+        with self._lock:
+            self._evict()
+
+    def _create_agent(self, handle: CollectionHandle) -> AIAgent:
+        if handle is self.default:
+            return AIAgent(handle.vector_store)
+        # 共享默认集合 Agent 的 LLM 适配器和重排序器
+        return self.default.agent.for_collection(handle.vector_store)
+
+    def stats(self) -> Dict:
+        """获取打开的集合和淘汰统计"""
+        with self._lock:
+            return {
+                "open": list(self._handles),
+                "max_open": self.max_open,
+                "idle_seconds": self.idle_seconds,
+                "evictions": self.evictions
+            }
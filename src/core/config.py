@@ -1,6 +1,7 @@
 """配置管理模块"""
+from typing import Any, Dict
+
 from pydantic_settings import BaseSettings
-from pathlib import Path
 
 
 class Settings(BaseSettings):
@@ -22,8 +23,75 @@ class Settings(BaseSettings):
     # 模型配置
     model_name: str = "gpt-3.5-turbo"
     
-    # 向量数据库配置
+    # 向量数据库配置 - 后端支持: chroma, numpy
     vector_db_path: str = "./data/chroma_db"
+    vector_backend: str = "chroma"
+    
+    # NumPy后端向量精度 - 支持: float32, float16
+    numpy_backend_dtype: str = "float32"
+    
+    # NumPy后端ANN索引 - 支持: flat（精确检索）, ivf
+    ann_index: str = "flat"
+    ann_nlist: int = 0  # 0表示按数据量自动选择
+    ann_nprobe: int = 8
+    
+    # NumPy后端量化检索 - 支持: none, int8（压缩4倍）, binary（压缩32倍）
+    # 候选检索使用量化编码，top_k × quantization_rescore 个候选用全精度向量重打分
+    numpy_quantization: str = "none"
+    quantization_rescore: int = 4
+    
+    # ChromaDB HNSW参数（仅在创建集合时生效）
+    hnsw_construction_ef: int = 100
+    hnsw_m: int = 16
+    hnsw_search_ef: int = 10
+    
+    # 多集合（多租户）配置：默认集合使用 DOCUMENTS_PATH，其他集合的文档位于 COLLECTIONS_DOCUMENTS_PATH/<集合名>
+    default_collection: str = "documents"
+    collections_documents_path: str = "./knowledge_bases"
+    # 同时打开的集合数上限（LRU淘汰）和空闲淘汰时间（秒），嵌入模型由所有集合共享
+    collection_cache_size: int = 64
+    collection_idle_seconds: float = 600
+    # 按集合覆盖索引配置（JSON），键同 VectorStore 的 index_params，如
+    # {"product-a": {"ann_index": "ivf", "ann_nprobe": 16, "quantization": "int8"}}
+    collection_index_params: Dict[str, Dict[str, Any]] = {}
+    # 索引快照目录（snapshot export / import，新副本导入快照即可提供服务，无需重新嵌入）
+    snapshot_path: str = "./data/snapshots"
+    
+    # 嵌入模型配置
+    embedding_model: str = "all-MiniLM-L6-v2"
+    # 嵌入运行时 - 支持: torch（SentenceTransformer）, onnx（需先运行 export-onnx 导出模型）
+    embedding_runtime: str = "torch"
+    embedding_batch_size: int = 32
+    embedding_onnx_path: str = "./data/onnx_models"
+    embedding_onnx_quantized: bool = True
+    # 嵌入模型算子内线程数（torch / onnxruntime），0 表示使用默认值
+    embedding_intra_op_threads: int = 0
+    
+    # 共享嵌入服务（Unix socket，留空则在进程内编码）：多个 API 工作进程共用一份模型并合并批次
+    embedding_service_socket: str = ""
+    embedding_service_timeout: float = 30.0
+    embedding_service_max_batch: int = 64
+    embedding_service_window_ms: float = 5.0
+    
+    # 并发查询编码微批处理：第一个查询提交后最多等待窗口时间，合并到最大批大小后一次编码
+    query_batching_enabled: bool = True
+    query_batch_window_ms: float = 2.0
+    query_batch_max_size: int = 32
+    
+    # 批量导入配置：编码进程数（1 为进程内编码，0 为全部CPU核）和每批写入的文档块数
+    ingest_workers: int = 1
+    ingest_batch_size: int = 256
+    # 文档解析进程数（1 为进程内串行解析，0 为全部CPU核）；多进程时每个文件在独立进程中解析，
+    # 崩溃或超过 parse_timeout 秒的文件单独报告失败，不影响其他文件
+    parse_workers: int = 1
+    parse_timeout: float = 120
+    # API服务启动后在后台预加载模型（CLI等工具始终在第一次使用时才加载）
+    preload_models: bool = True
+    
+    # 文档块嵌入缓存配置
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "./data/embedding_cache"
+    embedding_cache_max_entries: int = 500000
     
     # 文档存储路径
     documents_path: str = "./knowledge_base"
@@ -37,14 +105,61 @@ class Settings(BaseSettings):
     chunk_overlap: int = 200
     top_k: int = 3
     
+    # 混合检索配置（BM25 + 稠密向量，倒数排名融合）
+    hybrid_search_enabled: bool = True
+    hybrid_candidates: int = 20  # 每路召回的候选数量
+    hybrid_rrf_k: int = 60
+    
+    # 交叉编码器重排序配置（过量召回 rerank_candidates 个候选后保留 top_k 个）
+    rerank_enabled: bool = False
+    rerank_model: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+    rerank_candidates: int = 20
+    rerank_batch_size: int = 32
+    rerank_budget_ms: float = 300
+    rerank_cache_size: int = 10000
+    rerank_queue_size: int = 8
+    
+    # 多样性选择（MMR）：从 mmr_candidates 个候选中按 λ·相关性 − (1−λ)·与已选文档块的最大相似度 选出 top_k 个
+    mmr_enabled: bool = True
+    mmr_lambda: float = 0.7
+    mmr_candidates: int = 20
+    # 同一文件中 chunk_id 相邻的已选文档块合并为一段并去掉重叠部分
+    merge_adjacent_chunks: bool = True
+    
+    # 抽取式压缩：按与问题的相似度保留每个文档块中得分最高的句子（比例）及其前后相邻句子，
+    # 句子数少于 compression_min_sentences 的文档块不压缩
+    compression_enabled: bool = False
+    compression_keep_ratio: float = 0.3
+    compression_neighbours: int = 1
+    compression_min_sentences: int = 4
+    
+    # 提示词 token 预算（按 LLM 模型的分词器计数，tokenizer_model 留空则使用 model_name）：
+    # 先扣除提示词模板和问题，对话历史最多占 history_token_budget，其余留给文档块；0 表示不限制
+    prompt_token_budget: int = 3000
+    history_token_budget: int = 1000
+    tokenizer_model: str = ""
+    
+    # 查询向量缓存配置（ttl单位：秒，0表示不过期）
+    query_cache_size: int = 1024
+    query_cache_ttl: float = 3600
+    
+    # 语义答案缓存配置 - 后端支持: memory, disk
+    # 默认关闭：只差型号等少量字符的问题嵌入相似度也很高，开启前应按语料调高阈值
+    answer_cache_enabled: bool = False
+    answer_cache_backend: str = "memory"
+    answer_cache_path: str = "./data/answer_cache"
+    answer_cache_threshold: float = 0.95
+    answer_cache_max_entries: int = 1000
+    answer_cache_ttl: float = 86400
+    
+    # 批量查询配置
+    batch_max_concurrency: int = 4
+    batch_max_queries: int = 1000
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
 
-# 创建全局配置实例
+# 创建全局配置实例（目录由写入数据的组件按需创建，导入时不访问文件系统）
 settings = Settings()
-
-# 确保必要的目录存在
-Path(settings.vector_db_path).parent.mkdir(parents=True, exist_ok=True)
-Path(settings.documents_path).mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,147 @@
+"""上下文打包模块
+
+按 token 预算组装提示词：先扣除提示词模板（系统指令和问题），对话历史从最近一条往前
+最多占用 history_budget，其余预算留给文档块。文档块按检索排名贪心装入，装不下的
+文档块在句子边界截断，截断后仍太短的跳过，后面更短的文档块继续尝试。
+"""
+from typing import Dict, List, Optional
+
+from ..services.compression import split_sentences
+from ..services.tokenizers import Tokenizer
+from .retrieval import RetrievedChunk, format_chunk
+
+# 只保留最近的对话历史条数
+MAX_HISTORY_MESSAGES = 10
+# 每条消息的角色和分隔符额外占用的 token 数
+MESSAGE_OVERHEAD_TOKENS = 4
+CHUNK_SEPARATOR = "\n\n"
+
+
+class PackedContext:
+    """打包结果：上下文、实际使用的文档块（截断的文档块为截断后的内容）、保留的对话历史和各部分 token 数
+
+    compression 为打包前抽取式压缩的统计，未压缩时为 None。
+    """
+
+    __slots__ = ('context', 'chunks', 'history', 'token_usage', 'compression')
+
+    def __init__(self, context: str, chunks: List[RetrievedChunk], history: List[Dict[str, str]],
+                 token_usage: Dict[str, int], compression: Optional[Dict[str, float]] = None):
+        self.context = context
+        self.chunks = chunks
+        self.history = history
+        self.token_usage = token_usage
+        self.compression = compression
+
+    def to_docs(self) -> List[Dict]:
+        """转换为 API 响应中的 retrieved_docs"""
+        return [chunk.to_dict() for chunk in self.chunks]
+
+
+class ContextPacker:
+    """
+    按 token 预算打包提示词上下文
+
+    Args:
+        tokenizer: 目标模型的分词器
+        budget: 提示词总预算（模板 + 历史 + 文档块），0 表示不限制
+        history_budget: 对话历史最多占用的 token 数
+        min_chunk_tokens: 截断后的文档块少于此 token 数时跳过
+    """
+
+    def __init__(self, tokenizer: Tokenizer, budget: int = 3000, history_budget: int = 1000,
+                 min_chunk_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.budget = budget
+        self.history_budget = history_budget
+        self.min_chunk_tokens = min_chunk_tokens
+
+    def _pack_history(self, history: List[Dict[str, str]], budget: Optional[int]):
+        """从最近一条往前保留整条消息，返回 (保留的消息, token 数)"""
+        kept, used = [], 0
+        for message in reversed(history[-MAX_HISTORY_MESSAGES:]):
+            tokens = self.tokenizer.count(message.get('content', '')) + MESSAGE_OVERHEAD_TOKENS
+            if budget is not None and used + tokens > budget:
+                break
+            kept.append(message)
+            used += tokens
+        kept.reverse()
+        return kept, used
+
+    def _trim(self, content: str, budget: int) -> Optional[str]:
+        """在句子边界截断到 budget 个 token 以内，不足 min_chunk_tokens 时返回 None"""
+        trimmed, used = [], 0
+        for sentence in split_sentences(content):
+            tokens = self.tokenizer.count(sentence)
+            if used + tokens > budget:
+                break
+            trimmed.append(sentence)
+            used += tokens
+        if used < self.min_chunk_tokens:
+            return None
+        return "".join(trimmed).rstrip()
+
+    def _pack_chunks(self, chunks: List[RetrievedChunk], budget: Optional[int]):
+        """按排名贪心装入文档块，返回 (文档块上下文片段, 使用的文档块, 截断数)"""
+        parts, packed, trimmed = [], [], 0
+        separator_tokens = self.tokenizer.count(CHUNK_SEPARATOR)
+        used = 0
+        for chunk in chunks:
+            index = len(packed) + 1
+            part = format_chunk(index, chunk)
+            tokens = self.tokenizer.count(part) + (separator_tokens if parts else 0)
+            if budget is None or used + tokens <= budget:
+                parts.append(part)
+                packed.append(chunk)
+                used += tokens
+                continue
+
+            header_tokens = tokens - self.tokenizer.count(chunk.content)
+            content = self._trim(chunk.content, budget - used - header_tokens)
+            if content is None:
+                continue
+            part = format_chunk(index, chunk, content)
+            parts.append(part)
+            packed.append(RetrievedChunk(chunk.id, content, dict(chunk.metadata, trimmed=True),
+                                         chunk.distance, chunk.score))
+            used += self.tokenizer.count(part) + (separator_tokens if len(parts) > 1 else 0)
+            trimmed += 1
+        return parts, packed, trimmed
+
+    def pack(self, chunks: List[RetrievedChunk], template: str,
+             history: Optional[List[Dict[str, str]]] = None) -> PackedContext:
+        """
+        打包上下文
+
+        Args:
+            chunks: 检索到的文档块，按排名排列
+            template: 不含文档内容的提示词（系统指令和问题），只用于计数
+            history: 对话历史
+
+        Returns:
+            PackedContext，token_usage 包含 budget、template、history、documents、total
+            以及 chunks_dropped、chunks_trimmed、history_dropped
+        """
+        history = history or []
+        template_tokens = self.tokenizer.count(template)
+        remaining = max(0, self.budget - template_tokens) if self.budget > 0 else None
+
+        history_budget = self.history_budget if remaining is None else min(self.history_budget, remaining)
+        kept_history, history_tokens = self._pack_history(history, history_budget)
+        if remaining is not None:
+            remaining -= history_tokens
+
+        parts, packed, trimmed = self._pack_chunks(chunks, remaining)
+        context = CHUNK_SEPARATOR.join(parts)
+        document_tokens = self.tokenizer.count(context) if context else 0
+
+        return PackedContext(context, packed, kept_history, {
+            'budget': self.budget,
+            'template': template_tokens,
+            'history': history_tokens,
+            'documents': document_tokens,
+            'total': template_tokens + history_tokens + document_tokens,
+            'chunks_dropped': len(chunks) - len(packed),
+            'chunks_trimmed': trimmed,
+            'history_dropped': min(len(history), MAX_HISTORY_MESSAGES) - len(kept_history)
+        })
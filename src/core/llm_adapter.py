@@ -1,21 +1,22 @@
-"""LLM适配器系统，支持多种LLM提供商"""
+"""LLM适配器系统，支持多种LLM提供商
+
+各提供商的SDK在第一次调用时才导入和创建客户端，导入本模块不会加载任何SDK。
+"""
 from abc import ABC, abstractmethod
+from importlib.util import find_spec
 from typing import List, Dict, Any
-import json
 
-# OpenAI
-from openai import OpenAI
 
-# Gemini (新SDK)
-try:
-    from google import genai
-    from google.genai import types
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+def _module_available(name: str) -> bool:
+    """检查模块是否已安装（不导入）"""
+    try:
+        return find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
 
-# GitHub Copilot (通过GitHub API)
-import requests
+
+# Gemini (新SDK)
+GEMINI_AVAILABLE = _module_available("google.genai")
 
 
 class LLMAdapter(ABC):
@@ -36,8 +37,17 @@ class OpenAIAdapter(LLMAdapter):
     """OpenAI适配器"""
     
     def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1", model: str = "gpt-3.5-turbo"):
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.api_key = api_key
+        self.base_url = base_url
         self.model = model
+        self._client = None
+    
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
     
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """调用OpenAI Chat API"""
@@ -63,9 +73,16 @@ class GeminiAdapter(LLMAdapter):
         if not GEMINI_AVAILABLE:
             raise ImportError("google-genai包未安装,请运行: pip install google-genai")
         
-        # 创建客户端
-        self.client = genai.Client(api_key=api_key)
+        self.api_key = api_key
         self.model_name = model
+        self._client = None
+    
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
     
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """调用Gemini API
@@ -90,6 +107,8 @@ class GeminiAdapter(LLMAdapter):
             # 构建system_instruction
             system_instruction = "\n".join(system_messages) if system_messages else None
             
+            from google.genai import types
+            
             # 配置生成参数
             config = types.GenerateContentConfig(
                 temperature=kwargs.get('temperature', 0.7),
@@ -0,0 +1,276 @@
+"""检索流水线模块
+
+一次请求只执行一次 嵌入 → 检索 → 格式化，结果同时用于构建提示词和 API 响应。
+"""
+import time
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from ..services.diversity import join_overlapping, mmr_select
+from ..services.reranker import Reranker
+from ..services.vector_store import VectorStore
+
+
+class RetrievedChunk:
+    """检索到的文档块，embedding 为存储的向量（只在需要 MMR 时取回，不返回给 API）"""
+
+    __slots__ = ('id', 'content', 'metadata', 'distance', 'score', 'embedding')
+
+    def __init__(self, id: str, content: str, metadata: Dict, distance: Optional[float] = None,
+                 score: Optional[float] = None, embedding: Optional[List[float]] = None):
+        self.id = id
+        self.content = content
+        self.metadata = metadata
+        self.distance = distance
+        self.score = score
+        self.embedding = embedding
+
+    @property
+    def filename(self) -> str:
+        return self.metadata.get('filename', '未知')
+
+    def to_dict(self) -> Dict:
+        """转换为 API 响应使用的字典"""
+        return {
+            'id': self.id,
+            'content': self.content,
+            'metadata': self.metadata,
+            'distance': self.distance,
+            'score': self.score
+        }
+
+    def __repr__(self) -> str:
+        return f"RetrievedChunk(id={self.id!r}, filename={self.filename!r}, distance={self.distance})"
+
+
+def format_chunk(index: int, chunk: RetrievedChunk, content: Optional[str] = None) -> str:
+    """提示词中的一个文档块，index 从 1 开始，content 为 None 时使用文档块内容"""
+    return f"[文档{index}: {chunk.filename}]\n{chunk.content if content is None else content}"
+
+
+def _merge_run(run: List[RetrievedChunk]) -> RetrievedChunk:
+    """合并同一文件中 chunk_id 连续的文档块（按 chunk_id 顺序传入）"""
+    content = run[0].content
+    for chunk in run[1:]:
+        content = join_overlapping(content, chunk.content)
+    distances = [chunk.distance for chunk in run if chunk.distance is not None]
+    scores = [chunk.score for chunk in run if chunk.score is not None]
+    return RetrievedChunk(
+        id=run[0].id,
+        content=content,
+        metadata=dict(run[0].metadata, chunk_ids=[chunk.metadata['chunk_id'] for chunk in run]),
+        distance=min(distances) if distances else None,
+        score=max(scores) if scores else None
+    )
+
+
+def merge_adjacent_chunks(chunks: List[RetrievedChunk]) -> List[RetrievedChunk]:
+    """把同一文件中 chunk_id 连续的文档块合并为一段并去掉重叠，合并后的位置取其中排名最靠前的文档块"""
+    by_path: Dict[str, List[Tuple[int, int]]] = {}
+    for rank, chunk in enumerate(chunks):
+        path, chunk_id = chunk.metadata.get('path'), chunk.metadata.get('chunk_id')
+        if path is not None and chunk_id is not None:
+            by_path.setdefault(path, []).append((int(chunk_id), rank))
+
+    merged: Dict[int, RetrievedChunk] = {}
+    absorbed = set()
+    for members in by_path.values():
+        if len(members) < 2:
+            continue
+        members.sort()
+        run = [members[0]]
+        for member in members[1:] + [None]:
+            if member is not None and member[0] == run[-1][0] + 1:
+                run.append(member)
+                continue
+            if len(run) > 1:
+                ranks = [rank for _, rank in run]
+                merged[min(ranks)] = _merge_run([chunks[rank] for rank in ranks])
+                absorbed.update(rank for rank in ranks if rank != min(ranks))
+            run = [member]
+
+    if not merged:
+        return chunks
+    return [merged.get(rank, chunk) for rank, chunk in enumerate(chunks) if rank not in absorbed]
+
+
+class RetrievalResult:
+    """一次检索的结果，包含文档块和各阶段耗时（毫秒）"""
+
+    __slots__ = ('query', 'chunks', 'timings')
+
+    def __init__(self, query: str, chunks: List[RetrievedChunk], timings: Dict[str, float]):
+        self.query = query
+        self.chunks = chunks
+        self.timings = timings
+
+    def __bool__(self) -> bool:
+        return bool(self.chunks)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def build_context(self) -> str:
+        """将文档块拼接为提示词上下文"""
+        return "\n\n".join(format_chunk(i, chunk) for i, chunk in enumerate(self.chunks, 1))
+
+    def to_docs(self) -> List[Dict]:
+        """转换为 API 响应中的 retrieved_docs"""
+        return [chunk.to_dict() for chunk in self.chunks]
+
+
+class RetrievalPipeline:
+    """检索流水线：嵌入 → 检索 → 格式化 [→ 重排序] [→ MMR] [→ 合并相邻文档块]，每个阶段只执行一次并记录耗时
+
+    配置了重排序器时，检索阶段过量召回 rerank_candidates 个候选，重排序后保留 top_k 个。
+    启用 MMR（mmr_lambda 不为 None）时过量召回 mmr_candidates 个候选并取回存储的向量，
+    重排序只排序不截断，再由 MMR 选出 top_k 个互不重复的文档块；有重排序得分时以其作为相关性。
+    merge_adjacent 为 True 时，同一文件中 chunk_id 相邻的已选文档块合并为一段并去掉重叠。
+    """
+
+    def __init__(self, vector_store: VectorStore, top_k: int = 3,
+                 reranker: Optional[Reranker] = None, rerank_candidates: int = 20,
+                 mmr_lambda: Optional[float] = None, mmr_candidates: int = 20,
+                 merge_adjacent: bool = False):
+        self.vector_store = vector_store
+        self.top_k = top_k
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.mmr_lambda = mmr_lambda
+        self.mmr_candidates = mmr_candidates
+        self.merge_adjacent = merge_adjacent
+
+    def _fetch_k(self, top_k: int) -> int:
+        """检索阶段的召回数量"""
+        fetch_k = top_k
+        if self.reranker is not None:
+            fetch_k = max(fetch_k, self.rerank_candidates)
+        if self.mmr_lambda is not None:
+            fetch_k = max(fetch_k, self.mmr_candidates)
+        return fetch_k
+
+    def _rerank(self, query: str, chunks: List[RetrievedChunk], top_k: int,
+                timings: Dict[str, float]) -> Tuple[List[RetrievedChunk], bool]:
+        """重排序阶段，超出时间预算时保持检索顺序；返回 (文档块, 是否完成重排序)"""
+        if self.reranker is None:
+            return chunks, False
+
+        start = time.perf_counter()
+        chunks, completed = self.reranker.rerank(query, chunks, top_k)
+        timings['rerank_ms'] = timings.get('rerank_ms', 0.0) + (time.perf_counter() - start) * 1000
+        if not completed:
+            timings['rerank_fallbacks'] = timings.get('rerank_fallbacks', 0) + 1
+        return chunks, completed
+
+    def _diversify(self, query_embedding: List[float], chunks: List[RetrievedChunk], top_k: int,
+                   reranked: bool, timings: Dict[str, float]) -> List[RetrievedChunk]:
+        """MMR 阶段：从候选中选出 top_k 个，缺少向量时按原顺序截取"""
+        if self.mmr_lambda is None or len(chunks) <= top_k or any(chunk.embedding is None for chunk in chunks):
+            return chunks[:top_k]
+
+        start = time.perf_counter()
+        relevance = None
+        if reranked:
+            # 重排序得分比向量相似度更准确，归一化到 [0, 1] 后作为相关性
+            scores = np.array([chunk.score for chunk in chunks], dtype=np.float32)
+            spread = scores.max() - scores.min()
+            relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+        selected = mmr_select(query_embedding, [chunk.embedding for chunk in chunks], top_k,
+                              lambda_mult=self.mmr_lambda, relevance=relevance)
+        timings['mmr_ms'] = timings.get('mmr_ms', 0.0) + (time.perf_counter() - start) * 1000
+        return [chunks[i] for i in selected]
+
+    def _select(self, query: str, query_embedding: List[float], chunks: List[RetrievedChunk], top_k: int,
+                timings: Dict[str, float]) -> List[RetrievedChunk]:
+        """重排序 → MMR → 合并相邻文档块"""
+        keep_k = len(chunks) if self.mmr_lambda is not None else top_k
+        chunks, reranked = self._rerank(query, chunks, keep_k, timings)
+        chunks = self._diversify(query_embedding, chunks, top_k, reranked, timings)
+
+        if self.merge_adjacent:
+            start = time.perf_counter()
+            chunks = merge_adjacent_chunks(chunks)
+            timings['merge_ms'] = timings.get('merge_ms', 0.0) + (time.perf_counter() - start) * 1000
+        return chunks
+
+    @staticmethod
+    def _to_chunks(results: List[Dict]) -> List[RetrievedChunk]:
+        return [
+            RetrievedChunk(
+                id=result.get('id'),
+                content=result['content'],
+                metadata=result['metadata'] or {},
+                distance=result.get('distance'),
+                score=result.get('score'),
+                embedding=result.get('embedding')
+            )
+            for result in results
+        ]
+
+    def run(self, query: str, top_k: Optional[int] = None,
+            search_params: Optional[Dict] = None, filters: Optional[Dict] = None) -> RetrievalResult:
+        """执行检索，filters 为元数据过滤条件"""
+        top_k = top_k or self.top_k
+        timings = {}
+
+        start = time.perf_counter()
+        query_embedding = self.vector_store.embed_query(query)
+        timings['embed_ms'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        results = self.vector_store.search(query_embedding, top_k=self._fetch_k(top_k),
+                                           search_params=search_params, query_text=query,
+                                           filters=filters, include_embeddings=self.mmr_lambda is not None)
+        timings['search_ms'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        chunks = self._to_chunks(results)
+        timings['format_ms'] = (time.perf_counter() - start) * 1000
+
+        chunks = self._select(query, query_embedding, chunks, top_k, timings)
+
+        timings['total_ms'] = sum(value for key, value in timings.items() if key.endswith('_ms'))
+        return RetrievalResult(query, chunks, timings)
+
+    def run_batch(self, queries: List[str], top_k: Optional[int] = None,
+                  search_params: Optional[Dict] = None,
+                  filters: Optional[Dict] = None) -> List[RetrievalResult]:
+        """批量检索：所有问题一次批量嵌入、一次向量检索
+
+        返回结果与输入顺序一致，各结果共享整批的阶段耗时。
+        """
+        if not queries:
+            return []
+
+        top_k = top_k or self.top_k
+        timings = {'batch_size': len(queries)}
+
+        start = time.perf_counter()
+        query_embeddings = self.vector_store.embed_queries(queries)
+        timings['embed_ms'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        batch_results = self.vector_store.search_batch(query_embeddings, top_k=self._fetch_k(top_k),
+                                                       search_params=search_params, query_texts=queries,
+                                                       filters=filters,
+                                                       include_embeddings=self.mmr_lambda is not None)
+        timings['search_ms'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        batch_chunks = [self._to_chunks(results) for results in batch_results]
+        timings['format_ms'] = (time.perf_counter() - start) * 1000
+
+        batch_chunks = [
+            self._select(query, query_embedding, chunks, top_k, timings)
+            for query, query_embedding, chunks in zip(queries, query_embeddings, batch_chunks)
+        ]
+
+        timings['total_ms'] = sum(value for key, value in timings.items() if key.endswith('_ms'))
+        return [
+            RetrievalResult(query, chunks, timings)
+            for query, chunks in zip(queries, batch_chunks)
+        ]
@@ -0,0 +1,145 @@
+"""近似最近邻索引模块
+
+IVF（倒排文件）索引：用 k-means 把向量划分为 nlist 个簇，检索时只扫描
+离查询最近的 nprobe 个簇。nprobe 越大召回越高、延迟越高。
+"""
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def _sq_norms(vectors: np.ndarray) -> np.ndarray:
+    return np.einsum('ij,ij->i', vectors, vectors)
+
+
+def assign_to_centroids(vectors: np.ndarray, centroids: np.ndarray, block_rows: int = 65536) -> np.ndarray:
+    """把每个向量分配给平方L2距离最近的中心"""
+    centroid_sq_norms = _sq_norms(centroids)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        scores = 2 * (block @ centroids.T) - centroid_sq_norms
+        assignments[start:start + block_rows] = np.argmax(scores, axis=1)
+    return assignments
+
+
+def train_kmeans(vectors: np.ndarray, nlist: int, iterations: int = 20,
+                 max_samples: int = 256, seed: int = 0) -> np.ndarray:
+    """
+    训练 k-means 中心
+
+    Args:
+        vectors: 训练向量
+        nlist: 簇数量
+        iterations: 迭代次数
+        max_samples: 每个簇最多使用的训练样本数
+        seed: 随机种子
+
+    Returns:
+        (nlist, dim) 的中心矩阵
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_size = min(n, nlist * max_samples)
+    sample_rows = np.sort(rng.choice(n, size=sample_size, replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+
+    centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_to_centroids(sample, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+        sums = np.stack([
+            np.bincount(assignments, weights=sample[:, d], minlength=nlist)
+            for d in range(sample.shape[1])
+        ], axis=1).astype(np.float32)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # 空簇重新随机取一个样本作为中心
+        if empty.any():
+            centroids[empty] = sample[rng.choice(sample_size, size=int(empty.sum()), replace=False)]
+
+    return centroids
+
+
+class IVFIndex:
+    """IVF-Flat 索引
+
+    只索引矩阵的前 built_rows 行，之后追加的行由调用方精确扫描。
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, nprobe: int = 8):
+        self.centroids = centroids.astype(np.float32)
+        self.centroid_sq_norms = _sq_norms(self.centroids)
+        self.nprobe = nprobe
+        self.assignments = assignments.astype(np.int32)
+        self.built_rows = len(assignments)
+
+        # 按簇排序后的行号，以及每个簇在其中的起止位置
+        self.order = np.argsort(assignments, kind='stable').astype(np.int64)
+        counts = np.bincount(assignments, minlength=len(self.centroids))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: Optional[int] = None, nprobe: int = 8,
+              iterations: int = 20) -> "IVFIndex":
+        """
+        构建索引
+
+        Args:
+            vectors: (rows, dim) 向量矩阵，可以是 np.memmap
+            nlist: 簇数量，默认 4·sqrt(rows)
+            nprobe: 默认探测簇数
+            iterations: k-means 迭代次数
+        """
+        rows = len(vectors)
+        if not nlist:
+            nlist = max(1, int(4 * np.sqrt(rows)))
+        nlist = min(nlist, rows)
+
+        centroids = train_kmeans(vectors, nlist, iterations=iterations)
+        assignments = assign_to_centroids(vectors, centroids)
+        return cls(centroids, assignments, nprobe=nprobe)
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """返回离查询最近的 nprobe 个簇中的行号"""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        scores = 2 * (self.centroids @ query) - self.centroid_sq_norms
+        if nprobe < self.nlist:
+            probes = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(self.nlist)
+
+        return np.concatenate([
+            self.order[self.offsets[c]:self.offsets[c + 1]]
+            for c in probes
+        ])
+
+    def save(self, path: Path):
+        """保存索引"""
+        tmp_path = path.with_name(path.name + '.tmp.npz')
+        np.savez(tmp_path, centroids=self.centroids, assignments=self.assignments, nprobe=self.nprobe)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["IVFIndex"]:
+        """加载索引，不存在时返回 None"""
+        if not path.exists():
+            return None
+
+        with np.load(path) as data:
+            return cls(data['centroids'], data['assignments'], nprobe=int(data['nprobe']))
+
+    def stats(self) -> Dict:
+        """获取索引参数"""
+        return {
+            "type": "ivf",
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "built_rows": self.built_rows
+        }
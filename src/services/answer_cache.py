@@ -0,0 +1,269 @@
+"""语义答案缓存模块
+
+按查询向量的余弦相似度查找已回答过的问题，命中时直接返回之前的答案，
+省去一次完整的LLM调用。缓存项记录生成时的索引版本，知识库变化后自动失效。
+"""
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Dict, Optional
+
+import numpy as np
+
+
+class AnswerCacheEntry:
+    """缓存项"""
+
+    __slots__ = ('embedding', 'answer', 'retrieved_docs', 'has_context', 'version', 'created_at')
+
+    def __init__(self, embedding: np.ndarray, answer: str, retrieved_docs: List[Dict],
+                 has_context: bool, version: str, created_at: Optional[float] = None):
+        self.embedding = embedding
+        self.answer = answer
+        self.retrieved_docs = retrieved_docs
+        self.has_context = has_context
+        self.version = version
+        self.created_at = created_at if created_at is not None else time.time()
+
+    def to_dict(self) -> Dict:
+        return {
+            'embedding': self.embedding.tolist(),
+            'answer': self.answer,
+            'retrieved_docs': self.retrieved_docs,
+            'has_context': self.has_context,
+            'version': self.version,
+            'created_at': self.created_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "AnswerCacheEntry":
+        return cls(
+            embedding=np.asarray(data['embedding'], dtype=np.float32),
+            answer=data['answer'],
+            retrieved_docs=data['retrieved_docs'],
+            has_context=data['has_context'],
+            version=data['version'],
+            created_at=data['created_at']
+        )
+
+
+class AnswerCacheBackend(ABC):
+    """答案缓存存储后端基类"""
+
+    @abstractmethod
+    def load(self) -> List[AnswerCacheEntry]:
+        """加载已有缓存项"""
+        pass
+
+    @abstractmethod
+    def append(self, entry: AnswerCacheEntry):
+        """追加一个缓存项"""
+        pass
+
+    @abstractmethod
+    def rewrite(self, entries: List[AnswerCacheEntry]):
+        """用给定缓存项覆盖存储（淘汰或失效后调用）"""
+        pass
+
+
+class MemoryAnswerCacheBackend(AnswerCacheBackend):
+    """内存后端，进程退出后缓存丢失"""
+
+    def load(self) -> List[AnswerCacheEntry]:
+        return []
+
+    def append(self, entry: AnswerCacheEntry):
+        pass
+
+    def rewrite(self, entries: List[AnswerCacheEntry]):
+        pass
+
+
+class DiskAnswerCacheBackend(AnswerCacheBackend):
+    """本地磁盘后端，使用追加写入的JSONL文件"""
+
+    def __init__(self, cache_path: str):
+        self.cache_dir = Path(cache_path)
+        self.cache_file = self.cache_dir / "answers.jsonl"
+
+    def load(self) -> List[AnswerCacheEntry]:
+        entries = []
+        if not self.cache_file.exists():
+            return entries
+
+        with open(self.cache_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(AnswerCacheEntry.from_dict(json.loads(line)))
+                except (ValueError, KeyError) as e:
+                    print(f"跳过损坏的答案缓存项: {e}")
+        return entries
+
+    def append(self, entry: AnswerCacheEntry):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry.to_dict(), ensure_ascii=False) + "\n")
+
+    def rewrite(self, entries: List[AnswerCacheEntry]):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry.to_dict(), ensure_ascii=False) + "\n")
+        tmp_file.replace(self.cache_file)
+
+
+class SemanticAnswerCache:
+    """语义答案缓存
+
+    Args:
+        backend: 存储后端
+        threshold: 余弦相似度阈值，高于该值视为同一问题
+        max_entries: 最大缓存项数，超出时淘汰最早的缓存项
+        ttl: 缓存项有效期（秒），0表示不过期
+    """
+
+    def __init__(self, backend: AnswerCacheBackend, threshold: float = 0.95,
+                 max_entries: int = 1000, ttl: float = 86400):
+        self.backend = backend
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: List[AnswerCacheEntry] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        for entry in backend.load():
+            entry.embedding = self._normalize(entry.embedding)
+            self._entries.append(entry)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _sync_version(self, version: str):
+        """索引版本变化时丢弃所有旧缓存项（需持有锁）"""
+        if self._version == version:
+            return
+
+        stale = [entry for entry in self._entries if entry.version != version]
+        if stale:
+            self._entries = [entry for entry in self._entries if entry.version == version]
+            self._matrix = None
+            self.invalidations += len(stale)
+            self.backend.rewrite(self._entries)
+        self._version = version
+
+    def _expire(self):
+        """移除过期缓存项（需持有锁）"""
+        if not self.ttl:
+            return
+
+        deadline = time.time() - self.ttl
+        if self._entries and self._entries[0].created_at < deadline:
+            self._entries = [entry for entry in self._entries if entry.created_at >= deadline]
+            self._matrix = None
+            self.backend.rewrite(self._entries)
+
+    def lookup(self, embedding, version: str) -> Optional[Dict]:
+        """查找相似问题的答案，未命中返回 None"""
+        query = self._normalize(embedding)
+
+        with self._lock:
+            self._sync_version(version)
+            self._expire()
+
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix = np.vstack([entry.embedding for entry in self._entries])
+
+            scores = self._matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            entry = self._entries[best]
+            return {
+                "answer": entry.answer,
+                "retrieved_docs": entry.retrieved_docs,
+                "has_context": entry.has_context,
+                "similarity": float(scores[best])
+            }
+
+    def store(self, embedding, version: str, answer: str, retrieved_docs: List[Dict], has_context: bool):
+        """写入一个缓存项"""
+        if self.max_entries <= 0:
+            return
+
+        entry = AnswerCacheEntry(self._normalize(embedding), answer, retrieved_docs, has_context, version)
+
+        with self._lock:
+            self._sync_version(version)
+            self._entries.append(entry)
+            self._matrix = None
+
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+                self.backend.rewrite(self._entries)
+            else:
+                self.backend.append(entry)
+
+    def invalidate(self):
+        """清空所有缓存项"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries = []
+            self._matrix = None
+            self.backend.rewrite(self._entries)
+
+    def stats(self) -> Dict:
+        """获取命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "invalidations": self.invalidations
+            }
+
+
+def create_answer_cache(backend: str, cache_path: str, **kwargs) -> SemanticAnswerCache:
+    """
+    创建语义答案缓存
+
+    Args:
+        backend: 存储后端 ('memory', 'disk')
+        cache_path: 磁盘后端的缓存目录
+        **kwargs: 传递给 SemanticAnswerCache 的参数
+
+    Returns:
+        语义答案缓存实例
+    """
+    backend = backend.lower()
+
+    if backend == "memory":
+        return SemanticAnswerCache(MemoryAnswerCacheBackend(), **kwargs)
+    elif backend == "disk":
+        return SemanticAnswerCache(DiskAnswerCacheBackend(cache_path), **kwargs)
+    else:
+        raise ValueError(f"不支持的答案缓存后端: {backend}。支持的后端: memory, disk")
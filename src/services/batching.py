@@ -0,0 +1,130 @@
+"""微批处理模块
+
+把多个线程并发提交的小编码请求在一个时间窗口内合并为一次 encode 调用，
+提高批量推理的利用率。排队等待时间和批大小记录为直方图。
+"""
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from .metrics import Histogram
+
+QUEUE_WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class _Request:
+    __slots__ = ('texts', 'done', 'result', 'error', 'enqueued')
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    微批调度器
+
+    从第一个请求提交起最多等待 window_ms 毫秒收集后续请求，合并的文本数达到
+    max_batch_size 时立即执行。单个请求超过 max_batch_size 时不拆分。
+
+    Args:
+        encode_fn: 批量编码函数，输入文本列表，返回 (n, dim) 矩阵
+        max_batch_size: 每批最多文本数
+        window_ms: 收集窗口（毫秒）
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch_size: int = 64,
+                 window_ms: float = 5.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        # 请求从提交到所在批次开始编码的等待时间，以及每批合并的文本数
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> np.ndarray:
+        """提交文本并等待编码结果"""
+        if self._stopped:
+            raise RuntimeError("微批调度器已关闭")
+        request = _Request(texts)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def close(self):
+        """停止调度线程，已提交的请求会先处理完"""
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> Dict:
+        """获取配置和直方图快照"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000,
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            "batch_size": self.batch_size.snapshot()
+        }
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        requests = [first]
+        count = len(first.texts)
+        # 窗口从第一个请求提交时算起，上一批编码期间已排队的请求不再额外等待，
+        # 但仍会合并进本批
+        deadline = first.enqueued + self.window
+
+        while count < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    request = self._queue.get(timeout=remaining)
+                else:
+                    # 窗口已过：不再等待，但把已排队的请求一并取走
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # 处理完本批后退出
+                self._queue.put(None)
+                break
+            requests.append(request)
+            count += len(request.texts)
+
+        return requests
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            requests = self._collect(first)
+            texts = [text for request in requests for text in request.texts]
+            started = time.perf_counter()
+            for request in requests:
+                self.queue_wait_ms.observe((started - request.enqueued) * 1000)
+            self.batch_size.observe(len(texts))
+            try:
+                embeddings = self.encode_fn(texts)
+                offset = 0
+                for request in requests:
+                    request.result = embeddings[offset:offset + len(request.texts)]
+                    offset += len(request.texts)
+            except Exception as e:
+                for request in requests:
+                    request.error = e
+            for request in requests:
+                request.done.set()
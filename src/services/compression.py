@@ -0,0 +1,139 @@
+"""抽取式压缩模块
+
+文档块（默认 1000 字符）中通常只有少数句子与问题相关，LLM 延迟随输入 token 数增长。
+压缩阶段把检索到的文档块切分为句子，用已加载的嵌入模型一次批量编码所有句子，
+按与查询向量的余弦相似度保留每个文档块中得分最高的句子及其前后相邻句子，
+不连续的句子之间用省略号连接。
+"""
+import copy
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from .encoder import TextEncoder
+
+# 句子结束符（中文句号、叹号、问号和分号，英文标点后跟空白，换行）
+_SENTENCE_END_RE = re.compile(r'(?<=[。！？；!?;])|(?<=[.])(?=\s)|(?<=\n)')
+# 被省略的句子用省略号代替
+GAP_MARKER = "……"
+
+
+def split_sentences(text: str) -> List[str]:
+    """按句子结束符切分，保留结束符和空白，各句首尾相接即为原文"""
+    return [sentence for sentence in _SENTENCE_END_RE.split(text) if sentence]
+
+
+class SentenceCompressor:
+    """
+    查询相关的抽取式压缩
+
+    Args:
+        encoder: 文本编码器（与向量存储共享，不额外加载模型）
+        keep_ratio: 每个文档块保留的最高分句子比例（至少 1 句）
+        neighbours: 每个保留句子前后额外保留的句子数
+        min_sentences: 句子数少于此值的文档块不压缩
+    """
+
+    def __init__(self, encoder: TextEncoder, keep_ratio: float = 0.3, neighbours: int = 1,
+                 min_sentences: int = 4):
+        self.encoder = encoder
+        self.keep_ratio = keep_ratio
+        self.neighbours = neighbours
+        self.min_sentences = min_sentences
+
+    def _keep(self, scores: np.ndarray) -> List[int]:
+        """得分最高的句子及其相邻句子的下标（按原文顺序）"""
+        n = len(scores)
+        top = np.argsort(-scores, kind='stable')[:max(1, int(np.ceil(self.keep_ratio * n)))]
+        keep = np.zeros(n, dtype=bool)
+        for i in top:
+            keep[max(0, i - self.neighbours):i + self.neighbours + 1] = True
+        return np.flatnonzero(keep).tolist()
+
+    @staticmethod
+    def _join(sentences: List[str], kept: List[int]) -> str:
+        """按原文顺序拼接保留的句子，省略的部分用省略号代替"""
+        runs, run = [], [kept[0]]
+        for i in kept[1:]:
+            if i != run[-1] + 1:
+                runs.append(run)
+                run = []
+            run.append(i)
+        runs.append(run)
+
+        text = GAP_MARKER.join("".join(sentences[i] for i in run).strip() for run in runs)
+        if kept[0] > 0:
+            text = GAP_MARKER + text
+        if kept[-1] < len(sentences) - 1:
+            text += GAP_MARKER
+        return text
+
+    def compress(self, query_embedding: List[float], chunks: List) -> Tuple[List, Dict[str, float]]:
+        """
+        压缩文档块
+
+        Args:
+            query_embedding: 查询向量
+            chunks: 检索到的文档块（RetrievedChunk）
+
+        Returns:
+            (压缩后的文档块, 统计)；统计包含 sentences、kept_sentences、original_chars、
+            compressed_chars、ratio（压缩后/压缩前字符数）和 compress_ms
+        """
+        start = time.perf_counter()
+        # 每个文档块的非空白句子；句子太少的文档块不参与编码
+        split = []
+        for chunk in chunks:
+            sentences = [sentence for sentence in split_sentences(chunk.content) if sentence.strip()]
+            split.append(sentences if len(sentences) >= self.min_sentences else None)
+
+        texts = [sentence for sentences in split if sentences for sentence in sentences]
+        compressed = list(chunks)
+        kept_sentences = 0
+        if texts:
+            # 所有文档块的句子一次批量编码
+            embeddings = self.encoder.embedder.encode(texts)
+            # 不原地归一化：远程嵌入服务返回的是只读的 frombuffer 视图
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+            query = np.asarray(query_embedding, dtype=np.float32)
+            scores = embeddings @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+            offset = 0
+            for i, sentences in enumerate(split):
+                if not sentences:
+                    continue
+                kept = self._keep(scores[offset:offset + len(sentences)])
+                offset += len(sentences)
+                kept_sentences += len(kept)
+                if len(kept) < len(sentences):
+                    chunk = copy.copy(chunks[i])
+                    chunk.content = self._join(sentences, kept)
+                    chunk.metadata = dict(chunk.metadata, compressed=True)
+                    compressed[i] = chunk
+
+        original_chars = sum(len(chunk.content) for chunk in chunks)
+        compressed_chars = sum(len(chunk.content) for chunk in compressed)
+        return compressed, {
+            'sentences': len(texts),
+            'kept_sentences': kept_sentences,
+            'original_chars': original_chars,
+            'compressed_chars': compressed_chars,
+            'ratio': compressed_chars / original_chars if original_chars else 1.0,
+            'compress_ms': (time.perf_counter() - start) * 1000
+        }
+
+
+def create_compressor(encoder: TextEncoder) -> Optional[SentenceCompressor]:
+    """根据配置创建压缩器，未启用时返回 None"""
+    if not settings.compression_enabled:
+        return None
+
+    return SentenceCompressor(
+        encoder,
+        keep_ratio=settings.compression_keep_ratio,
+        neighbours=settings.compression_neighbours,
+        min_sentences=settings.compression_min_sentences
+    )
@@ -0,0 +1,75 @@
+"""多样性选择模块
+
+文档块之间有重叠（TextSplitter 的 chunk_overlap），检索结果常包含同一段落的相邻文档块，
+放进提示词的内容大量重复。最大边际相关性（MMR）从过量召回的候选中逐个选择
+λ·相关性 − (1 − λ)·与已选文档块的最大相似度 最高的文档块，兼顾相关性和多样性。
+"""
+from typing import List, Optional
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr_select(query_embedding, embeddings, top_k: int, lambda_mult: float = 0.7,
+               relevance: Optional[np.ndarray] = None) -> List[int]:
+    """
+    最大边际相关性选择
+
+    Args:
+        query_embedding: 查询向量
+        embeddings: (n, dim) 候选文档块向量，按上游排序
+        top_k: 选择数量
+        lambda_mult: 相关性权重，1 为只看相关性，0 为只看多样性
+        relevance: 候选的相关性得分（如重排序得分，应归一化到 [0, 1]），默认为与查询的余弦相似度
+
+    Returns:
+        选中候选的下标，按选择顺序排列；得分相同时保持上游顺序
+    """
+    candidates = _normalize(np.asarray(embeddings, dtype=np.float32))
+    n = len(candidates)
+    if n <= top_k:
+        return list(range(n))
+
+    if relevance is None:
+        relevance = candidates @ _normalize(np.asarray(query_embedding, dtype=np.float32))
+    relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = candidates @ candidates.T
+
+    selected = []
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(top_k):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+
+def overlap_length(left: str, right: str) -> int:
+    """left 的后缀与 right 的前缀重合的最大长度"""
+    limit = min(len(left), len(right))
+    if not limit:
+        return 0
+    start = len(left) - limit
+    while True:
+        # 从最长的可能重叠开始，只在 right 首字符出现的位置比较
+        start = left.find(right[0], start)
+        if start < 0:
+            return 0
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start += 1
+
+
+def join_overlapping(left: str, right: str, separator: str = "\n", min_overlap: int = 16) -> str:
+    """拼接两个相邻文档块，去掉重叠部分；重叠短于 min_overlap（可能是巧合）时用 separator 连接"""
+    overlap = overlap_length(left, right)
+    if overlap >= min_overlap:
+        return left + right[overlap:]
+    return left + separator + right
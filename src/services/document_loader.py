@@ -1,67 +1,170 @@
-"""文档加载和处理模块"""
+"""文档加载和处理模块
+
+各格式的解析库在第一次解析该格式时才导入。
+"""
+import hashlib
+import json
 import os
-from typing import List, Dict
+import time
+from typing import Iterable, Iterator, List, Dict, Optional
 from pathlib import Path
-import pypdf
-import docx
-import markdown
-from bs4 import BeautifulSoup
+
+from ..core.config import settings
+from .filters import facet_metadata
+
+
+SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.doc', '.md', '.txt'}
+
+
+def file_hash(file_path: Path) -> str:
+    """计算文件内容的SHA-256哈希"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_id(path: str, index: int, content: str) -> str:
+    """根据文件路径、块序号和块内容生成稳定的文档块ID"""
+    content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    return hashlib.sha1(f"{path}\0{index}\0{content_hash}".encode('utf-8')).hexdigest()
+
+
+class ParseResult:
+    """一个文件的解析结果，document 为 None 时 error 说明原因（异常、解析进程崩溃或超时）"""
+
+    __slots__ = ('path', 'document', 'error', 'elapsed')
+
+    def __init__(self, path: Path, document: Optional[Dict[str, str]], error: Optional[str] = None,
+                 elapsed: float = 0.0):
+        self.path = path
+        self.document = document
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        """解析成功且有文本内容（流式加载的文档在迭代 segments 前无法判断，只要求 document 不为 None）"""
+        if self.document is None or 'segments' in self.document:
+            return self.document is not None
+        return bool(self.document['content'].strip())
 
 
 class DocumentLoader:
-    """文档加载器，支持多种文档格式"""
+    """文档加载器，支持多种文档格式
+    
+    自定义标签保存在文档目录下的 .tags.json 中: {"相对路径": ["标签", ...]}
+    """
+    
+    TAGS_FILE = '.tags.json'
     
     def __init__(self, documents_path: str):
         self.documents_path = Path(documents_path)
+    
+    def _tags_key(self, file_path: Path) -> str:
+        try:
+            return Path(file_path).relative_to(self.documents_path).as_posix()
+        except ValueError:
+            return Path(file_path).as_posix()
+    
+    def _read_tags(self) -> Dict[str, List[str]]:
+        tags_file = self.documents_path / self.TAGS_FILE
+        if not tags_file.exists():
+            return {}
+        return json.loads(tags_file.read_text(encoding='utf-8'))
+    
+    def get_tags(self, file_path: Path) -> List[str]:
+        """获取文档的自定义标签"""
+        return sorted(self._read_tags().get(self._tags_key(file_path), []))
+    
+    def set_tags(self, file_path: Path, tags: List[str]):
+        """设置文档的自定义标签，空列表表示删除"""
+        all_tags = self._read_tags()
+        key = self._tags_key(file_path)
+        tags = sorted({tag.strip() for tag in tags if tag.strip()})
+        if tags:
+            all_tags[key] = tags
+        else:
+            all_tags.pop(key, None)
+        
+        tags_file = self.documents_path / self.TAGS_FILE
+        tags_file.parent.mkdir(parents=True, exist_ok=True)
+        tags_file.write_text(json.dumps(all_tags, ensure_ascii=False, indent=2), encoding='utf-8')
         
+    def iter_pdf_pages(self, file_path: Path) -> Iterator[str]:
+        """逐页抽取PDF文本，每页以换行结尾，解析错误直接抛出"""
+        import pypdf
+        with open(file_path, 'rb') as file:
+            pdf_reader = pypdf.PdfReader(file)
+            for page in pdf_reader.pages:
+                yield page.extract_text() + "\n"
+    
+    def iter_docx_paragraphs(self, file_path: Path) -> Iterator[str]:
+        """逐段读取Word文档，每段以换行结尾，解析错误直接抛出"""
+        import docx
+        doc = docx.Document(file_path)
+        for paragraph in doc.paragraphs:
+            yield paragraph.text + "\n"
+    
+    def iter_markdown(self, file_path: Path) -> Iterator[str]:
+        """读取Markdown文件的纯文本（需要完整文档渲染，整篇作为一段）"""
+        import markdown
+        from bs4 import BeautifulSoup
+        with open(file_path, 'r', encoding='utf-8') as file:
+            html = markdown.markdown(file.read())
+        yield BeautifulSoup(html, 'html.parser').get_text()
+    
+    def iter_txt_blocks(self, file_path: Path, block_size: int = 1 << 20) -> Iterator[str]:
+        """按块读取纯文本文件"""
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for block in iter(lambda: file.read(block_size), ''):
+                yield block
+    
     def load_pdf(self, file_path: Path) -> str:
         """加载PDF文件"""
-        text = ""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = pypdf.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+            return "".join(self.iter_pdf_pages(file_path))
         except Exception as e:
             print(f"加载PDF文件失败 {file_path}: {e}")
-        return text
+            return ""
     
     def load_docx(self, file_path: Path) -> str:
         """加载Word文档"""
-        text = ""
         try:
-            doc = docx.Document(file_path)
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
+            return "".join(self.iter_docx_paragraphs(file_path))
         except Exception as e:
             print(f"加载Word文档失败 {file_path}: {e}")
-        return text
+            return ""
     
     def load_markdown(self, file_path: Path) -> str:
         """加载Markdown文件"""
-        text = ""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                md_content = file.read()
-                html = markdown.markdown(md_content)
-                soup = BeautifulSoup(html, 'html.parser')
-                text = soup.get_text()
+            return "".join(self.iter_markdown(file_path))
         except Exception as e:
             print(f"加载Markdown文件失败 {file_path}: {e}")
-        return text
+            return ""
     
     def load_txt(self, file_path: Path) -> str:
         """加载纯文本文件"""
-        text = ""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
+            return "".join(self.iter_txt_blocks(file_path))
         except Exception as e:
             print(f"加载文本文件失败 {file_path}: {e}")
-        return text
+            return ""
     
-    def load_document(self, file_path: Path) -> Dict[str, str]:
-        """根据文件类型加载文档"""
+    def _document_info(self, file_path: Path, digest: Optional[str] = None) -> Dict[str, str]:
+        """文档的元数据（不含内容），digest 为已计算的文件哈希"""
+        return {
+            'filename': file_path.name,
+            'path': str(file_path),
+            'type': file_path.suffix.lower(),
+            'file_hash': digest or file_hash(file_path),
+            'tags': self.get_tags(file_path)
+        }
+    
+    def load_document(self, file_path: Path, digest: Optional[str] = None) -> Dict[str, str]:
+        """根据文件类型加载文档，digest 为已计算的文件哈希（不再重复计算）"""
         suffix = file_path.suffix.lower()
         
         loaders = {
@@ -74,35 +177,108 @@ class DocumentLoader:
         
         loader = loaders.get(suffix)
         if loader:
-            content = loader(file_path)
-            return {
-                'filename': file_path.name,
-                'path': str(file_path),
-                'content': content,
-                'type': suffix
-            }
+            return dict(self._document_info(file_path, digest), content=loader(file_path))
         else:
             print(f"不支持的文件类型: {suffix}")
             return None
     
-    def load_all_documents(self) -> List[Dict[str, str]]:
-        """加载目录下所有支持的文档"""
+    def stream_document(self, file_path: Path, digest: Optional[str] = None) -> Optional[Dict]:
+        """
+        以流的形式加载文档：返回的字典用 segments（PDF 按页、Word 按段落、纯文本按块的文本生成器）
+        代替 content，迭代 segments 时才解析，解析错误在迭代时抛出
+        """
+        suffix = file_path.suffix.lower()
+        
+        streams = {
+            '.pdf': self.iter_pdf_pages,
+            '.docx': self.iter_docx_paragraphs,
+            '.doc': self.iter_docx_paragraphs,
+            '.md': self.iter_markdown,
+            '.txt': self.iter_txt_blocks,
+        }
+        
+        stream = streams.get(suffix)
+        if stream:
+            return dict(self._document_info(file_path, digest), segments=stream(file_path))
+        else:
+            print(f"不支持的文件类型: {suffix}")
+            return None
+    
+    def iter_document_paths(self) -> Iterator[Path]:
+        """遍历目录下所有支持的文档路径（不解析内容）"""
+        if not self.documents_path.exists():
+            return
+        
+        for file_path in self.documents_path.rglob('*'):
+            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                yield file_path
+    
+    def iter_documents(self, paths: Optional[Iterable[Path]] = None, workers: Optional[int] = None,
+                       timeout: Optional[float] = None, stream: bool = False,
+                       file_hashes: Optional[Dict[str, str]] = None) -> Iterator[ParseResult]:
+        """
+        解析文档，按完成顺序返回 ParseResult
+
+        Args:
+            paths: 要解析的文件，默认为目录下所有支持的文档
+            workers: 解析进程数，默认读取配置（1 为进程内串行解析，0 为全部CPU核）；
+                多进程时每个文件在独立进程中解析，崩溃或超时只影响该文件
+            timeout: 多进程时单个文件的解析超时（秒），默认读取配置
+            stream: 串行解析时返回 stream_document 的结果（迭代 segments 时才逐页解析，
+                解析错误在迭代时抛出）；多进程解析的文档同样以 segments 返回
+            file_hashes: 已计算的文件哈希 {路径: 哈希}，这些文件不再重复计算
+        """
+        from .parallel_embedding import resolve_workers
+
+        if paths is None:
+            paths = self.iter_document_paths()
+        workers = resolve_workers(settings.parse_workers if workers is None else workers)
+        file_hashes = file_hashes or {}
+
+        if workers == 1 and stream:
+            for file_path in paths:
+                yield ParseResult(file_path, self.stream_document(file_path, file_hashes.get(str(file_path))))
+            return
+
+        if workers == 1:
+            for file_path in paths:
+                start = time.perf_counter()
+                try:
+                    document, error = self.load_document(file_path, file_hashes.get(str(file_path))), None
+                except Exception as e:
+                    document, error = None, f"{type(e).__name__}: {e}"
+                yield ParseResult(file_path, document, error, time.perf_counter() - start)
+            return
+
+        from .parallel_parsing import ParallelParser
+        parser = ParallelParser(
+            str(self.documents_path), workers,
+            timeout=settings.parse_timeout if timeout is None else timeout
+        )
+        for result in parser.imap_unordered(paths, file_hashes):
+            if stream and result.document is not None:
+                result.document['segments'] = [result.document.pop('content')]
+            yield result
+
+    def load_all_documents(self, workers: Optional[int] = None,
+                           timeout: Optional[float] = None) -> List[Dict[str, str]]:
+        """加载目录下所有支持的文档，解析失败的文件打印原因后跳过（参数同 iter_documents）"""
         documents = []
         
         if not self.documents_path.exists():
             print(f"文档目录不存在: {self.documents_path}")
             return documents
         
-        supported_extensions = {'.pdf', '.docx', '.doc', '.md', '.txt'}
+        failed = 0
+        for result in self.iter_documents(workers=workers, timeout=timeout):
+            if result.error:
+                failed += 1
+                print(f"解析失败: {result.path.name}: {result.error}")
+            elif result.ok:
+                documents.append(result.document)
+                print(f"已加载: {result.path.name}")
         
-        for file_path in self.documents_path.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-                doc = self.load_document(file_path)
-                if doc and doc['content'].strip():
-                    documents.append(doc)
-                    print(f"已加载: {file_path.name}")
-        
-        print(f"总共加载了 {len(documents)} 个文档")
+        print(f"总共加载了 {len(documents)} 个文档" + (f"，{failed} 个解析失败" if failed else ""))
         return documents
 
 
@@ -115,16 +291,36 @@ class TextSplitter:
     
     def split_text(self, text: str) -> List[str]:
         """将文本分割成固定大小的块"""
-        chunks = []
+        return list(self.split_stream([text]))
+    
+    def split_stream(self, segments: Iterable[str]) -> Iterator[str]:
+        """
+        流式分割：结果与 split_text("".join(segments)) 相同
+
+        只缓冲当前文档块及其前面一段重叠部分，内存占用与文本总长度无关。
+        """
+        segments = iter(segments)
+        buffer = ""  # 文本中从 offset 开始的部分
+        offset = 0
         start = 0
-        text_length = len(text)
+        text_length = None  # 读完所有分段后才知道总长度
         
-        while start < text_length:
+        while True:
+            # 读入足够判断本块是否到达文本末尾的内容
+            while text_length is None and offset + len(buffer) - start <= self.chunk_size:
+                segment = next(segments, None)
+                if segment is None:
+                    text_length = offset + len(buffer)
+                else:
+                    buffer += segment
+            if text_length is not None and start >= text_length:
+                return
+            
             end = start + self.chunk_size
-            chunk = text[start:end]
+            chunk = buffer[start - offset:end - offset]
             
             # 尝试在句子边界处分割
-            if end < text_length:
+            if text_length is None or end < text_length:
                 last_period = chunk.rfind('。')
                 last_newline = chunk.rfind('\n')
                 last_space = chunk.rfind(' ')
@@ -135,27 +331,38 @@ class TextSplitter:
                     end = start + len(chunk)
             
             if chunk.strip():
-                chunks.append(chunk.strip())
+                yield chunk.strip()
             
             start = end - self.chunk_overlap
-        
-        return chunks
+            # 丢弃已处理的文本（保留一段重叠以防下一块的起点回退），丢弃部分超过缓冲区一半时才复制，
+            # 大分段（如整块读入的纯文本）不会在每块之后被重复复制
+            keep_from = max(offset, start - self.chunk_overlap)
+            if keep_from - offset > len(buffer) // 2:
+                buffer = buffer[keep_from - offset:]
+                offset = keep_from
+    
+    def iter_chunks(self, doc: Dict) -> Iterator[Dict]:
+        """逐个生成文档的文档块，doc 包含 content 或 segments（流式加载的文档）"""
+        segments = doc['segments'] if 'segments' in doc else [doc['content']]
+        tags = doc.get('tags', [])
+        for i, chunk in enumerate(self.split_stream(segments)):
+            metadata = {
+                'filename': doc['filename'],
+                'path': doc['path'],
+                'type': doc['type'],
+                'chunk_id': i
+            }
+            if doc.get('file_hash'):
+                metadata['file_hash'] = doc['file_hash']
+            # 标签原文用于增量同步比较，展开的 dir:/tag: 键用于元数据过滤
+            metadata['tags'] = ','.join(tags)
+            metadata.update(facet_metadata(doc['path'], tags))
+            yield {
+                'id': make_chunk_id(doc['path'], i, chunk),
+                'content': chunk,
+                'metadata': metadata
+            }
     
     def split_documents(self, documents: List[Dict[str, str]]) -> List[Dict[str, str]]:
         """分割多个文档"""
-        chunks = []
-        
-        for doc in documents:
-            text_chunks = self.split_text(doc['content'])
-            for i, chunk in enumerate(text_chunks):
-                chunks.append({
-                    'content': chunk,
-                    'metadata': {
-                        'filename': doc['filename'],
-                        'path': doc['path'],
-                        'type': doc['type'],
-                        'chunk_id': i
-                    }
-                })
-        
-        return chunks
+        return [chunk for doc in documents for chunk in self.iter_chunks(doc)]
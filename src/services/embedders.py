@@ -0,0 +1,314 @@
+"""嵌入运行时模块
+
+VectorStore 通过统一的 Embedder 接口编码文本，运行时可选：
+    torch: SentenceTransformer（PyTorch），参考实现
+    onnx:  导出为 ONNX（可选动态 int8 量化）后用 onnxruntime 推理，需先执行 export_onnx
+
+模型都在第一次编码时加载。
+"""
+import json
+import re
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..core.config import settings
+
+ONNX_CONFIG_FILE = "embedder.json"
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model.int8.onnx"
+
+
+def onnx_model_dir(base_path: str, model_name: str) -> Path:
+    """模型导出目录，每个模型一个子目录"""
+    return Path(base_path) / re.sub(r'[^\w.-]', '_', model_name)
+
+
+class Embedder(ABC):
+    """文本嵌入器基类
+
+    Args:
+        model_name: 嵌入模型名称
+        batch_size: 编码批大小
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """模型是否已加载"""
+        return self._loaded
+
+    def warmup(self):
+        """预先加载模型"""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load()
+                    self._loaded = True
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """编码文本，返回 (len(texts), dim) 的 float32 矩阵"""
+        self.warmup()
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.asarray(self._encode(list(texts), batch_size or self.batch_size), dtype=np.float32)
+
+    @abstractmethod
+    def _load(self):
+        """加载模型"""
+        pass
+
+    @abstractmethod
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        pass
+
+    def get_name(self) -> str:
+        """嵌入器标识，不同运行时产生的向量略有差异，嵌入缓存按此区分"""
+        return self.model_name
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """PyTorch SentenceTransformer 运行时
+
+    Args:
+        model_name: 嵌入模型名称
+        batch_size: 编码批大小
+        intra_op_threads: PyTorch 算子内线程数（进程级设置），0 表示使用默认值
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, intra_op_threads: int = 0):
+        super().__init__(model_name, batch_size)
+        self.intra_op_threads = intra_op_threads
+        self.model = None
+
+    def _load(self):
+        if self.intra_op_threads:
+            import torch
+            torch.set_num_threads(self.intra_op_threads)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(self.model_name)
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+
+class OnnxEmbedder(Embedder):
+    """onnxruntime 运行时
+
+    Args:
+        model_name: 嵌入模型名称（用于标识和报错信息）
+        model_dir: export_onnx 导出的目录
+        quantized: 是否使用 int8 动态量化模型
+        intra_op_threads: onnxruntime 算子内线程数，0 表示使用默认值
+        batch_size: 编码批大小
+    """
+
+    def __init__(self, model_name: str, model_dir: str, quantized: bool = True,
+                 intra_op_threads: int = 0, batch_size: int = 32):
+        super().__init__(model_name, batch_size)
+        self.model_dir = Path(model_dir)
+        self.quantized = quantized
+        self.intra_op_threads = intra_op_threads
+        self.config: Dict = {}
+        self.session = None
+        self.tokenizer = None
+        # fast tokenizer 不支持多线程并发调用
+        self._tokenizer_lock = threading.Lock()
+
+    def _load(self):
+        config_file = self.model_dir / ONNX_CONFIG_FILE
+        if not config_file.exists():
+            raise RuntimeError(
+                f"未找到ONNX模型: {self.model_dir}，请先运行 python run.py export-onnx 导出 {self.model_name}"
+            )
+
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("onnxruntime包未安装,请运行: pip install onnxruntime")
+        from transformers import AutoTokenizer
+
+        self.config = json.loads(config_file.read_text(encoding='utf-8'))
+        model_file = ONNX_QUANTIZED_MODEL_FILE if self.quantized else ONNX_MODEL_FILE
+        if not (self.model_dir / model_file).exists():
+            raise RuntimeError(f"未找到ONNX模型文件: {self.model_dir / model_file}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+        self.session = ort.InferenceSession(
+            str(self.model_dir / model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        pooling = self.config.get('pooling', 'mean')
+        if pooling == 'cls':
+            return hidden[:, 0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        if pooling == 'max':
+            return np.where(mask > 0, hidden, -np.inf).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        # 按长度排序后分批，减少同一批内的填充
+        order = np.argsort([len(text) for text in texts], kind='stable')
+        input_names = self.config['input_names']
+        outputs = [None] * len(texts)
+
+        for start in range(0, len(texts), batch_size):
+            batch_rows = order[start:start + batch_size]
+            with self._tokenizer_lock:
+                encoded = self.tokenizer(
+                    [texts[i] for i in batch_rows],
+                    padding=True,
+                    truncation=True,
+                    max_length=self.config['max_seq_length'],
+                    return_tensors='np'
+                )
+            feeds = {name: encoded[name].astype(np.int64) for name in input_names}
+            hidden = self.session.run(None, feeds)[0]
+            embeddings = self._pool(hidden, encoded['attention_mask'])
+            if self.config.get('normalize'):
+                embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+            for row, embedding in zip(batch_rows, embeddings):
+                outputs[row] = embedding
+
+        return np.stack(outputs)
+
+    def get_name(self) -> str:
+        return f"{self.model_name}@onnx-{'int8' if self.quantized else 'fp32'}"
+
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = True, opset: int = 14) -> Path:
+    """
+    把 SentenceTransformer 模型导出为 ONNX
+
+    导出 Transformer 主干（输出 last_hidden_state），池化和归一化方式写入 embedder.json，
+    由 OnnxEmbedder 在 NumPy 中完成。quantize 为 True 时额外生成动态 int8 量化模型。
+
+    Returns:
+        导出目录
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer = model[0]
+    auto_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+
+    pooling = 'mean'
+    normalize = False
+    for module in model:
+        module_type = type(module).__name__
+        if module_type == 'Pooling':
+            pooling = module.get_pooling_mode_str()
+        elif module_type == 'Normalize':
+            normalize = True
+    if pooling not in ('mean', 'cls', 'max'):
+        raise ValueError(f"不支持的池化方式: {pooling}")
+
+    dummy = tokenizer(["导出示例 export sample"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in dummy]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            auto_model,
+            ({name: dummy[name] for name in input_names},),
+            str(output_dir / ONNX_MODEL_FILE),
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(
+            str(output_dir / ONNX_MODEL_FILE),
+            str(output_dir / ONNX_QUANTIZED_MODEL_FILE),
+            weight_type=QuantType.QInt8
+        )
+
+    tokenizer.save_pretrained(str(output_dir))
+    (output_dir / ONNX_CONFIG_FILE).write_text(json.dumps({
+        'model_name': model_name,
+        'pooling': pooling,
+        'normalize': normalize,
+        'max_seq_length': model.max_seq_length,
+        'input_names': input_names
+    }, ensure_ascii=False, indent=2), encoding='utf-8')
+    return output_dir
+
+
+def verify_agreement(reference: Embedder, candidate: Embedder, sentences: List[str]) -> Dict[str, float]:
+    """比较两个嵌入器对同一批句子的余弦相似度"""
+    expected = reference.encode(sentences)
+    actual = candidate.encode(sentences)
+    expected = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+    actual = actual / np.linalg.norm(actual, axis=1, keepdims=True)
+    cosines = np.einsum('ij,ij->i', expected, actual)
+    return {
+        'sentences': len(sentences),
+        'mean_cosine': float(cosines.mean()),
+        'min_cosine': float(cosines.min())
+    }
+
+
+def create_embedder(runtime: Optional[str] = None, model_name: Optional[str] = None,
+                    quantized: Optional[bool] = None, intra_op_threads: Optional[int] = None,
+                    use_service: bool = True) -> Embedder:
+    """
+    根据配置创建嵌入器，参数为 None 时读取配置
+
+    配置了 EMBEDDING_SERVICE_SOCKET 且 use_service 为 True 时返回共享嵌入服务的客户端，
+    按上述参数创建的进程内嵌入器作为回退。
+    """
+    runtime = (runtime or settings.embedding_runtime).lower()
+    model_name = model_name or settings.embedding_model
+    if intra_op_threads is None:
+        intra_op_threads = settings.embedding_intra_op_threads
+
+    if runtime == "torch":
+        embedder = SentenceTransformerEmbedder(
+            model_name,
+            batch_size=settings.embedding_batch_size,
+            intra_op_threads=intra_op_threads
+        )
+
+    elif runtime == "onnx":
+        embedder = OnnxEmbedder(
+            model_name,
+            str(onnx_model_dir(settings.embedding_onnx_path, model_name)),
+            quantized=settings.embedding_onnx_quantized if quantized is None else quantized,
+            intra_op_threads=intra_op_threads,
+            batch_size=settings.embedding_batch_size
+        )
+
+    else:
+        raise ValueError(f"不支持的嵌入运行时: {runtime}。支持: torch, onnx")
+
+    if use_service and settings.embedding_service_socket:
+        from .embedding_service import RemoteEmbedder
+        return RemoteEmbedder(
+            settings.embedding_service_socket,
+            embedder,
+            timeout=settings.embedding_service_timeout
+        )
+    return embedder
@@ -0,0 +1,263 @@
+"""持久化嵌入向量缓存模块
+
+按 (模型名称, 文档块内容哈希) 缓存嵌入向量，重建索引、新副本或迁移集合时
+内容未变的文档块无需再次编码。
+
+存储格式（每个模型一个目录）：
+    vectors.f32  追加写入的 float32 矩阵，读取时通过 np.memmap 映射
+    keys.bin     与 vectors.f32 逐行对应的 32 字节 SHA-256 内容哈希
+    meta.json    模型名称、向量维度和压缩代号
+    .lock        跨进程文件锁
+
+多个进程（如多个 uvicorn 工作进程，或与服务同时运行的命令行）共用一个缓存目录：
+追加和压缩持有 .lock 上的排他锁（fcntl），持锁后先读入其他进程追加的哈希，
+压缩代号变化（文件被其他进程压缩替换）时重新加载。读取不加文件锁，映射的仍是加载时的文件，
+最多漏掉其他进程新写入的向量。没有 fcntl 的平台（Windows）只有进程内锁。
+"""
+import hashlib
+import json
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+KEY_SIZE = 32
+
+
+def content_hash(content: str) -> bytes:
+    """计算文档块内容哈希"""
+    return hashlib.sha256(content.encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    """基于内存映射文件的嵌入向量缓存
+
+    Args:
+        cache_path: 缓存根目录
+        model_name: 嵌入模型名称，不同模型的向量分目录存放
+        max_entries: 最大缓存条数，超出后压缩为最近写入的 compact_ratio * max_entries 条
+        compact_ratio: 压缩后保留的比例
+    """
+
+    def __init__(self, cache_path: str, model_name: str, max_entries: int = 500000, compact_ratio: float = 0.8):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.compact_ratio = compact_ratio
+        self.cache_dir = Path(cache_path) / re.sub(r'[^\w.-]', '_', model_name)
+        self.vectors_file = self.cache_dir / "vectors.f32"
+        self.keys_file = self.cache_dir / "keys.bin"
+        self.meta_file = self.cache_dir / "meta.json"
+        self.lock_file = self.cache_dir / ".lock"
+
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        # 已加载文件的压缩代号，每次压缩替换文件前递增
+        self._generation = 0
+        self.dim: Optional[int] = None
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+
+        if self.meta_file.exists():
+            with self._lock, self._file_lock():
+                self._load()
+
+    @contextmanager
+    def _file_lock(self):
+        """持有跨进程排他锁（缓存目录不存在时创建）"""
+        if fcntl is None:
+            yield
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_file, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self):
+        """加载哈希索引并映射向量文件（需持有文件锁）"""
+        self._index = {}
+        self._vectors = None
+        self.rows = 0
+        if not self.meta_file.exists():
+            return
+
+        meta = json.loads(self.meta_file.read_text(encoding='utf-8'))
+        self.dim = meta['dim']
+        self._generation = meta.get('generation', 0)
+
+        keys = self.keys_file.read_bytes() if self.keys_file.exists() else b''
+        vector_rows = self.vectors_file.stat().st_size // (self.dim * 4) if self.vectors_file.exists() else 0
+        # 两个文件逐行对应，异常中断时以较短者为准并截掉多余部分
+        self.rows = min(len(keys) // KEY_SIZE, vector_rows)
+        if self.vectors_file.exists() and self.vectors_file.stat().st_size != self.rows * self.dim * 4:
+            with open(self.vectors_file, 'r+b') as f:
+                f.truncate(self.rows * self.dim * 4)
+        if len(keys) != self.rows * KEY_SIZE:
+            keys = keys[:self.rows * KEY_SIZE]
+            self.keys_file.write_bytes(keys)
+
+        self._index = {
+            keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i
+            for i in range(self.rows)
+        }
+        self._remap()
+
+    def _write_meta(self):
+        tmp_meta = self.meta_file.with_suffix('.tmp')
+        tmp_meta.write_text(
+            json.dumps({'model_name': self.model_name, 'dim': self.dim, 'generation': self._generation}),
+            encoding='utf-8'
+        )
+        tmp_meta.replace(self.meta_file)
+
+    def _sync(self):
+        """使内存中的哈希索引与磁盘一致（需持有文件锁）：读入其他进程追加的哈希，压缩代号变化时重新加载"""
+        if not self.meta_file.exists():
+            if self.dim is not None:
+                self._load()
+            return
+        meta = json.loads(self.meta_file.read_text(encoding='utf-8'))
+        if self.dim is None or meta.get('generation', 0) != self._generation:
+            self._load()
+            return
+
+        rows = self.keys_file.stat().st_size // KEY_SIZE if self.keys_file.exists() else 0
+        if rows > self.rows:
+            with open(self.keys_file, 'rb') as f:
+                f.seek(self.rows * KEY_SIZE)
+                keys = f.read((rows - self.rows) * KEY_SIZE)
+            for i in range(rows - self.rows):
+                self._index[keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]] = self.rows + i
+            self.rows = rows
+            self._remap()
+
+    def _remap(self):
+        """重新映射向量文件（行数变化后调用）"""
+        if self.rows:
+            self._vectors = np.memmap(self.vectors_file, dtype=np.float32, mode='r', shape=(self.rows, self.dim))
+        else:
+            self._vectors = None
+
+    def get_many(self, hashes: List[bytes]) -> List[Optional[np.ndarray]]:
+        """批量查找嵌入向量，未命中的位置为 None"""
+        with self._lock:
+            results = []
+            for key in hashes:
+                row = self._index.get(key)
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(np.array(self._vectors[row]))
+            return results
+
+    def put_many(self, hashes: List[bytes], embeddings):
+        """批量写入嵌入向量"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not len(hashes):
+            return
+
+        with self._lock, self._file_lock():
+            self._sync()
+            if self.dim is None:
+                self.dim = int(embeddings.shape[1])
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                self._write_meta()
+
+            new_keys = []
+            new_rows = []
+            seen = set()
+            for key, embedding in zip(hashes, embeddings):
+                if key in self._index or key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(embedding)
+
+            if not new_keys:
+                return
+
+            # 先写向量再写哈希，中断时多出的向量行会被忽略
+            with open(self.vectors_file, 'ab') as f:
+                f.write(np.vstack(new_rows).astype(np.float32).tobytes())
+            with open(self.keys_file, 'ab') as f:
+                f.write(b''.join(new_keys))
+
+            for key in new_keys:
+                self._index[key] = self.rows
+                self.rows += 1
+            self._remap()
+
+            if self.rows > self.max_entries:
+                self._compact(keep=int(self.max_entries * self.compact_ratio))
+
+    def compact(self, live_hashes: Optional[Iterable[bytes]] = None):
+        """
+        压缩缓存文件
+
+        Args:
+            live_hashes: 只保留这些哈希对应的向量；为 None 时只按容量上限裁剪
+        """
+        with self._lock, self._file_lock():
+            self._sync()
+            self._compact(keep=self.max_entries, live_hashes=live_hashes)
+
+    def _compact(self, keep: int, live_hashes: Optional[Iterable[bytes]] = None):
+        """保留最近写入的 keep 条缓存（需持有进程内锁和文件锁）"""
+        if not self.rows:
+            return
+
+        items = sorted(self._index.items(), key=lambda item: item[1])
+        if live_hashes is not None:
+            live = set(live_hashes)
+            items = [item for item in items if item[0] in live]
+        items = items[-keep:] if keep > 0 else []
+
+        rows = [row for _, row in items]
+        vectors = np.array(self._vectors[rows]) if rows else np.empty((0, self.dim), dtype=np.float32)
+
+        tmp_vectors = self.vectors_file.with_suffix('.tmp')
+        tmp_keys = self.keys_file.with_suffix('.tmp')
+        tmp_vectors.write_bytes(vectors.astype(np.float32).tobytes())
+        tmp_keys.write_bytes(b''.join(key for key, _ in items))
+
+        # 先递增压缩代号再替换文件：中断时其他进程最多多重新加载一次，不会用旧行号读新文件
+        self._generation += 1
+        self._write_meta()
+        self._vectors = None
+        tmp_vectors.replace(self.vectors_file)
+        tmp_keys.replace(self.keys_file)
+
+        self._index = {key: i for i, (key, _) in enumerate(items)}
+        self.rows = len(items)
+        self._remap()
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def stats(self) -> Dict:
+        """获取命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "model_name": self.model_name,
+                "size": self.rows,
+                "max_entries": self.max_entries,
+                "dim": self.dim,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
@@ -0,0 +1,242 @@
+"""本机共享嵌入服务
+
+多个 uvicorn 工作进程各自加载嵌入模型会成倍占用内存，且无法跨请求合并批次。
+嵌入服务通过 Unix socket 提供编码，每台主机只加载一次模型，并对所有工作进程的
+请求做微批处理。配置 EMBEDDING_SERVICE_SOCKET 后 VectorStore 自动改用 RemoteEmbedder，
+服务不可用时回退为进程内编码。
+
+协议：每帧为 8 字节头（JSON 长度、数据长度，网络字节序）+ JSON + 数据。
+    请求  {"op": "encode", "texts": [...]} / {"op": "info"}
+    响应  {"shape": [n, dim]} + float32 数据 / {"name": ..., "pid": ...} / {"error": ...}
+"""
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .batching import MicroBatcher
+from .embedders import Embedder
+
+_HEADER = struct.Struct('!II')
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def send_frame(sock: socket.socket, header: Dict, payload: bytes = b''):
+    """发送一帧"""
+    data = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data), len(payload)) + data + payload)
+
+
+def recv_frame(sock: socket.socket) -> Tuple[Dict, bytes]:
+    """接收一帧，返回 (header, payload)"""
+    header_size, payload_size = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, header_size).decode('utf-8'))
+    payload = _recv_exact(sock, payload_size) if payload_size else b''
+    return header, payload
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """每个连接一个线程，连接内的请求依次处理"""
+
+    def handle(self):
+        service: "EmbeddingServer" = self.server.service
+        while True:
+            try:
+                request, _ = recv_frame(self.request)
+            except (ConnectionError, OSError):
+                return
+
+            try:
+                if request.get('op') == 'info':
+                    send_frame(self.request, {'name': service.embedder.get_name(), 'pid': os.getpid()})
+                    continue
+                embeddings = np.ascontiguousarray(service.batcher.submit(request['texts']), dtype=np.float32)
+                send_frame(self.request, {'shape': list(embeddings.shape)}, embeddings.tobytes())
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                send_frame(self.request, {'error': str(e)})
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    # 多个工作进程同时建立连接时默认的 backlog（5）不够，客户端会收到 EAGAIN
+    request_queue_size = 128
+
+
+class EmbeddingServer:
+    """
+    嵌入服务端
+
+    Args:
+        socket_path: Unix socket 路径
+        embedder: 进程内嵌入器
+        max_batch_size: 合并批次的最大文本数
+        window_ms: 微批收集窗口（毫秒）
+    """
+
+    def __init__(self, socket_path: str, embedder: Embedder, max_batch_size: int = 64, window_ms: float = 5.0):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError("当前平台不支持 Unix socket")
+        self.socket_path = socket_path
+        self.embedder = embedder
+        self.batcher = MicroBatcher(embedder.encode, max_batch_size=max_batch_size, window_ms=window_ms)
+        self._server = None
+
+    def _remove_stale_socket(self):
+        path = Path(self.socket_path)
+        if not path.exists():
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            path.unlink()
+        else:
+            raise RuntimeError(f"嵌入服务已在运行: {self.socket_path}")
+        finally:
+            probe.close()
+
+    def serve_forever(self):
+        """加载模型并开始服务（阻塞）"""
+        self._remove_stale_socket()
+        Path(self.socket_path).parent.mkdir(parents=True, exist_ok=True)
+        self.embedder.warmup()
+
+        self._server = _UnixServer(self.socket_path, _Handler)
+        self._server.service = self
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.batcher.close()
+            Path(self.socket_path).unlink(missing_ok=True)
+
+    def shutdown(self):
+        """停止服务（从其他线程调用）"""
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class RemoteEmbedder(Embedder):
+    """
+    嵌入服务客户端，服务不可用时回退到进程内嵌入器
+
+    连接按线程复用。连接失败后 retry_interval 秒内直接使用回退嵌入器，之后再尝试连接服务。
+    服务端模型与本地配置不一致时始终使用回退嵌入器，避免索引中混入不同模型的向量。
+
+    Args:
+        socket_path: 嵌入服务 Unix socket 路径
+        fallback: 进程内回退嵌入器（模型在第一次回退时才加载）
+        timeout: 单次请求超时（秒）
+        retry_interval: 服务不可用后重新尝试连接的间隔（秒）
+    """
+
+    def __init__(self, socket_path: str, fallback: Embedder, timeout: float = 30.0, retry_interval: float = 30.0):
+        super().__init__(fallback.model_name, fallback.batch_size)
+        self.socket_path = socket_path
+        self.fallback = fallback
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._local = threading.local()
+        self._unavailable_until = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded or self.fallback.loaded
+
+    def warmup(self):
+        """连接服务并校验模型；服务不可用时加载回退模型"""
+        if self._service_available():
+            try:
+                self._connection()
+                self._loaded = True
+                return
+            except (OSError, RuntimeError) as e:
+                self._mark_unavailable(e)
+        self.fallback.warmup()
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        if self._service_available():
+            try:
+                return self._encode(list(texts), batch_size or self.batch_size)
+            except (OSError, RuntimeError) as e:
+                self._mark_unavailable(e)
+        return self.fallback.encode(texts, batch_size)
+
+    def _load(self):
+        self._connection()
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        sock = self._connection()
+        try:
+            send_frame(sock, {'op': 'encode', 'texts': texts})
+            header, payload = recv_frame(sock)
+        except OSError:
+            self._close_connection()
+            raise
+
+        if 'error' in header:
+            raise RuntimeError(f"嵌入服务编码失败: {header['error']}")
+        self._loaded = True
+        return np.frombuffer(payload, dtype=np.float32).reshape(header['shape'])
+
+    def _connection(self) -> socket.socket:
+        """当前线程的连接，首次连接时校验服务端模型"""
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            return sock
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            send_frame(sock, {'op': 'info'})
+            info, _ = recv_frame(sock)
+        except OSError:
+            sock.close()
+            raise
+
+        if info.get('name') != self.fallback.get_name():
+            sock.close()
+            self._unavailable_until = float('inf')
+            raise RuntimeError(f"嵌入服务模型 {info.get('name')} 与本地配置 {self.fallback.get_name()} 不一致")
+
+        self._local.sock = sock
+        return sock
+
+    def _close_connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _service_available(self) -> bool:
+        return time.monotonic() >= self._unavailable_until
+
+    def _mark_unavailable(self, error: Exception):
+        if self._unavailable_until != float('inf'):
+            self._unavailable_until = time.monotonic() + self.retry_interval
+        print(f"嵌入服务不可用，使用进程内编码: {error}")
+
+    def get_name(self) -> str:
+        return self.fallback.get_name()
@@ -0,0 +1,122 @@
+"""文本编码模块
+
+TextEncoder 持有嵌入器、查询向量缓存、查询微批调度器和文档块嵌入缓存。
+向量只取决于模型和文本，与集合无关，多个集合（VectorStore）共享同一个 TextEncoder，
+进程内只加载一份嵌入模型。
+"""
+import threading
+from typing import List, Optional
+
+from ..core.config import settings
+from .batching import MicroBatcher
+from .cache import LRUCache, normalize_query
+from .embedders import Embedder, create_embedder
+from .embedding_cache import EmbeddingCache, content_hash
+
+
+class TextEncoder:
+    """
+    共享的文本编码器，各组件都在第一次使用时才创建
+
+    Args:
+        query_cache_size: 查询向量缓存容量，默认读取配置
+        query_cache_ttl: 查询向量缓存过期时间（秒），默认读取配置
+    """
+
+    def __init__(self, query_cache_size: Optional[int] = None, query_cache_ttl: Optional[float] = None):
+        self._init_lock = threading.RLock()
+
+        # 查询向量缓存（LRU + TTL）
+        self.query_cache = LRUCache(
+            max_size=settings.query_cache_size if query_cache_size is None else query_cache_size,
+            ttl=settings.query_cache_ttl if query_cache_ttl is None else query_cache_ttl
+        )
+
+        # 嵌入器（运行时由配置决定，模型延迟加载）
+        self.embedding_model_name = settings.embedding_model
+        self._embedder = None
+
+        # 并发查询编码的微批调度器（延迟创建）
+        self._query_batcher = None
+
+        # 文档块嵌入向量缓存（按模型名称和内容哈希，延迟打开）
+        self._embedding_cache = None
+
+    @property
+    def embedder(self) -> Embedder:
+        """嵌入器，模型在第一次编码时加载"""
+        if self._embedder is None:
+            with self._init_lock:
+                if self._embedder is None:
+                    self._embedder = create_embedder(model_name=self.embedding_model_name)
+        return self._embedder
+
+    @property
+    def query_batcher(self) -> Optional[MicroBatcher]:
+        """并发查询编码的微批调度器，未启用时为 None"""
+        if self._query_batcher is None and settings.query_batching_enabled:
+            with self._init_lock:
+                if self._query_batcher is None:
+                    self._query_batcher = MicroBatcher(
+                        self.embedder.encode,
+                        max_batch_size=settings.query_batch_max_size,
+                        window_ms=settings.query_batch_window_ms
+                    )
+        return self._query_batcher
+
+    @property
+    def model_loaded(self) -> bool:
+        """嵌入模型是否已加载"""
+        return self._embedder is not None and self._embedder.loaded
+
+    def warmup(self):
+        """预先加载嵌入模型"""
+        self.embedder.warmup()
+
+    @property
+    def embedding_cache(self) -> Optional[EmbeddingCache]:
+        """文档块嵌入缓存，未启用时为 None"""
+        if self._embedding_cache is None and settings.embedding_cache_enabled:
+            with self._init_lock:
+                if self._embedding_cache is None:
+                    self._embedding_cache = EmbeddingCache(
+                        settings.embedding_cache_path,
+                        self.embedder.get_name(),
+                        max_entries=settings.embedding_cache_max_entries
+                    )
+        return self._embedding_cache
+
+    def embed_queries(self, query_texts: List[str]) -> List[List[float]]:
+        """批量生成查询向量，未命中缓存的问题合并为一次 encode 调用"""
+        embeddings = [None] * len(query_texts)
+        missing = {}
+
+        for i, query_text in enumerate(query_texts):
+            key = normalize_query(query_text)
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                embeddings[i] = list(cached)
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            texts = [query_texts[indexes[0]] for indexes in missing.values()]
+            # 并发请求的查询在微批窗口内合并为一次 encode
+            batcher = self.query_batcher
+            encoded = (batcher.submit(texts) if batcher else self.embedder.encode(texts)).tolist()
+            for (key, indexes), embedding in zip(missing.items(), encoded):
+                self.query_cache.set(key, tuple(embedding))
+                for i in indexes:
+                    embeddings[i] = list(embedding)
+
+        return embeddings
+
+    def cached_embeddings(self, documents: List[str]):
+        """查询文档块嵌入缓存，返回 (embeddings, hashes, 未命中的下标)"""
+        if self.embedding_cache is None:
+            return [None] * len(documents), None, list(range(len(documents)))
+
+        hashes = [content_hash(document) for document in documents]
+        embeddings = self.embedding_cache.get_many(hashes)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        return embeddings, hashes, missing
@@ -0,0 +1,137 @@
+"""元数据过滤模块
+
+过滤条件在索引内部求值（预过滤），只在满足条件的文档块中检索，
+而不是先召回再丢弃不符合条件的结果。
+
+支持的条件（不同字段之间为 AND，同一字段的多个取值为 OR，多个标签要求全部包含）：
+    filename:    文件名，字符串或列表
+    type:        文件扩展名（如 ".pdf"），字符串或列表
+    path_prefix: 目录前缀，如 "knowledge_base/manuals"
+    tags:        自定义标签，字符串或列表
+"""
+from pathlib import PurePosixPath
+from typing import Any, Dict, Iterator, List, Optional
+
+TAG_PREFIX = "tag:"
+DIR_PREFIX = "dir:"
+FACET_FIELDS = ('filename', 'type')
+
+
+def normalize_dir(path: str) -> str:
+    """规范化目录路径为不带结尾斜杠的 POSIX 形式"""
+    return PurePosixPath(path.replace('\\', '/')).as_posix().rstrip('/')
+
+
+def facet_metadata(path: str, tags: List[str]) -> Dict[str, bool]:
+    """生成可过滤的元数据键：每个上级目录一个 dir: 键，每个标签一个 tag: 键
+
+    ChromaDB 的元数据值不支持列表，也没有前缀匹配，所以展开为布尔键，
+    目录前缀和标签过滤都变成等值条件。
+    """
+    metadata = {}
+    for parent in PurePosixPath(normalize_dir(path)).parents:
+        directory = parent.as_posix()
+        if directory not in ('.', '/'):
+            metadata[DIR_PREFIX + directory] = True
+    for tag in tags:
+        metadata[TAG_PREFIX + tag] = True
+    return metadata
+
+
+def metadata_tags(metadata: Dict) -> List[str]:
+    """从元数据中提取标签"""
+    return sorted(key[len(TAG_PREFIX):] for key in metadata if key.startswith(TAG_PREFIX))
+
+
+def facet_keys(metadata: Dict) -> Iterator[str]:
+    """元数据对应的倒排键，如 "type=.pdf"、"dir:knowledge_base"、"tag:manual" """
+    for field in FACET_FIELDS:
+        value = metadata.get(field)
+        if value is not None:
+            yield f"{field}={value}"
+    for key, value in metadata.items():
+        if value is True and (key.startswith(DIR_PREFIX) or key.startswith(TAG_PREFIX)):
+            yield key
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(item) for item in value]
+
+
+class MetadataFilter:
+    """元数据过滤条件"""
+
+    __slots__ = ('filename', 'type', 'path_prefix', 'tags')
+
+    FIELDS = ('filename', 'type', 'path_prefix', 'tags')
+
+    def __init__(self, filename: Optional[List[str]] = None, type: Optional[List[str]] = None,
+                 path_prefix: Optional[str] = None, tags: Optional[List[str]] = None):
+        self.filename = filename or []
+        self.type = [value.lower() for value in (type or [])]
+        self.path_prefix = normalize_dir(path_prefix) if path_prefix else None
+        self.tags = tags or []
+
+    @classmethod
+    def from_dict(cls, filters: Optional[Dict[str, Any]]) -> Optional["MetadataFilter"]:
+        """从请求参数创建过滤条件，没有有效条件时返回 None"""
+        if not filters:
+            return None
+
+        unknown = set(filters) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"不支持的过滤字段: {', '.join(sorted(unknown))}。支持: {', '.join(cls.FIELDS)}")
+
+        metadata_filter = cls(
+            filename=_as_list(filters.get('filename')),
+            type=_as_list(filters.get('type')),
+            path_prefix=filters.get('path_prefix'),
+            tags=_as_list(filters.get('tags'))
+        )
+        return metadata_filter if metadata_filter else None
+
+    def __bool__(self) -> bool:
+        return bool(self.filename or self.type or self.path_prefix or self.tags)
+
+    def __repr__(self) -> str:
+        return f"MetadataFilter({self.to_dict()})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field)}
+
+    def clauses(self) -> List[List[str]]:
+        """转换为倒排键子句，子句之间为 AND，子句内的键之间为 OR"""
+        clauses = []
+        if self.filename:
+            clauses.append([f"filename={value}" for value in self.filename])
+        if self.type:
+            clauses.append([f"type={value}" for value in self.type])
+        if self.path_prefix:
+            clauses.append([DIR_PREFIX + self.path_prefix])
+        for tag in self.tags:
+            clauses.append([TAG_PREFIX + tag])
+        return clauses
+
+    def matches(self, metadata: Dict) -> bool:
+        """判断元数据是否满足过滤条件"""
+        keys = set(facet_keys(metadata or {}))
+        return all(any(key in keys for key in clause) for clause in self.clauses())
+
+    def to_chroma_where(self) -> Dict:
+        """转换为 ChromaDB 的 where 条件"""
+        conditions = []
+        for clause in self.clauses():
+            options = []
+            for key in clause:
+                if key.startswith(DIR_PREFIX) or key.startswith(TAG_PREFIX):
+                    options.append({key: {"$eq": True}})
+                else:
+                    field, value = key.split('=', 1)
+                    options.append({field: {"$eq": value}})
+            conditions.append(options[0] if len(options) == 1 else {"$or": options})
+
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
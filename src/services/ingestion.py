@@ -0,0 +1,147 @@
+"""文档索引模块
+
+基于内容哈希的增量同步：只解析和嵌入新增或修改过的文件，删除已移除文件的文档块。
+"""
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .document_loader import DocumentLoader, TextSplitter, file_hash
+from .vector_store import VectorStore
+
+
+class DocumentIndexer:
+    """文档索引器，负责把知识库目录同步到向量数据库"""
+
+    def __init__(self, document_loader: DocumentLoader, text_splitter: TextSplitter, vector_store: VectorStore):
+        self.document_loader = document_loader
+        self.text_splitter = text_splitter
+        self.vector_store = vector_store
+
+    def rebuild(self, workers: Optional[int] = None, parse_workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        全量重建：在影子索引中重新加载全部文档，完成后原子切换
+
+        重建期间查询继续读取旧索引；重建失败时旧索引保持不变。
+        """
+        with self.vector_store.reindex() as shadow:
+            indexer = DocumentIndexer(self.document_loader, self.text_splitter, shadow)
+            return indexer.sync(workers=workers, parse_workers=parse_workers)
+
+    def sync(self, paths: Optional[Iterable[Path]] = None, workers: Optional[int] = None,
+             parse_workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        增量同步文档
+
+        Args:
+            paths: 只同步指定文件；为 None 时同步整个知识库目录，并删除已移除文件的文档块
+            workers: 编码进程数，默认读取配置
+            parse_workers: 解析进程数，默认读取配置
+
+        Returns:
+            同步统计: added / updated / removed / skipped / failed 文件数，以及嵌入和删除的文档块数；
+            解析失败（异常、崩溃或超时）的文件保留原有文档块
+        """
+        # 同一集合的同步依次执行（如并发上传），避免基于同一份清单重复写入或误删
+        with self.vector_store.write_lock:
+            return self._sync(paths, workers, parse_workers)
+
+    def _sync(self, paths: Optional[Iterable[Path]], workers: Optional[int],
+              parse_workers: Optional[int]) -> Dict[str, int]:
+        prune = paths is None
+        if paths is None:
+            paths = self.document_loader.iter_document_paths()
+
+        manifest = self.vector_store.get_index_manifest()
+        stats = {
+            'added': 0,
+            'updated': 0,
+            'removed': 0,
+            'skipped': 0,
+            'failed': 0,
+            'embedded_chunks': 0,
+            'deleted_chunks': 0
+        }
+        stale_ids = set()
+        seen = set()
+        changed: Dict[str, str] = {}
+        file_hashes: Dict[str, str] = {}
+        # 内容未变而保留的文档块，元数据中的 file_hash 需要更新为新的文件哈希
+        kept_ids: Dict[str, List[str]] = {}
+
+        for file_path in paths:
+            path = str(file_path)
+            seen.add(path)
+            indexed = manifest.get(path)
+
+            # 文件内容和标签都未变化，跳过解析和嵌入
+            tags = ','.join(self.document_loader.get_tags(file_path))
+            digest = file_hash(file_path)
+            if indexed and indexed['file_hash'] == digest and indexed['tags'] == tags:
+                stats['skipped'] += 1
+                continue
+            changed[path] = tags
+            file_hashes[path] = digest
+
+        def new_chunks() -> Iterator[Dict]:
+            """逐个生成新增和修改文件中需要嵌入的文档块：解析 → 分割 → 编码写入按批流动，
+            add_documents 的在途批次达到上限时这里随之暂停，内存占用与知识库大小无关"""
+            documents = self.document_loader.iter_documents(
+                [Path(path) for path in changed], workers=parse_workers, stream=True, file_hashes=file_hashes
+            )
+            for result in documents:
+                path = str(result.path)
+                indexed = manifest.get(path)
+                if result.error:
+                    stats['failed'] += 1
+                    print(f"解析失败: {result.path.name}: {result.error}")
+                    continue
+
+                chunk_ids = set()
+                written = []
+                if result.document is not None:
+                    # 内容未变的文档块ID不变，无需重新嵌入；标签变化时全部重写以更新元数据
+                    unchanged = indexed['ids'] if indexed and indexed['tags'] == changed[path] else set()
+                    try:
+                        for chunk in self.text_splitter.iter_chunks(result.document):
+                            chunk_ids.add(chunk['id'])
+                            if chunk['id'] not in unchanged:
+                                written.append(chunk['id'])
+                                yield chunk
+                    except Exception as e:
+                        # 逐页解析到一半失败：保留原有文档块，已写入的新文档块在同步结束时删除
+                        stats['failed'] += 1
+                        print(f"解析失败: {result.path.name}: {type(e).__name__}: {e}")
+                        stale_ids.update(chunk_id for chunk_id in written
+                                         if not indexed or chunk_id not in indexed['ids'])
+                        continue
+
+                if not chunk_ids:
+                    if indexed:
+                        stale_ids.update(indexed['ids'])
+                        stats['removed'] += 1
+                    continue
+
+                if indexed:
+                    stale_ids.update(indexed['ids'] - chunk_ids)
+                    kept = chunk_ids & unchanged
+                    if kept and indexed['file_hash'] != file_hashes[path]:
+                        kept_ids.setdefault(file_hashes[path], []).extend(kept)
+                    stats['updated'] += 1
+                else:
+                    stats['added'] += 1
+                print(f"已加载: {result.path.name}")
+
+        # 先写入新文档块再删除旧文档块，避免同步过程中出现空窗
+        stats['embedded_chunks'] = self.vector_store.add_documents(new_chunks(), workers=workers)
+        for digest, ids in kept_ids.items():
+            self.vector_store.update_metadata(ids, {'file_hash': digest})
+
+        if prune:
+            for path, indexed in manifest.items():
+                if path not in seen:
+                    stale_ids |= indexed['ids']
+                    stats['removed'] += 1
+
+        self.vector_store.delete_ids(list(stale_ids))
+        stats['deleted_chunks'] = len(stale_ids)
+        return stats
@@ -0,0 +1,267 @@
+"""词法检索模块
+
+BM25 倒排索引，补充稠密向量检索对型号、规格参数等精确词的召回。
+中日韩文字按字符二元组切分，其他文字按字母数字串切分。
+"""
+import json
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+_CJK = r'\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[a-z0-9]+(?:[-_./][a-z0-9]+)*')
+_CJK_RE = re.compile(rf'[{_CJK}]')
+_SEPARATOR_RE = re.compile(r'[-_./]')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词
+
+    - 中日韩文字串切分为字符二元组（单字串保留单字）
+    - 字母数字串整体保留，带连接符的型号（如 x-s20）额外拆出各部分
+    """
+    text = unicodedata.normalize('NFKC', text).lower()
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        run = match.group()
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+            if _SEPARATOR_RE.search(run):
+                tokens.extend(part for part in _SEPARATOR_RE.split(run) if part)
+    return tokens
+
+
+def delta_path(index_path: Union[str, Path]) -> Path:
+    """索引的增量日志文件路径"""
+    index_path = Path(index_path)
+    return index_path.with_name(index_path.name + '.delta.jsonl')
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """倒数排名融合：score(d) = Σ 1 / (k + rank)，rank 从 1 开始"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """BM25 倒排索引
+
+    内存中为 {词: {文档ID: 词频}}。持久化分两部分：合并后的 CSR 数组写入 .npz 文件，
+    之后的添加和删除以每行一个操作（文档词频或删除的ID）追加到增量日志，save 的开销
+    与变更量成正比；增量日志中的文档数超过 MERGE_MIN 且超过索引文档数的 MERGE_RATIO 时
+    合并重写 .npz 并清空日志。加载时先读 .npz 再回放增量日志。
+    """
+
+    MERGE_MIN = 1000
+    MERGE_RATIO = 0.25
+
+    def __init__(self, index_path: str, k1: float = 1.5, b: float = 0.75):
+        self.index_path = Path(index_path)
+        self.delta_path = delta_path(self.index_path)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._total_len = 0
+        # 尚未写入增量日志的操作，以及增量日志中已有的文档数
+        self._pending: List[Dict] = []
+        self._delta_docs = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def _load(self):
+        if self.index_path.exists():
+            self._load_base()
+        if not self.delta_path.exists():
+            return
+        valid_size = 0
+        with open(self.delta_path, 'rb') as f:
+            for line in f:
+                try:
+                    op = json.loads(line) if line.endswith(b'\n') else None
+                except ValueError:
+                    op = None
+                if op is None:
+                    break
+                self._apply(op)
+                self._delta_docs += len(op['ids']) if op['op'] == 'remove' else 1
+                valid_size += len(line)
+        # 写到一半中断的最后一行截掉，之后追加的操作才能被回放
+        if self.delta_path.stat().st_size != valid_size:
+            with open(self.delta_path, 'r+b') as f:
+                f.truncate(valid_size)
+
+    def _load_base(self):
+        with np.load(self.index_path, allow_pickle=False) as data:
+            terms = data['terms']
+            offsets = data['offsets']
+            doc_index = data['doc_index']
+            term_freqs = data['term_freqs']
+            doc_ids = data['doc_ids']
+            doc_lens = data['doc_lens']
+
+        self._doc_len = {str(doc_id): int(length) for doc_id, length in zip(doc_ids, doc_lens)}
+        self._total_len = int(doc_lens.sum())
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        for i, term in enumerate(terms):
+            start, end = offsets[i], offsets[i + 1]
+            self._postings[str(term)] = {
+                doc_ids[d]: int(tf)
+                for d, tf in zip(doc_index[start:end], term_freqs[start:end])
+            }
+
+    def save(self, merge: bool = False):
+        """
+        持久化：未保存的操作追加到增量日志，日志过大时合并
+
+        Args:
+            merge: 为 True 时总是合并为单个 .npz 文件（如导出快照前）
+        """
+        with self._lock:
+            pending_docs = sum(len(op['ids']) if op['op'] == 'remove' else 1 for op in self._pending)
+            delta_docs = self._delta_docs + pending_docs
+            if merge or (delta_docs > self.MERGE_MIN and delta_docs > self.MERGE_RATIO * len(self._doc_len)):
+                self._merge()
+                return
+            if not self._pending:
+                return
+
+            self.delta_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.delta_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(op, ensure_ascii=False) + "\n" for op in self._pending))
+            self._pending = []
+            self._delta_docs = delta_docs
+
+    def _merge(self):
+        """重写为 CSR 格式：terms / offsets / doc_index / term_freqs / doc_ids / doc_lens，并清空增量日志"""
+        with self._lock:
+            doc_ids = list(self._doc_len)
+            position = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+            terms = sorted(self._postings)
+
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            doc_index = []
+            term_freqs = []
+            for i, term in enumerate(terms):
+                postings = self._postings[term]
+                doc_index.extend(position[doc_id] for doc_id in postings)
+                term_freqs.extend(postings.values())
+                offsets[i + 1] = offsets[i] + len(postings)
+
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_name(self.index_path.name + '.tmp.npz')
+            np.savez_compressed(
+                tmp_path,
+                terms=np.array(terms, dtype=str),
+                offsets=offsets,
+                doc_index=np.array(doc_index, dtype=np.int32),
+                term_freqs=np.array(term_freqs, dtype=np.uint16),
+                doc_ids=np.array(doc_ids, dtype=str),
+                doc_lens=np.array([self._doc_len[doc_id] for doc_id in doc_ids], dtype=np.int32)
+            )
+            tmp_path.replace(self.index_path)
+            self.delta_path.unlink(missing_ok=True)
+            self._pending = []
+            self._delta_docs = 0
+
+    def _apply(self, op: Dict):
+        """应用一个操作: {'op': 'add', 'id', 'tf': {词: 词频}} 或 {'op': 'remove', 'ids'}"""
+        if op['op'] == 'remove':
+            self._remove(op['ids'])
+            return
+
+        doc_id = op['id']
+        self._remove([doc_id])
+        for term, tf in op['tf'].items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        length = sum(op['tf'].values())
+        self._doc_len[doc_id] = length
+        self._total_len += length
+
+    def add(self, ids: List[str], texts: List[str]):
+        """添加文档，ID已存在时覆盖"""
+        with self._lock:
+            self._remove(ids)
+            for doc_id, text in zip(ids, texts):
+                counts = Counter(tokenize(text))
+                op = {'op': 'add', 'id': doc_id, 'tf': {term: min(tf, 65535) for term, tf in counts.items()}}
+                self._apply(op)
+                self._pending.append(op)
+
+    def remove(self, ids: List[str]):
+        """删除文档"""
+        with self._lock:
+            ids = list(dict.fromkeys(doc_id for doc_id in ids if doc_id in self._doc_len))
+            if ids:
+                self._remove(ids)
+                self._pending.append({'op': 'remove', 'ids': ids})
+
+    def _remove(self, ids: List[str]):
+        removed = {doc_id for doc_id in ids if doc_id in self._doc_len}
+        if not removed:
+            return
+
+        for doc_id in removed:
+            self._total_len -= self._doc_len.pop(doc_id)
+        for term in list(self._postings):
+            postings = self._postings[term]
+            for doc_id in removed.intersection(postings):
+                del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def clear(self):
+        """清空索引并删除索引文件"""
+        with self._lock:
+            self._postings = {}
+            self._doc_len = {}
+            self._total_len = 0
+            self._pending = []
+            self._delta_docs = 0
+            self.index_path.unlink(missing_ok=True)
+            self.delta_path.unlink(missing_ok=True)
+
+    def search(self, query: str, top_k: int = 10,
+               allowed_ids: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """检索，返回按 BM25 得分排序的 [(文档ID, 得分), ...]
+
+        提供 allowed_ids 时只对其中的文档打分（元数据预过滤）
+        """
+        with self._lock:
+            n = len(self._doc_len)
+            if not n:
+                return []
+
+            avgdl = self._total_len / n
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    if allowed_ids is not None and doc_id not in allowed_ids:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
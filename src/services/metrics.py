@@ -0,0 +1,69 @@
+"""指标模块
+
+固定分桶的直方图，可导出为 JSON 或 Prometheus 文本格式。
+"""
+import math
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable
+
+
+class Histogram:
+    """
+    线程安全的累计分桶直方图（与 Prometheus histogram 语义一致）
+
+    Args:
+        buckets: 各分桶上界，自动追加 +Inf
+    """
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """记录一个观测值"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> Dict:
+        """获取累计分桶计数: {'buckets': {上界: 小于等于该值的次数}, 'count', 'sum', 'mean'}"""
+        with self._lock:
+            counts = list(self._counts)
+            count, total = self.count, self.sum
+
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            running += bucket_count
+            cumulative[_format_bound(bound)] = running
+        return {
+            'buckets': cumulative,
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else 0.0
+        }
+
+
+def _format_bound(bound: float) -> str:
+    if bound == math.inf:
+        return '+Inf'
+    return f"{bound:g}"
+
+
+def render_prometheus(histograms: Dict[str, Histogram]) -> str:
+    """按 Prometheus 文本格式导出直方图，键为指标名"""
+    lines = []
+    for name, histogram in histograms.items():
+        snapshot = histogram.snapshot()
+        lines.append(f"# TYPE {name} histogram")
+        for bound, count in snapshot['buckets'].items():
+            lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f"{name}_sum {snapshot['sum']}")
+        lines.append(f"{name}_count {snapshot['count']}")
+    return "\n".join(lines) + "\n"
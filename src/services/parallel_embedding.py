@@ -0,0 +1,75 @@
+"""多进程并行编码模块
+
+批量导入时把文档块分批分发到进程池，每个工作进程只加载一次嵌入模型。
+提交的批次数有上限，调用方按提交顺序取回结果并写入存储，内存占用与文档总量无关。
+"""
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Optional
+
+import numpy as np
+
+from .embedders import create_embedder
+
+# 工作进程内的嵌入器，由 _init_worker 创建
+_worker_embedder = None
+
+
+def _init_worker(runtime: Optional[str], model_name: Optional[str], intra_op_threads: int):
+    global _worker_embedder
+    # 批量导入使用进程内模型，不经过共享嵌入服务
+    _worker_embedder = create_embedder(runtime=runtime, model_name=model_name,
+                                       intra_op_threads=intra_op_threads, use_service=False)
+    _worker_embedder.warmup()
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return _worker_embedder.encode(texts)
+
+
+def resolve_workers(workers: int) -> int:
+    """0 或负数表示使用全部CPU核"""
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+class ParallelEncoder:
+    """
+    编码进程池
+
+    Args:
+        workers: 工作进程数
+        runtime: 嵌入运行时，默认读取配置
+        model_name: 嵌入模型名称，默认读取配置
+        intra_op_threads: 每个进程的算子内线程数，0 表示按 CPU 核数平均分配，避免线程超额订阅
+    """
+
+    def __init__(self, workers: int, runtime: Optional[str] = None, model_name: Optional[str] = None,
+                 intra_op_threads: int = 0):
+        self.workers = resolve_workers(workers)
+        threads = intra_op_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        # 使用 spawn：fork 已初始化线程池的 PyTorch / onnxruntime 进程可能死锁
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(runtime, model_name, threads)
+        )
+
+    @property
+    def max_pending(self) -> int:
+        """同时在途的批次数上限，每个进程一个正在编码、一个排队"""
+        return self.workers * 2
+
+    def submit(self, texts: List[str]) -> Future:
+        """提交一批文本，返回结果为 float32 矩阵的 Future"""
+        return self._executor.submit(_encode_batch, texts)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
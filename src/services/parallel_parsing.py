@@ -0,0 +1,164 @@
+"""多进程文档解析模块
+
+PDF 等格式的文本抽取是 CPU 密集的，串行解析时一个异常文件就会拖住整次加载。
+每个工作进程一次解析一个文件：超过单文件超时的进程被终止，崩溃的进程（如解析库段错误）
+同样被替换，对应文件作为失败结果返回，其余文件继续解析。结果按完成顺序返回。
+
+concurrent.futures 的进程池无法终止正在执行的任务，一个工作进程异常退出还会使整个池
+不可用，因此这里直接管理工作进程。
+"""
+import time
+from multiprocessing import get_context
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .document_loader import DocumentLoader, ParseResult
+
+
+def _parse_worker(conn, documents_path: str):
+    """工作进程：逐个接收 (文件路径, 文件哈希) 并返回 (路径, 文档, 错误, 耗时)，收到 None 时退出"""
+    loader = DocumentLoader(documents_path)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        path, digest = task
+        start = time.perf_counter()
+        try:
+            document, error = loader.load_document(Path(path), digest), None
+        except Exception as e:
+            document, error = None, f"{type(e).__name__}: {e}"
+        conn.send((path, document, error, time.perf_counter() - start))
+
+
+class _Worker:
+    """一个解析进程及其当前任务"""
+
+    def __init__(self, context, documents_path: str):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_parse_worker, args=(child_conn, documents_path), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.path: Optional[str] = None
+        self.started = 0.0
+
+    def assign(self, path: str, digest: Optional[str] = None):
+        self.path = path
+        self.started = time.perf_counter()
+        self.conn.send((path, digest))
+
+    def stop(self, kill: bool = False):
+        if not kill:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                kill = True
+            self.process.join(timeout=1)
+        if kill or self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+
+class ParallelParser:
+    """
+    解析进程池
+
+    Args:
+        documents_path: 文档目录（用于读取标签）
+        workers: 工作进程数
+        timeout: 单个文件的解析超时（秒），超时的进程被终止，0 或 None 表示不限制
+    """
+
+    def __init__(self, documents_path: str, workers: int, timeout: Optional[float] = 120):
+        self.documents_path = str(documents_path)
+        self.workers = max(1, workers)
+        self.timeout = timeout or None
+        # 使用 spawn：与编码进程池一致，不继承父进程的线程和模型
+        self._context = get_context('spawn')
+
+    def imap_unordered(self, paths: Iterable[Path],
+                       file_hashes: Optional[Dict[str, str]] = None) -> Iterator[ParseResult]:
+        """
+        解析文件，按完成顺序返回 ParseResult；提前结束迭代时关闭全部工作进程
+
+        file_hashes 为已计算的文件哈希 {路径: 哈希}，这些文件在工作进程中不再重复计算
+        """
+        file_hashes = file_hashes or {}
+        pending = iter(paths)
+        workers: List[_Worker] = []
+        exhausted = False
+        try:
+            while True:
+                # 为空闲进程分配文件，进程在有文件需要解析时才启动
+                while not exhausted:
+                    idle = next((worker for worker in workers if worker.path is None), None)
+                    if idle is None and len(workers) >= self.workers:
+                        break
+                    path = next(pending, None)
+                    if path is None:
+                        exhausted = True
+                        break
+                    if idle is None:
+                        idle = _Worker(self._context, self.documents_path)
+                        workers.append(idle)
+                    idle.assign(str(path), file_hashes.get(str(path)))
+
+                busy = [worker for worker in workers if worker.path is not None]
+                if not busy:
+                    return
+
+                wait_timeout = None
+                if self.timeout:
+                    deadline = min(worker.started for worker in busy) + self.timeout
+                    wait_timeout = max(0.0, deadline - time.perf_counter())
+                wait([worker.conn for worker in busy] + [worker.process.sentinel for worker in busy],
+                     timeout=wait_timeout)
+
+                now = time.perf_counter()
+                for worker in busy:
+                    result, healthy = self._collect(worker, now)
+                    if result is None:
+                        continue
+                    if not healthy:
+                        # 崩溃或超时的进程不再复用，需要时再启动新进程
+                        worker.stop(kill=True)
+                        workers.remove(worker)
+                    yield result
+        finally:
+            for worker in workers:
+                worker.stop(kill=worker.path is not None)
+
+    def _collect(self, worker: _Worker, now: float):
+        """
+        取回工作进程的结果
+
+        Returns:
+            (ParseResult, 进程是否可继续使用)；仍在解析时为 (None, True)，
+            进程崩溃或超时时返回失败结果和 False
+        """
+        path = worker.path
+        elapsed = now - worker.started
+        if worker.conn.poll():
+            try:
+                _, document, error, elapsed = worker.conn.recv()
+                worker.path = None
+                return ParseResult(Path(path), document, error, elapsed), True
+            except (EOFError, OSError):
+                # 管道已关闭，进程正在退出
+                worker.process.join(timeout=1)
+
+        if not worker.process.is_alive():
+            worker.path = None
+            error = f"解析进程崩溃（退出码 {worker.process.exitcode}）"
+            return ParseResult(Path(path), None, error, elapsed), False
+
+        if self.timeout and elapsed >= self.timeout:
+            worker.path = None
+            return ParseResult(Path(path), None, f"解析超时（{self.timeout:g} 秒）", elapsed), False
+        return None, True
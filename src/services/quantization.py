@@ -0,0 +1,160 @@
+"""向量量化模块
+
+候选检索使用常驻内存的量化编码，再用磁盘上（内存映射）的全精度向量对短名单重新打分：
+    int8:   每维按对称标量量化为 int8，内存为 float32 的 1/4
+    binary: 每维按阈值二值化为 1 bit，内存为 float32 的 1/32，用汉明距离召回
+"""
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# 0-255 每个字节中 1 的个数，NumPy < 2.0 没有 bitwise_count 时用查表计算汉明距离
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+_bitwise_count = getattr(np, 'bitwise_count', None)
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """计算每行编码与查询编码的汉明距离"""
+    xor = np.bitwise_xor(codes, query_code)
+    if _bitwise_count is None:
+        return _POPCOUNT[xor].sum(axis=1, dtype=np.int32)
+    if xor.shape[1] % 8 == 0:
+        xor = xor.view(np.uint64)
+    return _bitwise_count(xor).sum(axis=1, dtype=np.int32)
+
+
+class Quantizer(ABC):
+    """量化器基类
+
+    近似得分与 NumpyBackend 的精确得分方向一致：越大越相似。
+    """
+
+    name = ""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.fitted_rows = 0
+
+    @property
+    @abstractmethod
+    def code_size(self) -> int:
+        """每个向量编码的字节数"""
+        pass
+
+    @property
+    def compression_ratio(self) -> float:
+        """相对 float32 的压缩比"""
+        return self.dim * 4 / self.code_size
+
+    @abstractmethod
+    def fit(self, vectors: np.ndarray):
+        """根据样本向量确定量化参数"""
+        pass
+
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """编码为 (rows, code_size) 的 uint8/int8 矩阵"""
+        pass
+
+    @abstractmethod
+    def scores(self, queries: np.ndarray, codes: np.ndarray, sq_norms: np.ndarray) -> np.ndarray:
+        """计算 (n_queries, rows) 的近似得分"""
+        pass
+
+    @abstractmethod
+    def _params(self) -> dict:
+        pass
+
+    def save(self, path: Path):
+        """保存量化参数"""
+        tmp_path = path.with_name(path.name + '.tmp.npz')
+        np.savez(tmp_path, kind=self.name, dim=self.dim, fitted_rows=self.fitted_rows, **self._params())
+        tmp_path.replace(path)
+
+    @staticmethod
+    def load(path: Path) -> Optional["Quantizer"]:
+        """加载量化参数，不存在时返回 None"""
+        if not path.exists():
+            return None
+
+        with np.load(path) as data:
+            quantizer = create_quantizer(str(data['kind']), int(data['dim']))
+            quantizer.fitted_rows = int(data['fitted_rows'])
+            for key in quantizer._params():
+                setattr(quantizer, key, data[key])
+        return quantizer
+
+
+class Int8Quantizer(Quantizer):
+    """int8 对称标量量化，每维一个缩放系数"""
+
+    name = "int8"
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self.scale = np.ones(dim, dtype=np.float32)
+
+    @property
+    def code_size(self) -> int:
+        return self.dim
+
+    def fit(self, vectors: np.ndarray):
+        # 取 99.9 分位数而不是最大值，少量离群值被截断换取其余维度的精度
+        bound = np.percentile(np.abs(vectors), 99.9, axis=0).astype(np.float32)
+        self.scale = np.where(bound > 0, bound / 127, 1.0).astype(np.float32)
+        self.fitted_rows = len(vectors)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint(np.asarray(vectors, dtype=np.float32) / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray, sq_norms: np.ndarray) -> np.ndarray:
+        # 2·q·x̂ - |x|²，x̂ 为反量化向量，|x|² 使用精确值
+        return 2 * ((queries * self.scale) @ codes.astype(np.float32).T) - sq_norms
+
+    def _params(self) -> dict:
+        return {'scale': self.scale}
+
+
+class BinaryQuantizer(Quantizer):
+    """1 bit 量化：每维与该维均值比较，得分为负汉明距离"""
+
+    name = "binary"
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self.threshold = np.zeros(dim, dtype=np.float32)
+
+    @property
+    def code_size(self) -> int:
+        return (self.dim + 7) // 8
+
+    def fit(self, vectors: np.ndarray):
+        # 嵌入向量各维并不以 0 为中心，以均值为阈值使各 bit 分布更均衡
+        self.threshold = np.mean(vectors, axis=0).astype(np.float32)
+        self.fitted_rows = len(vectors)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.packbits(np.asarray(vectors, dtype=np.float32) > self.threshold, axis=-1)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray, sq_norms: np.ndarray) -> np.ndarray:
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for i, query_code in enumerate(self.encode(queries)):
+            scores[i] = -hamming_distances(codes, query_code)
+        return scores
+
+    def _params(self) -> dict:
+        return {'threshold': self.threshold}
+
+
+def create_quantizer(kind: str, dim: int) -> Quantizer:
+    """创建量化器"""
+    kind = kind.lower()
+    if kind == "int8":
+        return Int8Quantizer(dim)
+    elif kind == "binary":
+        return BinaryQuantizer(dim)
+    else:
+        raise ValueError(f"不支持的量化方式: {kind}。支持: none, int8, binary")
@@ -0,0 +1,141 @@
+"""重排序模块
+
+在检索和构建提示词之间，用本地交叉编码器对过量召回的候选文档块重新打分，
+只保留得分最高的 top_k 个，减少为召回正确文档块而塞进提示词的无关内容。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from .cache import LRUCache, normalize_query
+
+
+class Reranker:
+    """交叉编码器重排序器
+
+    Args:
+        model_name: 交叉编码器模型名称
+        batch_size: 打分批大小
+        budget_ms: 单次请求的打分时间预算（从任务出队开始执行时计时），超时则保持原检索顺序
+        cache_size: (问题, 文档块ID) 得分缓存容量
+        queue_size: 打分队列容量（包括正在执行的任务）
+
+    打分任务在单个工作线程中按提交顺序执行，排队和执行中的任务（包括超时后仍在后台完成的
+    任务和模型预加载）最多 queue_size 个。队列已满时新请求直接保持原检索顺序，
+    负载高时排队时间有上限，不会因为队列无限增长而全部超时。
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, budget_ms: float = 300, cache_size: int = 10000,
+                 queue_size: int = 8):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.queue_size = queue_size
+        self.score_cache = LRUCache(max_size=cache_size, ttl=None)
+        self.timeouts = 0
+        self.skipped = 0
+        self._model = None
+        # 单线程执行打分：超时的请求在后台继续完成并写入缓存，不阻塞调用方
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        # 每个排队或执行中的任务占用一个名额，由工作线程在任务结束时释放
+        self._slots = threading.BoundedSemaphore(max(1, queue_size))
+
+    def warmup(self):
+        """在后台线程预先加载模型"""
+        if self._slots.acquire(blocking=False):
+            self._executor.submit(self._run, threading.Event(), self._load_model)
+
+    def _run(self, started: threading.Event, func, *args):
+        """在工作线程中执行任务，出队时通知调用方，结束时释放名额"""
+        started.set()
+        try:
+            return func(*args)
+        finally:
+            self._slots.release()
+
+    def _load_model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def _score(self, query_key: str, query: str, pairs: List[Tuple[str, str]]) -> List[float]:
+        """批量打分并写入缓存（在工作线程中执行）"""
+        model = self._load_model()
+        scores = model.predict([(query, content) for _, content in pairs], batch_size=self.batch_size)
+        scores = [float(score) for score in scores]
+        for (chunk_id, _), score in zip(pairs, scores):
+            self.score_cache.set((query_key, chunk_id), score)
+        return scores
+
+    def rerank(self, query: str, chunks: List, top_k: int) -> Tuple[List, bool]:
+        """
+        重排序
+
+        Args:
+            query: 用户问题
+            chunks: 候选文档块（RetrievedChunk），按检索顺序排列
+            top_k: 保留数量
+
+        Returns:
+            (保留的文档块, 是否完成重排序)；超出时间预算或打分队列已满时按原顺序截取 top_k
+        """
+        if len(chunks) <= 1:
+            return chunks[:top_k], True
+
+        query_key = normalize_query(query)
+        scores: Dict[str, float] = {}
+        missing = []
+        for chunk in chunks:
+            score = self.score_cache.get((query_key, chunk.id))
+            if score is None:
+                missing.append((chunk.id, chunk.content))
+            else:
+                scores[chunk.id] = score
+
+        if missing:
+            if not self._slots.acquire(blocking=False):
+                self.skipped += 1
+                return chunks[:top_k], False
+            started = threading.Event()
+            future = self._executor.submit(self._run, started, self._score, query_key, query, missing)
+            # 等待前面的任务完成（最多 queue_size - 1 个）；时间预算从出队开始执行时计时
+            started.wait()
+            try:
+                new_scores = future.result(timeout=self.budget_ms / 1000 if self.budget_ms else None)
+            except TimeoutError:
+                self.timeouts += 1
+                return chunks[:top_k], False
+            for (chunk_id, _), score in zip(missing, new_scores):
+                scores[chunk_id] = score
+
+        ranked = sorted(chunks, key=lambda chunk: scores[chunk.id], reverse=True)[:top_k]
+        for chunk in ranked:
+            chunk.score = scores[chunk.id]
+        return ranked, True
+
+    def stats(self) -> Dict:
+        """获取统计信息"""
+        return {
+            "model_name": self.model_name,
+            "budget_ms": self.budget_ms,
+            "queue_size": self.queue_size,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+            "score_cache": self.score_cache.stats()
+        }
+
+
+def create_reranker() -> Optional[Reranker]:
+    """根据配置创建重排序器，未启用时返回 None"""
+    if not settings.rerank_enabled:
+        return None
+
+    return Reranker(
+        settings.rerank_model,
+        batch_size=settings.rerank_batch_size,
+        budget_ms=settings.rerank_budget_ms,
+        cache_size=settings.rerank_cache_size,
+        queue_size=settings.rerank_queue_size
+    )
@@ -0,0 +1,207 @@
+"""索引快照模块
+
+把集合当前一代索引的文档块、元数据和嵌入向量导出为紧凑的列式快照，新副本导入快照后
+即可提供服务，无需重新解析和嵌入文档。
+
+快照格式（每个快照一个目录）：
+    manifest.json        格式版本、集合、嵌入模型、向量维度、文档块数和各文件的 SHA-256
+    embeddings.npy       (n, dim) float32 向量矩阵，导入时内存映射，按批写入存储后端
+    contents.bin         UTF-8 编码的文档块内容，首尾相接
+    content_offsets.npy  (n + 1,) int64，第 i 个文档块为 contents.bin[offsets[i]:offsets[i + 1]]
+    records.jsonl        与矩阵逐行对应的 {"id", "metadata"}
+    bm25.npz             BM25索引（启用混合检索时），导入后无需重新分词
+"""
+import hashlib
+import json
+import mmap
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from .embedding_cache import content_hash
+from .vector_store import VectorStore
+
+SNAPSHOT_FORMAT = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+CONTENTS_FILE = "contents.bin"
+OFFSETS_FILE = "content_offsets.npy"
+RECORDS_FILE = "records.jsonl"
+LEXICAL_INDEX_FILE = "bm25.npz"
+
+# 导入时每批写入存储后端的文档块数（向量来自内存映射，不受批大小影响常驻内存）
+IMPORT_BATCH_SIZE = 8192
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(snapshot_dir: str) -> Dict:
+    """读取快照清单，不是快照目录或格式不支持时抛出 ValueError"""
+    manifest_file = Path(snapshot_dir) / MANIFEST_FILE
+    if not manifest_file.exists():
+        raise ValueError(f"不是索引快照目录: {snapshot_dir}")
+    manifest = json.loads(manifest_file.read_text(encoding='utf-8'))
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"不支持的快照格式: {manifest.get('format')}")
+    return manifest
+
+
+def verify_snapshot(snapshot_dir: str, manifest: Optional[Dict] = None):
+    """校验快照文件的大小和 SHA-256，不一致时抛出 ValueError"""
+    manifest = manifest or read_manifest(snapshot_dir)
+    for name, expected in manifest['files'].items():
+        path = Path(snapshot_dir) / name
+        if not path.exists():
+            raise ValueError(f"快照文件缺失: {name}")
+        if path.stat().st_size != expected['size'] or _file_digest(path) != expected['sha256']:
+            raise ValueError(f"快照文件校验失败: {name}")
+
+
+def export_snapshot(vector_store: VectorStore, output_dir: str) -> Dict:
+    """
+    导出集合当前一代索引为快照
+
+    导出期间同一集合的写入排队等待，查询不受影响。快照先写入临时目录，完成后替换 output_dir。
+
+    Args:
+        vector_store: 向量存储
+        output_dir: 快照目录
+
+    Returns:
+        快照清单
+    """
+    output_dir = Path(output_dir)
+    tmp_dir = output_dir.with_name(output_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    with vector_store.write_lock:
+        generation = vector_store.generation
+        count = generation.backend.count()
+        embeddings = None
+        offsets = np.zeros(count + 1, dtype=np.int64)
+
+        with open(tmp_dir / CONTENTS_FILE, 'wb') as contents, \
+                open(tmp_dir / RECORDS_FILE, 'w', encoding='utf-8') as records:
+            for row, item in enumerate(generation.backend.iterate(include_embeddings=True)):
+                if embeddings is None:
+                    embeddings = np.lib.format.open_memmap(
+                        tmp_dir / EMBEDDINGS_FILE, mode='w+', dtype=np.float32,
+                        shape=(count, len(item['embedding']))
+                    )
+                embeddings[row] = item['embedding']
+                data = item['content'].encode('utf-8')
+                contents.write(data)
+                offsets[row + 1] = offsets[row] + len(data)
+                records.write(json.dumps({'id': item['id'], 'metadata': item['metadata']}, ensure_ascii=False) + "\n")
+
+        if embeddings is None:
+            np.save(tmp_dir / EMBEDDINGS_FILE, np.zeros((0, 0), dtype=np.float32))
+            dim = 0
+        else:
+            embeddings.flush()
+            dim = int(embeddings.shape[1])
+            del embeddings
+        np.save(tmp_dir / OFFSETS_FILE, offsets)
+
+        if generation.lexical_index is not None:
+            # 合并增量日志，快照只需复制一个索引文件
+            generation.lexical_index.save(merge=True)
+            shutil.copyfile(generation.lexical_index_path, tmp_dir / LEXICAL_INDEX_FILE)
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'collection': vector_store.collection_name,
+            'generation': generation.name,
+            'embedding_model': vector_store.embedder.get_name(),
+            'dim': dim,
+            'count': count,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'files': {
+                path.name: {'size': path.stat().st_size, 'sha256': _file_digest(path)}
+                for path in sorted(tmp_dir.iterdir())
+            }
+        }
+
+    (tmp_dir / MANIFEST_FILE).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+    shutil.rmtree(output_dir, ignore_errors=True)
+    tmp_dir.replace(output_dir)
+    print(f"已导出 {count} 个文档块到 {output_dir}")
+    return manifest
+
+
+def import_snapshot(vector_store: VectorStore, snapshot_dir: str, verify: bool = True) -> Dict:
+    """
+    导入快照为集合的新一代索引
+
+    向量直接写入影子索引后原子切换（与全量重建相同），导入期间查询继续读取旧索引，
+    失败时旧索引不变。快照的嵌入模型必须与当前配置一致，否则查询向量与索引不在同一空间。
+
+    Args:
+        vector_store: 向量存储
+        snapshot_dir: 快照目录
+        verify: 是否校验文件 SHA-256
+
+    Returns:
+        快照清单
+    """
+    snapshot_dir = Path(snapshot_dir)
+    manifest = read_manifest(str(snapshot_dir))
+    model_name = vector_store.embedder.get_name()
+    if manifest['embedding_model'] != model_name:
+        raise ValueError(f"快照的嵌入模型 {manifest['embedding_model']} 与当前配置 {model_name} 不一致")
+    if verify:
+        verify_snapshot(str(snapshot_dir), manifest)
+
+    embeddings = np.load(snapshot_dir / EMBEDDINGS_FILE, mmap_mode='r')
+    offsets = np.load(snapshot_dir / OFFSETS_FILE)
+    with open(snapshot_dir / RECORDS_FILE, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    count = manifest['count']
+    if len(records) != count or embeddings.shape[0] != count or len(offsets) != count + 1:
+        raise ValueError(f"快照文件行数不一致: {snapshot_dir}")
+
+    embedding_cache = vector_store.embedding_cache
+    with open(snapshot_dir / CONTENTS_FILE, 'rb') as f, vector_store.reindex() as shadow:
+        contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b''
+        try:
+            generation = shadow.generation
+            lexical_file = snapshot_dir / LEXICAL_INDEX_FILE
+            if lexical_file.exists():
+                # BM25索引随快照导入，首次访问时直接加载，不从文档块重建
+                shutil.copyfile(lexical_file, generation.lexical_index_path)
+
+            # 全部写入后只构建一次ANN索引
+            with generation.backend.bulk_load():
+                for start in range(0, count, IMPORT_BATCH_SIZE):
+                    end = min(start + IMPORT_BATCH_SIZE, count)
+                    batch = records[start:end]
+                    documents = [
+                        contents[offsets[row]:offsets[row + 1]].decode('utf-8')
+                        for row in range(start, end)
+                    ]
+                    vectors = np.asarray(embeddings[start:end], dtype=np.float32)
+                    generation.backend.add([record['id'] for record in batch], vectors, documents,
+                                           [record['metadata'] for record in batch])
+                    # 同时填充嵌入缓存，副本之后全量重建时内容未变的文档块无需重新编码
+                    if embedding_cache is not None:
+                        embedding_cache.put_many([content_hash(document) for document in documents], vectors)
+
+            # 加载BM25索引（快照中没有时从文档块重建），切换后的第一个查询不必等待
+            if generation.lexical_index is not None:
+                generation.lexical_index.save()
+        finally:
+            if isinstance(contents, mmap.mmap):
+                contents.close()
+
+    print(f"已从 {snapshot_dir} 导入 {count} 个文档块")
+    return manifest
@@ -0,0 +1,90 @@
+"""分词器模块
+
+按 LLM 模型在本地统计 token 数，用于控制提示词大小。OpenAI 系列模型（包括 GitHub Copilot
+使用的 gpt 模型）使用 tiktoken 的对应编码；tiktoken 未安装或模型没有公开分词器
+（如 Gemini）时按字符估算。
+"""
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+from ..core.config import settings
+
+# 中日韩文字（估算时每字计 1 个 token）
+_CJK_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]')
+
+
+class Tokenizer(ABC):
+    """分词器基类"""
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """统计文本的 token 数"""
+        pass
+
+    @abstractmethod
+    def get_name(self) -> str:
+        """分词器名称"""
+        pass
+
+
+class TiktokenTokenizer(Tokenizer):
+    """tiktoken 分词器（OpenAI 模型），未知模型使用 cl100k_base 编码"""
+
+    def __init__(self, model_name: str):
+        try:
+            import tiktoken
+        except ImportError:
+            raise ImportError("tiktoken包未安装,请运行: pip install tiktoken")
+
+        try:
+            self._encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def get_name(self) -> str:
+        return f"tiktoken/{self._encoding.name}"
+
+
+class EstimateTokenizer(Tokenizer):
+    """按字符估算：中日韩文字每字 1 个 token，其他字符每 4 个 1 个"""
+
+    def count(self, text: str) -> int:
+        cjk = len(_CJK_RE.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def get_name(self) -> str:
+        return "estimate"
+
+
+_tokenizers: Dict[str, Tokenizer] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def create_tokenizer(model_name: Optional[str] = None) -> Tokenizer:
+    """
+    创建模型对应的分词器，同一模型只创建一次
+
+    Args:
+        model_name: LLM 模型名称，可带提供商前缀（如 openai/gpt-4o、gemini/gemini-2.5-flash），
+            为 None 时读取 TOKENIZER_MODEL（留空则为 MODEL_NAME）
+    """
+    model_name = model_name or settings.tokenizer_model or settings.model_name
+    tokenizer = _tokenizers.get(model_name)
+    if tokenizer is None:
+        with _tokenizers_lock:
+            tokenizer = _tokenizers.get(model_name)
+            if tokenizer is None:
+                tokenizer = EstimateTokenizer()
+                if "gemini" not in model_name.lower():
+                    try:
+                        tokenizer = TiktokenTokenizer(model_name.rpartition("/")[2])
+                    except Exception as e:
+                        # 未安装 tiktoken 或首次使用时无法下载编码文件
+                        print(f"警告: 无法加载 {model_name} 的分词器，按字符估算 token 数: {e}")
+                _tokenizers[model_name] = tokenizer
+    return tokenizer
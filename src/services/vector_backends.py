@@ -0,0 +1,958 @@
+"""向量存储后端模块，支持多种向量索引引擎"""
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Iterator, Optional, Set
+
+import numpy as np
+
+from .ann_index import IVFIndex
+from .filters import MetadataFilter, facet_keys
+from .quantization import Quantizer, create_quantizer
+
+
+class VectorBackend(ABC):
+    """向量存储后端基类
+
+    距离统一为平方L2距离（与ChromaDB默认度量一致），越小越相似。
+    """
+
+    @abstractmethod
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict]):
+        """写入文档块，ID已存在时覆盖；embeddings 也可以是 (n, dim) 数组"""
+        pass
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], top_k: int,
+              search_params: Optional[Dict] = None,
+              filters: Optional[MetadataFilter] = None) -> List[List[Dict]]:
+        """批量检索，每个查询返回 [{'id', 'content', 'metadata', 'distance'}, ...]
+
+        search_params 为单次请求的检索参数（如 nprobe），后端不支持的参数会被忽略。
+        filters 为元数据过滤条件，只在满足条件的文档块中检索。
+        """
+        pass
+
+    @abstractmethod
+    def get(self, ids: List[str], include_embeddings: bool = False) -> List[Dict]:
+        """按ID获取文档块 {'id', 'content', 'metadata'[, 'embedding']}，不存在的ID被忽略，空列表返回空结果"""
+        pass
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """按ID删除文档块"""
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        """获取文档块数量"""
+        pass
+
+    @abstractmethod
+    def iterate(self, batch_size: int = 1000, include_embeddings: bool = False) -> Iterator[Dict]:
+        """遍历所有文档块，返回 {'id', 'content', 'metadata'[, 'embedding']}"""
+        pass
+
+    @abstractmethod
+    def clear(self):
+        """清空所有文档块"""
+        pass
+
+    def drop(self):
+        """删除集合及其存储文件（回收旧一代索引时调用），之后不能再使用该实例"""
+        self.clear()
+
+    def filter_ids(self, filters: MetadataFilter) -> Set[str]:
+        """获取满足过滤条件的文档块ID"""
+        return {item['id'] for item in self.iterate() if filters.matches(item['metadata'])}
+
+    @contextmanager
+    def bulk_load(self):
+        """批量写入期间推迟索引维护，结束时统一处理（默认不做任何事）"""
+        yield
+
+    def get_name(self) -> str:
+        """获取后端名称"""
+        return self.__class__.__name__
+
+    def index_stats(self) -> Dict:
+        """获取索引信息"""
+        return {}
+
+
+class ChromaBackend(VectorBackend):
+    """ChromaDB后端，客户端在第一次访问集合时创建"""
+
+    def __init__(self, db_path: str, collection_name: str, hnsw_params: Optional[Dict] = None):
+        self.db_path = db_path
+        self.collection_name = collection_name
+        self.hnsw_params = hnsw_params or {}
+        self._client = None
+        self._collection = None
+        self._init_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._init_lock:
+                if self._client is None:
+                    import chromadb
+                    from chromadb.config import Settings as ChromaSettings
+
+                    self._client = chromadb.PersistentClient(
+                        path=self.db_path,
+                        settings=ChromaSettings(anonymized_telemetry=False)
+                    )
+        return self._client
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = self._get_or_create_collection()
+        return self._collection
+
+    def _get_or_create_collection(self):
+        metadata = {"description": "文档知识库"}
+        # HNSW 参数只在创建集合时生效
+        for key, value in self.hnsw_params.items():
+            metadata[f"hnsw:{key}"] = value
+        return self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata=metadata
+        )
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict]):
+        if isinstance(embeddings, np.ndarray):
+            embeddings = embeddings.tolist()
+        self.collection.upsert(
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            ids=ids
+        )
+
+    def query(self, query_embeddings: List[List[float]], top_k: int,
+              search_params: Optional[Dict] = None,
+              filters: Optional[MetadataFilter] = None) -> List[List[Dict]]:
+        # ChromaDB 不支持按请求调整 search_ef，使用集合创建时的 HNSW 参数
+        # 过滤条件作为 where 下推到 ChromaDB，在检索时预过滤
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=top_k,
+            where=filters.to_chroma_where() if filters else None
+        )
+
+        batch_results = []
+        for q in range(len(query_embeddings)):
+            formatted_results = []
+            if results['documents']:
+                for i in range(len(results['documents'][q])):
+                    formatted_results.append({
+                        'id': results['ids'][q][i],
+                        'content': results['documents'][q][i],
+                        'metadata': results['metadatas'][q][i],
+                        'distance': results['distances'][q][i] if results.get('distances') else None
+                    })
+            batch_results.append(formatted_results)
+
+        return batch_results
+
+    def get(self, ids: List[str], include_embeddings: bool = False) -> List[Dict]:
+        if not ids:
+            # Chroma 对空 ids 会返回整个集合（新版本则直接报错）
+            return []
+        include = ['documents', 'metadatas']
+        if include_embeddings:
+            include.append('embeddings')
+        results = self.collection.get(ids=list(ids), include=include)
+        items = []
+        for i, doc_id in enumerate(results['ids']):
+            item = {'id': doc_id, 'content': results['documents'][i], 'metadata': results['metadatas'][i] or {}}
+            if include_embeddings:
+                item['embedding'] = list(results['embeddings'][i])
+            items.append(item)
+        return items
+
+    def filter_ids(self, filters: MetadataFilter) -> Set[str]:
+        return set(self.collection.get(where=filters.to_chroma_where(), include=[])['ids'])
+
+    def delete(self, ids: List[str]):
+        self.collection.delete(ids=list(ids))
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def iterate(self, batch_size: int = 1000, include_embeddings: bool = False) -> Iterator[Dict]:
+        include = ['documents', 'metadatas']
+        if include_embeddings:
+            include.append('embeddings')
+
+        offset = 0
+        while True:
+            results = self.collection.get(limit=batch_size, offset=offset, include=include)
+            if not results['ids']:
+                break
+
+            for i, doc_id in enumerate(results['ids']):
+                item = {
+                    'id': doc_id,
+                    'content': results['documents'][i],
+                    'metadata': results['metadatas'][i] or {}
+                }
+                if include_embeddings:
+                    item['embedding'] = list(results['embeddings'][i])
+                yield item
+
+            offset += len(results['ids'])
+
+    def clear(self):
+        self.client.delete_collection(name=self.collection_name)
+        self._collection = self._get_or_create_collection()
+
+    def drop(self):
+        self.client.delete_collection(name=self.collection_name)
+        self._collection = None
+
+    def get_name(self) -> str:
+        return "chroma"
+
+    def index_stats(self) -> Dict:
+        metadata = self.collection.metadata or {}
+        return {
+            "type": "hnsw",
+            **{key[len("hnsw:"):]: value for key, value in metadata.items() if key.startswith("hnsw:")}
+        }
+
+
+class _SearchView:
+    """NumpyBackend 查询使用的只读数据视图"""
+
+    __slots__ = ('rows', 'mask', 'ids', 'documents', 'metadatas', 'matrix', 'sq_norms', 'quantizer', 'codes',
+                 'ann_index')
+
+    def __init__(self, rows: int, mask: np.ndarray, ids: List[str], documents: List[str], metadatas: List[Dict],
+                 matrix: Optional[np.memmap], sq_norms: np.ndarray, quantizer: Optional[Quantizer],
+                 codes: Optional[np.ndarray], ann_index: Optional[IVFIndex]):
+        self.rows = rows
+        self.mask = mask
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.matrix = matrix
+        self.sq_norms = sq_norms
+        self.quantizer = quantizer
+        self.codes = codes
+        self.ann_index = ann_index
+
+
+class NumpyBackend(VectorBackend):
+    """进程内NumPy后端
+
+    向量保存在内存映射的 float32/float16 矩阵中，检索时用向量化点积精确计算，
+    再用 argpartition 取 top-k，没有SQLite和序列化开销，适合中小规模语料。
+
+    存储格式（每个集合一个目录）：
+        vectors.bin    追加写入的向量矩阵
+        records.jsonl  追加写入的操作日志（add 记录与矩阵逐行对应，delete 记录墓碑）
+        meta.json      向量维度和存储精度
+        codes.bin      量化编码（启用 quantization 时）
+        quant.npz      量化参数
+    删除的行超过 compact_threshold 比例时自动压缩。压缩先把向量和日志写入临时文件，
+    全部落盘后创建 compact.done 标记，再替换正式文件；中断时加载阶段按标记继续完成替换
+    或丢弃临时文件，不会出现向量与日志不对应的情况。
+    内存中为文件名、类型、目录和标签维护行号倒排表，元数据过滤先生成行掩码再检索。
+
+    IVF索引在后台线程中重建：k-means 在锁外基于当时行数的只读映射执行，完成后替换索引，
+    重建期间写入和查询不受影响（新增行由查询精确扫描）。bulk_load 期间不重建，结束时重建一次。
+
+    启用量化时，候选检索只扫描常驻内存的 int8/1-bit 编码，取 top_k × rescore 个候选后
+    再从内存映射的全精度向量读取这些行精确打分，全精度矩阵不需要常驻内存。
+    """
+
+    BLOCK_ROWS = 65536
+    ANN_MIN_ROWS = 1024
+    QUANT_SAMPLE_ROWS = 100000
+    # 量化编码打分前要先转换为 float32，小块转换能留在CPU缓存中
+    QUANT_BLOCK_ROWS = 2048
+
+    def __init__(self, db_path: str, collection_name: str, dtype: str = "float32", compact_threshold: float = 0.3,
+                 index: str = "flat", nlist: Optional[int] = None, nprobe: int = 8, rebuild_ratio: float = 0.1,
+                 quantization: str = "none", rescore: int = 4):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"不支持的向量精度: {dtype}。支持: float32, float16")
+        if index not in ("flat", "ivf"):
+            raise ValueError(f"不支持的索引类型: {index}。支持: flat, ivf")
+        if quantization not in ("none", "int8", "binary"):
+            raise ValueError(f"不支持的量化方式: {quantization}。支持: none, int8, binary")
+
+        self.dtype = np.dtype(dtype)
+        self.compact_threshold = compact_threshold
+        self.data_dir = Path(db_path) / f"{collection_name}.npvec"
+        self.vectors_file = self.data_dir / "vectors.bin"
+        self.records_file = self.data_dir / "records.jsonl"
+        self.meta_file = self.data_dir / "meta.json"
+        self.compact_marker = self.data_dir / "compact.done"
+
+        # ANN索引配置，索引文件与向量文件放在同一目录
+        self.index_type = index
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.rebuild_ratio = rebuild_ratio
+        self.index_file = self.data_dir / "ivf.npz"
+        self.ann_index: Optional[IVFIndex] = None
+        # 同一时间只有一个重建在执行；_layout 在压缩或清空（行号变化）时递增，使进行中的重建作废
+        self._build_lock = threading.Lock()
+        self._index_building = False
+        self._bulk_depth = 0
+        self._layout = 0
+
+        # 量化配置
+        self.quantization = quantization
+        self.rescore = rescore
+        self.codes_file = self.data_dir / "codes.bin"
+        self.quant_file = self.data_dir / "quant.npz"
+
+        self._lock = threading.RLock()
+        self._reset()
+        self._load()
+        self._load_codes()
+
+        if self.index_type == "ivf":
+            self.ann_index = IVFIndex.load(self.index_file)
+            if self.ann_index is not None:
+                if self.ann_index.built_rows > len(self._ids):
+                    self.ann_index = None
+                else:
+                    self.ann_index.nprobe = nprobe
+            with self._lock:
+                self._maybe_rebuild_index()
+
+    def _reset(self):
+        self.dim: Optional[int] = None
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+        self._row_of: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+        self._matrix: Optional[np.memmap] = None
+        self._facets: Dict[str, List[int]] = {}
+        self.quantizer: Optional[Quantizer] = None
+        self._codes: Optional[np.ndarray] = None
+
+    def _index_facets(self, start: int, metadatas: List[Dict]):
+        """把新增行加入元数据倒排表"""
+        for row, metadata in enumerate(metadatas, start):
+            for key in facet_keys(metadata or {}):
+                self._facets.setdefault(key, []).append(row)
+
+    def _filter_mask(self, filters: MetadataFilter) -> np.ndarray:
+        """满足过滤条件的存活行掩码"""
+        mask = self._alive.copy()
+        for clause in filters.clauses():
+            clause_mask = np.zeros(len(self._ids), dtype=bool)
+            for key in clause:
+                rows = self._facets.get(key)
+                if rows:
+                    clause_mask[rows] = True
+            mask &= clause_mask
+        return mask
+
+    def _load(self):
+        """回放操作日志并映射向量文件"""
+        self._recover_compaction()
+        if not self.meta_file.exists():
+            return
+
+        meta = json.loads(self.meta_file.read_text(encoding='utf-8'))
+        self.dim = meta['dim']
+        self.dtype = np.dtype(meta['dtype'])
+
+        deleted = set()
+        if not self.records_file.exists():
+            self.records_file.touch()
+        with open(self.records_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record['op'] == 'add':
+                    row = len(self._ids)
+                    self._ids.append(record['id'])
+                    self._documents.append(record['document'])
+                    self._metadatas.append(record['metadata'])
+                    previous = self._row_of.get(record['id'])
+                    if previous is not None:
+                        deleted.add(previous)
+                    self._row_of[record['id']] = row
+                else:
+                    for doc_id in record['ids']:
+                        row = self._row_of.pop(doc_id, None)
+                        if row is not None:
+                            deleted.add(row)
+
+        rows = len(self._ids)
+        # 向量先于日志写入，异常中断时截掉没有对应记录的向量行
+        expected_size = rows * self.dim * self.dtype.itemsize
+        actual_size = self.vectors_file.stat().st_size if self.vectors_file.exists() else 0
+        if actual_size < expected_size:
+            raise RuntimeError(f"向量文件与操作日志不一致: {self.data_dir}")
+        if actual_size > expected_size:
+            with open(self.vectors_file, 'r+b') as f:
+                f.truncate(expected_size)
+
+        self._alive = np.ones(rows, dtype=bool)
+        if deleted:
+            self._alive[list(deleted)] = False
+        self._index_facets(0, self._metadatas)
+        self._remap()
+        self._sq_norms = self._compute_sq_norms(0, rows)
+
+    def _remap(self):
+        rows = len(self._ids)
+        if rows:
+            self._matrix = np.memmap(self.vectors_file, dtype=self.dtype, mode='r', shape=(rows, self.dim))
+        else:
+            self._matrix = None
+
+    def _load_codes(self):
+        """加载量化编码，量化方式变化或编码与向量行数不一致时重新量化"""
+        if self.quantization == "none" or self.dim is None:
+            return
+
+        quantizer = Quantizer.load(self.quant_file)
+        rows = len(self._ids)
+        if quantizer is None or quantizer.name != self.quantization or quantizer.dim != self.dim:
+            self.requantize()
+            return
+
+        expected_size = rows * quantizer.code_size
+        actual_size = self.codes_file.stat().st_size if self.codes_file.exists() else 0
+        if actual_size < expected_size:
+            self.requantize()
+            return
+        if actual_size > expected_size:
+            with open(self.codes_file, 'r+b') as f:
+                f.truncate(expected_size)
+
+        self.quantizer = quantizer
+        dtype = np.int8 if quantizer.name == "int8" else np.uint8
+        self._codes = np.fromfile(self.codes_file, dtype=dtype).reshape(rows, quantizer.code_size)
+
+    def requantize(self):
+        """按当前数据重新拟合量化参数，并重写全部编码"""
+        with self._lock:
+            if self.quantization == "none":
+                return
+
+            rows = len(self._ids)
+            if not rows:
+                self.quantizer = None
+                self._codes = None
+                for path in (self.codes_file, self.quant_file):
+                    if path.exists():
+                        path.unlink()
+                return
+
+            quantizer = create_quantizer(self.quantization, self.dim)
+            sample_rows = np.flatnonzero(self._alive)
+            if len(sample_rows) > self.QUANT_SAMPLE_ROWS:
+                sample_rows = np.sort(np.random.default_rng(0).choice(sample_rows, self.QUANT_SAMPLE_ROWS, replace=False))
+            quantizer.fit(np.asarray(self._matrix[sample_rows], dtype=np.float32))
+
+            codes = np.concatenate([
+                quantizer.encode(np.asarray(self._matrix[start:start + self.BLOCK_ROWS], dtype=np.float32))
+                for start in range(0, rows, self.BLOCK_ROWS)
+            ])
+            tmp_codes = self.codes_file.with_suffix('.tmp')
+            codes.tofile(tmp_codes)
+            tmp_codes.replace(self.codes_file)
+            quantizer.save(self.quant_file)
+
+            self.quantizer = quantizer
+            self._codes = codes
+
+    def _append_codes(self, vectors: np.ndarray):
+        """编码新增向量；数据量比拟合时翻倍后重新拟合量化参数"""
+        if self.quantization == "none":
+            return
+
+        if self.quantizer is None or len(self._ids) > 2 * self.quantizer.fitted_rows:
+            self.requantize()
+            return
+
+        codes = self.quantizer.encode(vectors)
+        with open(self.codes_file, 'ab') as f:
+            f.write(codes.tobytes())
+        self._codes = np.concatenate([self._codes, codes])
+
+    def _compute_sq_norms(self, start: int, end: int) -> np.ndarray:
+        norms = []
+        for block_start in range(start, end, self.BLOCK_ROWS):
+            block = np.asarray(self._matrix[block_start:min(end, block_start + self.BLOCK_ROWS)], dtype=np.float32)
+            norms.append(np.einsum('ij,ij->i', block, block))
+        return np.concatenate(norms) if norms else np.zeros(0, dtype=np.float32)
+
+    def _append_records(self, records: List[Dict]):
+        with open(self.records_file, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict]):
+        if not ids:
+            return
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self.data_dir.mkdir(parents=True, exist_ok=True)
+                self.meta_file.write_text(
+                    json.dumps({'dim': self.dim, 'dtype': self.dtype.name}),
+                    encoding='utf-8'
+                )
+
+            start = len(self._ids)
+            with open(self.vectors_file, 'ab') as f:
+                f.write(vectors.astype(self.dtype).tobytes())
+            self._append_records([
+                {'op': 'add', 'id': doc_id, 'document': document, 'metadata': metadata}
+                for doc_id, document, metadata in zip(ids, documents, metadatas)
+            ])
+
+            alive = np.ones(len(ids), dtype=bool)
+            for i, doc_id in enumerate(ids):
+                previous = self._row_of.get(doc_id)
+                if previous is not None:
+                    if previous >= start:
+                        alive[previous - start] = False
+                    else:
+                        self._alive[previous] = False
+                self._row_of[doc_id] = start + i
+            self._ids.extend(ids)
+            self._documents.extend(documents)
+            self._metadatas.extend(metadatas)
+            self._index_facets(start, metadatas)
+            self._alive = np.concatenate([self._alive, alive])
+            self._remap()
+            self._sq_norms = np.concatenate([self._sq_norms, self._compute_sq_norms(start, len(self._ids))])
+            self._append_codes(vectors)
+
+            self._maybe_compact()
+            self._maybe_rebuild_index()
+
+    def _view(self, filters: Optional[MetadataFilter] = None) -> "_SearchView":
+        """取当前数据的只读视图（调用方持有锁）
+
+        向量映射、范数和量化编码只追加或整体替换，列表只追加或整体替换，
+        视图持有引用和当时的行数即可；存活掩码会被原地修改，需要复制。
+        """
+        return _SearchView(
+            rows=len(self._ids),
+            mask=self._filter_mask(filters) if filters else self._alive.copy(),
+            ids=self._ids,
+            documents=self._documents,
+            metadatas=self._metadatas,
+            matrix=self._matrix,
+            sq_norms=self._sq_norms,
+            quantizer=self.quantizer,
+            codes=self._codes,
+            ann_index=self.ann_index
+        )
+
+    def _scores(self, view: "_SearchView", queries: np.ndarray, quantized: bool = False) -> np.ndarray:
+        """计算 2·q·x - |x|²（按行分块），值越大平方L2距离越小，掩码外的行为 -inf
+
+        quantized 为 True 时用量化编码计算近似得分
+        """
+        rows = view.rows
+        block_rows = self.QUANT_BLOCK_ROWS if quantized else self.BLOCK_ROWS
+        scores = np.empty((len(queries), rows), dtype=np.float32)
+        for start in range(0, rows, block_rows):
+            end = min(rows, start + block_rows)
+            if quantized:
+                scores[:, start:end] = view.quantizer.scores(queries, view.codes[start:end], view.sq_norms[start:end])
+            else:
+                block = np.asarray(view.matrix[start:end], dtype=np.float32)
+                scores[:, start:end] = 2 * (queries @ block.T) - view.sq_norms[start:end]
+        scores[:, ~view.mask] = -np.inf
+        return scores
+
+    @staticmethod
+    def _candidate_scores(view: "_SearchView", query: np.ndarray, rows: np.ndarray,
+                          quantized: bool = False) -> np.ndarray:
+        """只对候选行计算 2·q·x - |x|²"""
+        if quantized:
+            return view.quantizer.scores(query[None, :], view.codes[rows], view.sq_norms[rows])[0]
+        block = np.asarray(view.matrix[rows], dtype=np.float32)
+        return 2 * (block @ query) - view.sq_norms[rows]
+
+    def _rescore(self, view: "_SearchView", query: np.ndarray, rows: np.ndarray, approx_scores: np.ndarray,
+                 shortlist: int):
+        """取近似得分最高的 shortlist 行，用全精度向量重新打分"""
+        if shortlist < len(rows):
+            top = np.argpartition(-approx_scores, shortlist - 1)[:shortlist]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.isfinite(approx_scores[top])]
+        # 按行号顺序读取内存映射文件，减少随机读
+        rows = np.sort(rows[top])
+        return rows, self._candidate_scores(view, query, rows)
+
+    def query(self, query_embeddings: List[List[float]], top_k: int,
+              search_params: Optional[Dict] = None,
+              filters: Optional[MetadataFilter] = None) -> List[List[Dict]]:
+        """
+        检索
+
+        只在取数据视图时持有锁，打分在锁外执行，并发查询互不阻塞。
+
+        search_params:
+            exact: 为 True 时忽略ANN索引和量化编码做精确检索
+            nprobe: IVF索引探测的簇数，覆盖集合默认值
+            rescore: 量化检索的重打分倍数，覆盖集合默认值
+        filters:
+            元数据过滤条件。过滤后的行较少时只对这些行计算距离，否则在全量打分时屏蔽其余行
+        """
+        search_params = search_params or {}
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        with self._lock:
+            view = self._view(filters)
+
+        mask = view.mask
+        match_count = int(mask.sum())
+        if not match_count or not len(queries):
+            return [[] for _ in range(len(queries))]
+
+        k = min(top_k, match_count)
+        query_sq_norms = np.einsum('ij,ij->i', queries, queries)
+        use_index = view.ann_index is not None and not search_params.get('exact')
+        quantized = view.quantizer is not None and not search_params.get('exact')
+        shortlist = k * (search_params.get('rescore') or self.rescore)
+        # 过滤条件的选择性较高时，直接对匹配行精确检索比扫描ANN候选更快
+        selective = filters is not None and match_count * 2 < view.rows
+        if selective:
+            use_index = use_index and match_count > self.ANN_MIN_ROWS
+        matched_rows = np.flatnonzero(mask) if selective and not use_index else None
+        scores = None if use_index or selective else self._scores(view, queries, quantized)
+
+        batch_results = []
+        for q in range(len(queries)):
+            if use_index:
+                # 探测到的簇 + 建索引后新增的行
+                rows = np.concatenate([
+                    view.ann_index.candidates(queries[q], search_params.get('nprobe')),
+                    np.arange(view.ann_index.built_rows, view.rows)
+                ])
+                rows = rows[mask[rows]]
+                if len(rows) < k:
+                    rows = np.flatnonzero(mask)
+                row_scores = self._candidate_scores(view, queries[q], rows, quantized)
+            elif matched_rows is not None:
+                rows = matched_rows
+                row_scores = self._candidate_scores(view, queries[q], rows, quantized)
+            else:
+                rows = np.arange(view.rows)
+                row_scores = scores[q]
+
+            if quantized:
+                rows, row_scores = self._rescore(view, queries[q], rows, row_scores, shortlist)
+
+            if k < len(row_scores):
+                top = np.argpartition(-row_scores, k - 1)[:k]
+            else:
+                top = np.arange(len(row_scores))
+            top = top[np.argsort(-row_scores[top])]
+
+            batch_results.append([
+                {
+                    'id': view.ids[rows[i]],
+                    'content': view.documents[rows[i]],
+                    'metadata': view.metadatas[rows[i]],
+                    'distance': float(max(query_sq_norms[q] - row_scores[i], 0.0))
+                }
+                for i in top
+            ])
+        return batch_results
+
+    def build_index(self):
+        """
+        按当前数据重建ANN索引并保存
+
+        只在取当前行数和向量映射时持有锁，k-means 在锁外执行；
+        期间发生压缩或清空（行号变化）时丢弃本次结果。
+        """
+        if self.index_type != "ivf":
+            return
+
+        with self._build_lock:
+            with self._lock:
+                if len(self._ids) < self.ANN_MIN_ROWS:
+                    # 数据量太小时精确检索更快
+                    self.ann_index = None
+                    if self.index_file.exists():
+                        self.index_file.unlink()
+                    return
+                # 向量文件只追加，压缩和清空时替换或删除文件，已有的只读映射不受影响
+                matrix = self._matrix
+                layout = self._layout
+
+            ann_index = IVFIndex.build(matrix, nlist=self.nlist, nprobe=self.nprobe)
+
+            with self._lock:
+                if layout != self._layout:
+                    return
+                self.ann_index = ann_index
+                ann_index.save(self.index_file)
+
+    def _index_stale(self) -> bool:
+        """未索引的新增行是否超过 rebuild_ratio（调用方持有锁）"""
+        rows = len(self._ids)
+        built_rows = self.ann_index.built_rows if self.ann_index is not None else 0
+        return rows >= self.ANN_MIN_ROWS and rows - built_rows > self.rebuild_ratio * max(built_rows, 1)
+
+    def _maybe_rebuild_index(self):
+        """索引过旧时在后台线程重建（调用方持有锁），bulk_load 期间推迟"""
+        if self.index_type != "ivf" or self._bulk_depth or self._index_building or not self._index_stale():
+            return
+        self._index_building = True
+        threading.Thread(target=self._rebuild_index_background, name="ivf-build", daemon=True).start()
+
+    def _rebuild_index_background(self):
+        try:
+            self.build_index()
+        finally:
+            with self._lock:
+                self._index_building = False
+                # 重建期间写入较多或结果作废时再重建一次
+                self._maybe_rebuild_index()
+
+    @contextmanager
+    def bulk_load(self):
+        """批量写入期间不重建IVF索引，结束时在锁外重建一次"""
+        with self._lock:
+            self._bulk_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._bulk_depth -= 1
+                rebuild = self.index_type == "ivf" and not self._bulk_depth and self._index_stale()
+            if rebuild:
+                self.build_index()
+
+    def index_stats(self) -> Dict:
+        """获取ANN索引和量化信息"""
+        stats = {"type": "flat"} if self.ann_index is None else self.ann_index.stats()
+        if self.quantizer is not None:
+            stats["quantization"] = {
+                "type": self.quantizer.name,
+                "compression_ratio": self.quantizer.compression_ratio,
+                "rescore": self.rescore,
+                "code_bytes": int(self._codes.nbytes),
+                "vector_bytes": int(len(self._ids) * self.dim * self.dtype.itemsize)
+            }
+        return stats
+
+    def get(self, ids: List[str], include_embeddings: bool = False) -> List[Dict]:
+        if not ids:
+            return []
+        with self._lock:
+            items = []
+            for doc_id in ids:
+                row = self._row_of.get(doc_id)
+                if row is not None:
+                    item = {
+                        'id': doc_id,
+                        'content': self._documents[row],
+                        'metadata': self._metadatas[row]
+                    }
+                    if include_embeddings:
+                        item['embedding'] = np.asarray(self._matrix[row], dtype=np.float32).tolist()
+                    items.append(item)
+            return items
+
+    def filter_ids(self, filters: MetadataFilter) -> Set[str]:
+        with self._lock:
+            return {self._ids[row] for row in np.flatnonzero(self._filter_mask(filters))}
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            deleted = []
+            for doc_id in ids:
+                row = self._row_of.pop(doc_id, None)
+                if row is not None:
+                    self._alive[row] = False
+                    deleted.append(doc_id)
+            if deleted:
+                self._append_records([{'op': 'delete', 'ids': deleted}])
+                self._maybe_compact()
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def iterate(self, batch_size: int = 1000, include_embeddings: bool = False) -> Iterator[Dict]:
+        """
+        逐批遍历：开始时只记下存活文档块的ID，每批在锁内按ID取出 batch_size 个文档块，
+        内存占用与集合大小无关；遍历期间删除的文档块被跳过，压缩改变行号不影响结果
+        """
+        with self._lock:
+            ids = [self._ids[row] for row in np.flatnonzero(self._alive)]
+
+        for start in range(0, len(ids), batch_size):
+            with self._lock:
+                items = []
+                for doc_id in ids[start:start + batch_size]:
+                    row = self._row_of.get(doc_id)
+                    if row is None:
+                        continue
+                    item = {
+                        'id': doc_id,
+                        'content': self._documents[row],
+                        'metadata': self._metadatas[row]
+                    }
+                    if include_embeddings:
+                        item['embedding'] = np.asarray(self._matrix[row], dtype=np.float32).tolist()
+                    items.append(item)
+            yield from items
+
+    def _maybe_compact(self):
+        rows = len(self._ids)
+        if rows and (rows - len(self._row_of)) / rows > self.compact_threshold:
+            self.compact()
+
+    def _compaction_files(self):
+        """压缩时的 (临时文件, 正式文件) 对"""
+        return [(path.with_suffix('.tmp'), path) for path in (self.vectors_file, self.records_file)]
+
+    def _recover_compaction(self):
+        """处理中断的压缩：临时文件已全部写完（有标记）时完成替换，否则丢弃"""
+        if self.compact_marker.exists():
+            self._finish_compaction()
+            return
+        for tmp, _ in self._compaction_files():
+            if tmp.exists():
+                tmp.unlink()
+
+    def _finish_compaction(self):
+        """用压缩后的临时文件替换正式文件，删除行号已失效的索引和量化编码，最后删除标记"""
+        for path in (self.index_file, self.codes_file, self.quant_file):
+            if path.exists():
+                path.unlink()
+        for tmp, path in self._compaction_files():
+            if tmp.exists():
+                tmp.replace(path)
+        self.compact_marker.unlink()
+
+    def compact(self):
+        """重写存储文件，去掉已删除的行"""
+        with self._lock:
+            rows = np.flatnonzero(self._alive)
+            ids = [self._ids[row] for row in rows]
+            documents = [self._documents[row] for row in rows]
+            metadatas = [self._metadatas[row] for row in rows]
+
+            (tmp_vectors, _), (tmp_records, _) = self._compaction_files()
+            with open(tmp_vectors, 'wb') as f:
+                for start in range(0, len(rows), self.BLOCK_ROWS):
+                    f.write(np.asarray(self._matrix[rows[start:start + self.BLOCK_ROWS]], dtype=self.dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(tmp_records, 'w', encoding='utf-8') as f:
+                for doc_id, document, metadata in zip(ids, documents, metadatas):
+                    f.write(json.dumps({'op': 'add', 'id': doc_id, 'document': document, 'metadata': metadata}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            # 临时文件全部落盘后才创建标记，此后中断会在加载时继续完成替换
+            self.compact_marker.touch()
+
+            sq_norms = self._sq_norms[rows]
+            # 进行中的查询持有旧映射，替换文件不影响它们
+            self._matrix = None
+            self._finish_compaction()
+
+            self._ids = ids
+            self._documents = documents
+            self._metadatas = metadatas
+            self._row_of = {doc_id: i for i, doc_id in enumerate(ids)}
+            self._alive = np.ones(len(ids), dtype=bool)
+            self._sq_norms = sq_norms
+            self._facets = {}
+            self._index_facets(0, metadatas)
+            self._remap()
+
+            # 行号已变化，旧索引和量化编码失效；索引在后台重建，期间精确检索
+            self._layout += 1
+            self.ann_index = None
+            self.requantize()
+            self._maybe_rebuild_index()
+
+    def clear(self):
+        with self._lock:
+            self._matrix = None
+            self._layout += 1
+            self.ann_index = None
+            for path in (self.vectors_file, self.records_file, self.meta_file, self.index_file,
+                         self.codes_file, self.quant_file):
+                if path.exists():
+                    path.unlink()
+            dtype = self.dtype
+            self._reset()
+            self.dtype = dtype
+
+    def drop(self):
+        with self._lock:
+            self.clear()
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def get_name(self) -> str:
+        name = f"numpy/{self.dtype.name}/{self.index_type}"
+        if self.quantization != "none":
+            name += f"/{self.quantization}"
+        return name
+
+
+class VectorBackendFactory:
+    """向量存储后端工厂类"""
+
+    @staticmethod
+    def create_backend(backend: str, db_path: str, collection_name: str, **kwargs) -> VectorBackend:
+        """
+        创建向量存储后端
+
+        Args:
+            backend: 后端名称 ('chroma', 'numpy')
+            db_path: 数据目录
+            collection_name: 集合名称
+            **kwargs: 后端参数
+
+        Returns:
+            向量存储后端实例
+        """
+        backend = backend.lower()
+
+        if backend == "chroma":
+            return ChromaBackend(
+                db_path,
+                collection_name,
+                hnsw_params=kwargs.get('hnsw_params')
+            )
+
+        elif backend == "numpy":
+            return NumpyBackend(
+                db_path,
+                collection_name,
+                dtype=kwargs.get('numpy_dtype', 'float32'),
+                index=kwargs.get('ann_index', 'flat'),
+                nlist=kwargs.get('ann_nlist') or None,
+                nprobe=kwargs.get('ann_nprobe', 8),
+                quantization=kwargs.get('quantization', 'none'),
+                rescore=kwargs.get('quantization_rescore', 4)
+            )
+
+        else:
+            raise ValueError(f"不支持的向量存储后端: {backend}。支持的后端: chroma, numpy")
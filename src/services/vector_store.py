@@ -1,95 +1,660 @@
-"""向量存储模块"""
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from typing import List, Dict
-from sentence_transformers import SentenceTransformer
+"""向量存储模块
+
+嵌入模型、存储后端、BM25索引和嵌入缓存都在第一次使用时才初始化，
+只查看状态（如 count）时不会加载嵌入模型。
+
+集合名是别名，指向一代物理索引（存储后端集合 + BM25索引）。全量重建写入下一代物理索引，
+完成后原子替换别名文件 {集合名}.alias；查询固定读取开始时的那一代，
+被替换的旧一代在最后一个查询结束后删除。
+"""
+import copy
+import itertools
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+
+from typing import Iterable, Iterator, List, Dict, Optional, Set
+
+from ..core.config import settings
+from .batching import MicroBatcher
+from .cache import LRUCache
+from .document_loader import make_chunk_id
+from .embedders import Embedder
+from .embedding_cache import EmbeddingCache
+from .encoder import TextEncoder
+from .filters import MetadataFilter
+from .lexical_index import BM25Index, delta_path, reciprocal_rank_fusion
+from .locks import ReadWriteLock
+from .parallel_embedding import ParallelEncoder, resolve_workers
+from .vector_backends import VectorBackend, VectorBackendFactory
+
+# 物理索引名为 {集合名}.g{代号}，第 0 代沿用集合名（兼容别名出现之前创建的集合）
+GENERATION_SEPARATOR = ".g"
+
+
+def generation_name(collection_name: str, number: int) -> str:
+    """第 number 代物理索引的名称"""
+    return collection_name if number == 0 else f"{collection_name}{GENERATION_SEPARATOR}{number}"
+
+
+def generation_number(collection_name: str, name: str) -> int:
+    """从物理索引名称解析代号"""
+    if name == collection_name:
+        return 0
+    return int(name[len(collection_name) + len(GENERATION_SEPARATOR):])
+
+
+class IndexGeneration:
+    """
+    集合的一代物理索引：存储后端和BM25索引（都在第一次使用时打开）
+
+    查询期间持有读锁，写入一批文档块时持有写锁，同一次检索看到的稠密索引和BM25索引一致。
+
+    Args:
+        db_path: 向量数据库路径
+        name: 物理索引名称
+        number: 代号
+        backend_name: 存储后端名称
+        backend_params: 存储后端参数
+    """
+    
+    def __init__(self, db_path: str, name: str, number: int, backend_name: str, backend_params: Dict):
+        self.db_path = db_path
+        self.name = name
+        self.number = number
+        self.backend_name = backend_name
+        self._backend_params = backend_params
+        self.lock = ReadWriteLock()
+        # 正在读取这一代的查询数；被替换后 retired 为 True，读者归零时删除
+        self.readers = 0
+        self.retired = False
+        self._init_lock = threading.RLock()
+        self._backend = None
+        self._lexical_index = None
+    
+    @property
+    def backend(self) -> VectorBackend:
+        """向量存储后端，第一次访问时创建"""
+        if self._backend is None:
+            with self._init_lock:
+                if self._backend is None:
+                    self._backend = VectorBackendFactory.create_backend(
+                        self.backend_name,
+                        self.db_path,
+                        self.name,
+                        **self._backend_params
+                    )
+        return self._backend
+    
+    @property
+    def lexical_index(self) -> Optional[BM25Index]:
+        """BM25索引，未启用混合检索时为 None；索引文件不存在时从后端重建"""
+        if self._lexical_index is None and settings.hybrid_search_enabled:
+            with self._init_lock:
+                if self._lexical_index is None:
+                    lexical_index = BM25Index(str(self.lexical_index_path))
+                    if not len(lexical_index) and self.backend.count():
+                        lexical_index = self._build_lexical_index()
+                    # 构建完成后才赋值，并发的检索不会看到构建到一半的索引
+                    self._lexical_index = lexical_index
+        return self._lexical_index
+    
+    @property
+    def lexical_index_path(self) -> Path:
+        """BM25索引文件路径"""
+        return Path(self.db_path) / f"{self.name}.bm25.npz"
+    
+    def _build_lexical_index(self, batch_size: int = 1000) -> BM25Index:
+        """根据存储后端中的文档块构建新的BM25索引并保存（覆盖索引文件）"""
+        print("正在构建BM25索引...")
+        lexical_index = BM25Index(str(self.lexical_index_path))
+        lexical_index.clear()
+        items = iter(self.backend.iterate())
+        for batch in iter(lambda: list(itertools.islice(items, batch_size)), []):
+            lexical_index.add([item['id'] for item in batch], [item['content'] for item in batch])
+        lexical_index.save(merge=True)
+        return lexical_index
+    
+    def rebuild_lexical_index(self):
+        """根据向量存储中的文档块重建BM25索引，完成后替换当前索引"""
+        if settings.hybrid_search_enabled:
+            lexical_index = self._build_lexical_index()
+            with self._init_lock:
+                self._lexical_index = lexical_index
+    
+    def close(self):
+        """释放存储后端和BM25索引（再次使用时重新打开）"""
+        with self._init_lock:
+            self._backend = None
+            self._lexical_index = None
+    
+    def drop(self):
+        """删除这一代索引的全部数据"""
+        with self._init_lock:
+            self.backend.drop()
+            self.lexical_index_path.unlink(missing_ok=True)
+            delta_path(self.lexical_index_path).unlink(missing_ok=True)
+            self._backend = None
+            self._lexical_index = None
 
 
 class VectorStore:
-    """向量存储，使用ChromaDB"""
+    """向量存储，后端可选 ChromaDB 或进程内 NumPy 引擎
+    
+    encoder 为 None 时创建独立的 TextEncoder；多个集合传入同一个 TextEncoder 即可共享嵌入模型和缓存。
+    """
     
-    def __init__(self, db_path: str, collection_name: str = "documents"):
+    def __init__(self, db_path: str, collection_name: str = "documents",
+                 query_cache_size: Optional[int] = None, query_cache_ttl: Optional[float] = None,
+                 backend: Optional[str] = None, index_params: Optional[Dict] = None,
+                 encoder: Optional[TextEncoder] = None):
         self.db_path = db_path
         self.collection_name = collection_name
+        self._init_lock = threading.RLock()
+        
+        # 嵌入器、查询向量缓存和文档块嵌入缓存
+        self.encoder = encoder or TextEncoder(query_cache_size, query_cache_ttl)
+        
+        # 初始化向量存储后端（index_params 可按集合覆盖全局索引配置）
+        backend_params = {
+            'numpy_dtype': settings.numpy_backend_dtype,
+            'ann_index': settings.ann_index,
+            'ann_nlist': settings.ann_nlist,
+            'ann_nprobe': settings.ann_nprobe,
+            'quantization': settings.numpy_quantization,
+            'quantization_rescore': settings.quantization_rescore,
+            'hnsw_params': {
+                'construction_ef': settings.hnsw_construction_ef,
+                'M': settings.hnsw_m,
+                'search_ef': settings.hnsw_search_ef
+            }
+        }
+        backend_params.update(index_params or {})
+        self.backend_name = backend or settings.vector_backend
+        self._backend_params = backend_params
+        
+        # 写入（同步、添加、删除、清空、重建）依次执行，查询不受影响
+        self.write_lock = threading.RLock()
+        # 影子索引只在重建期间写入，不更新集合版本
+        self._shadow = False
         
-        # 初始化ChromaDB
-        self.client = chromadb.PersistentClient(
-            path=db_path,
-            settings=ChromaSettings(anonymized_telemetry=False)
-        )
-        
-        # 初始化嵌入模型
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        
-        # 获取或创建集合
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"description": "文档知识库"}
-        )
-    
-    def add_documents(self, chunks: List[Dict[str, str]]):
-        """添加文档到向量数据库"""
-        if not chunks:
-            print("没有文档需要添加")
+        # 集合别名指向当前一代物理索引，不存在别名文件时为第 0 代
+        self._alias_file = Path(db_path) / f"{collection_name}.alias"
+        self._alias_mtime = None
+        self._generation = self._open_generation(self._read_alias())
+        
+        # 索引版本，每次写入、清空或切换索引都会更新，用于使下游缓存失效；
+        # 版本文件在第一次写入时创建，只读使用（如查看状态）不写文件
+        self._version_file = Path(db_path) / f"{collection_name}.version"
+        self._version = ""
+        self._version_mtime = None
+    
+    def _open_generation(self, name: str) -> IndexGeneration:
+        return IndexGeneration(self.db_path, name, generation_number(self.collection_name, name),
+                               self.backend_name, self._backend_params)
+    
+    def _read_alias(self) -> str:
+        """读取别名指向的物理索引名称"""
+        try:
+            self._alias_mtime = self._alias_file.stat().st_mtime_ns
+            return self._alias_file.read_text(encoding='utf-8').strip()
+        except FileNotFoundError:
+            self._alias_mtime = None
+            return self.collection_name
+    
+    def _refresh_alias(self):
+        """其他进程（如另一个 uvicorn 工作进程）切换了别名时改用新一代索引"""
+        try:
+            mtime = self._alias_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._alias_mtime:
             return
         
-        print(f"正在添加 {len(chunks)} 个文档块到向量数据库...")
+        with self._init_lock:
+            name = self._read_alias()
+            if name != self._generation.name:
+                self._generation = self._open_generation(name)
+    
+    @property
+    def generation(self) -> IndexGeneration:
+        """当前一代物理索引"""
+        return self._generation
+    
+    @property
+    def backend(self) -> VectorBackend:
+        """当前一代索引的存储后端，第一次访问时创建"""
+        return self._generation.backend
+    
+    @property
+    def lexical_index(self) -> Optional[BM25Index]:
+        """当前一代索引的BM25索引，未启用混合检索时为 None"""
+        return self._generation.lexical_index
+    
+    def close(self):
+        """释放存储后端和BM25索引（再次使用时重新打开），嵌入模型由 encoder 持有不受影响"""
+        self._generation.close()
+    
+    @contextmanager
+    def snapshot(self) -> Iterator[IndexGeneration]:
+        """
+        固定当前一代索引供一次检索使用
+        
+        检索期间切换索引不影响本次检索；被替换的旧一代在最后一个检索结束后删除。
+        """
+        self._refresh_alias()
+        with self._init_lock:
+            generation = self._generation
+            generation.readers += 1
+        try:
+            with generation.lock.read():
+                yield generation
+        finally:
+            with self._init_lock:
+                generation.readers -= 1
+                drop = generation.retired and not generation.readers
+            if drop:
+                generation.drop()
+    
+    @contextmanager
+    def reindex(self) -> Iterator["VectorStore"]:
+        """
+        全量重建：返回写入下一代物理索引的影子存储，with 块正常结束时原子切换别名
+        
+        重建期间查询继续读取当前索引；with 块抛出异常时删除影子索引，当前索引保持不变。
+        """
+        with self.write_lock:
+            self._refresh_alias()
+            shadow = copy.copy(self)
+            shadow._shadow = True
+            shadow._generation = self._open_generation(
+                generation_name(self.collection_name, self._generation.number + 1)
+            )
+            # 上次重建中断时可能残留同名的影子索引
+            shadow._generation.drop()
+            try:
+                yield shadow
+            except BaseException:
+                shadow._generation.drop()
+                raise
+            self._swap(shadow._generation)
+    
+    def _swap(self, generation: IndexGeneration):
+        """原子替换别名文件并切换到新一代索引，没有读者的旧一代立即删除"""
+        tmp_file = self._alias_file.with_name(self._alias_file.name + '.tmp')
+        tmp_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file.write_text(generation.name, encoding='utf-8')
+        tmp_file.replace(self._alias_file)
         
-        # 准备数据
+        with self._init_lock:
+            old = self._generation
+            self._generation = generation
+            self._alias_mtime = self._alias_file.stat().st_mtime_ns
+            old.retired = True
+            drop = not old.readers
+        # 先切换再更新版本，避免旧索引的检索结果以新版本写入答案缓存
+        self._bump_version()
+        if drop:
+            old.drop()
+        print(f"索引已切换到 {generation.name}")
+    
+    @property
+    def embedding_model_name(self) -> str:
+        return self.encoder.embedding_model_name
+    
+    @property
+    def embedder(self) -> Embedder:
+        """嵌入器，模型在第一次编码时加载"""
+        return self.encoder.embedder
+    
+    @property
+    def query_cache(self) -> LRUCache:
+        """查询向量缓存"""
+        return self.encoder.query_cache
+    
+    @property
+    def query_batcher(self) -> Optional[MicroBatcher]:
+        """并发查询编码的微批调度器，未启用时为 None"""
+        return self.encoder.query_batcher
+    
+    @property
+    def model_loaded(self) -> bool:
+        """嵌入模型是否已加载"""
+        return self.encoder.model_loaded
+    
+    def warmup(self):
+        """预先加载嵌入模型"""
+        self.encoder.warmup()
+    
+    @property
+    def embedding_cache(self) -> Optional[EmbeddingCache]:
+        """文档块嵌入缓存，未启用时为 None"""
+        return self.encoder.embedding_cache
+    
+    def create(self):
+        """标记集合已创建（写入版本文件），集合管理器据此列出集合"""
+        if not self._version_file.exists():
+            self._bump_version()
+    
+    @property
+    def version(self) -> str:
+        """
+        索引版本，未写入过的集合为空字符串
+        
+        每次读取时检查版本文件的修改时间，其他进程（如另一个 uvicorn 工作进程处理上传）
+        更新版本后本进程的答案缓存随之失效。
+        """
+        try:
+            mtime = self._version_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return self._version
+        if mtime != self._version_mtime:
+            with self._init_lock:
+                self._version = self._version_file.read_text(encoding='utf-8').strip()
+                self._version_mtime = mtime
+        return self._version
+    
+    def _bump_version(self):
+        """生成新的索引版本（先写临时文件再替换，其他进程不会读到写了一半的版本）"""
+        if self._shadow:
+            return
+        version = uuid.uuid4().hex
+        tmp_file = self._version_file.with_name(self._version_file.name + '.tmp')
+        tmp_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file.write_text(version, encoding='utf-8')
+        tmp_file.replace(self._version_file)
+        with self._init_lock:
+            self._version = version
+            self._version_mtime = self._version_file.stat().st_mtime_ns
+    
+    def add_documents(self, chunks: Iterable[Dict[str, str]], workers: Optional[int] = None,
+                      batch_size: Optional[int] = None) -> int:
+        """
+        添加文档到向量数据库
+        
+        文档块按 batch_size 分批编码并写入，workers > 1 时由编码进程池并行编码，
+        提交的批次数有上限，已编码的批次按顺序写入存储。chunks 可以是生成器：
+        在途批次达到上限时不再从生成器取文档块，上游的解析和分割随之暂停，内存占用与文档总量无关。
+        
+        Args:
+            chunks: 文档块列表或生成器
+            workers: 编码进程数，默认读取配置（1 为进程内编码，0 为全部CPU核）
+            batch_size: 每批文档块数，默认读取配置
+        
+        Returns:
+            添加的文档块数
+        """
+        with self.write_lock:
+            workers = resolve_workers(settings.ingest_workers if workers is None else workers)
+            batch_size = batch_size or settings.ingest_batch_size
+            chunks = iter(chunks)
+            batches = iter(lambda: list(itertools.islice(chunks, batch_size)), [])
+            
+            # 预读两批：没有文档块时直接返回，只有一批时不启动编码进程池
+            head = list(itertools.islice(batches, 2))
+            if not head:
+                print("没有文档需要添加")
+                return 0
+            batches = itertools.chain(head, batches)
+            
+            print("正在添加文档块到向量数据库...")
+            # 各批写入期间不重建ANN索引，全部写入后在写锁之外重建一次
+            with self._generation.backend.bulk_load():
+                if workers > 1 and len(head) > 1:
+                    print(f"使用 {workers} 个编码进程，每批 {batch_size} 个文档块")
+                    with ParallelEncoder(workers, model_name=self.embedding_model_name) as encoder:
+                        added, encoded = self._add_batches(batches, encoder)
+                else:
+                    added, encoded = self._add_batches(batches)
+            
+            if self.lexical_index is not None:
+                self.lexical_index.save()
+            self._bump_version()
+            
+            if self.embedding_cache is not None:
+                print(f"编码 {encoded} 个文档块，{added - encoded} 个命中嵌入缓存")
+            print(f"成功添加 {added} 个文档块")
+            return added
+    
+    def _add_batches(self, batches: Iterable[List[Dict]], encoder: Optional[ParallelEncoder] = None):
+        """编码并写入各批文档块，返回 (添加的文档块数, 实际编码的文档块数)"""
+        pending = deque()
+        max_pending = encoder.max_pending if encoder else 1
+        added = 0
+        encoded = 0
+        
+        for batch in batches:
+            ids, documents, metadatas = self._prepare_chunks(batch)
+            embeddings, hashes, missing = self.encoder.cached_embeddings(documents)
+            texts = [documents[i] for i in missing]
+            if not texts:
+                result = None
+            elif encoder is not None:
+                result = encoder.submit(texts)
+            else:
+                result = self.embedder.encode(texts)
+            added += len(batch)
+            encoded += len(texts)
+            
+            pending.append((ids, documents, metadatas, embeddings, hashes, missing, result))
+            # 在途批次达到上限时等待最早的批次完成，限制内存占用
+            if len(pending) >= max_pending:
+                self._write_batch(*pending.popleft())
+        
+        while pending:
+            self._write_batch(*pending.popleft())
+        return added, encoded
+    
+    @staticmethod
+    def _prepare_chunks(chunks: List[Dict]):
+        """拆分为 ids, documents, metadatas"""
         documents = []
         metadatas = []
         ids = []
         
-        for i, chunk in enumerate(chunks):
+        for chunk in chunks:
             documents.append(chunk['content'])
             metadatas.append(chunk['metadata'])
-            ids.append(f"doc_{i}")
+            ids.append(chunk.get('id') or make_chunk_id(
+                chunk['metadata'].get('path', ''),
+                chunk['metadata'].get('chunk_id', 0),
+                chunk['content']
+            ))
+        return ids, documents, metadatas
+    
+    def _write_batch(self, ids, documents, metadatas, embeddings, hashes, missing, result):
+        """取回编码结果，写入嵌入缓存、向量存储和BM25索引（ID稳定，重复添加同一文档块时覆盖）"""
+        if isinstance(result, Future):
+            result = result.result()
+        if missing:
+            if hashes is not None:
+                self.embedding_cache.put_many([hashes[i] for i in missing], result)
+            for i, embedding in zip(missing, result):
+                embeddings[i] = embedding
+        
+        # 向量和BM25索引在同一个写锁内更新，检索不会只看到其中一个
+        generation = self._generation
+        with generation.lock.write():
+            generation.backend.add(ids, [embedding.tolist() for embedding in embeddings], documents, metadatas)
+            if generation.lexical_index is not None:
+                generation.lexical_index.add(ids, documents)
+    
+    def delete_ids(self, ids: List[str]):
+        """按ID删除文档块"""
+        if not ids:
+            return
+        
+        with self.write_lock:
+            generation = self._generation
+            with generation.lock.write():
+                generation.backend.delete(list(ids))
+                if generation.lexical_index is not None:
+                    generation.lexical_index.remove(list(ids))
+            if generation.lexical_index is not None:
+                generation.lexical_index.save()
+            self._bump_version()
+    
+    def update_metadata(self, ids: List[str], updates: Dict, batch_size: Optional[int] = None):
+        """按ID合并更新文档块元数据，沿用已存储的向量（不重新编码），内容不变因此BM25索引无需更新"""
+        if not ids:
+            return
+        
+        batch_size = batch_size or settings.ingest_batch_size
+        with self.write_lock:
+            generation = self._generation
+            for start in range(0, len(ids), batch_size):
+                with generation.lock.write():
+                    items = generation.backend.get(ids[start:start + batch_size], include_embeddings=True)
+                    generation.backend.add(
+                        [item['id'] for item in items],
+                        [item['embedding'] for item in items],
+                        [item['content'] for item in items],
+                        [dict(item['metadata'], **updates) for item in items]
+                    )
+            self._bump_version()
+    
+    def rebuild_lexical_index(self):
+        """根据向量存储中的文档块重建BM25索引"""
+        with self.write_lock:
+            self._generation.rebuild_lexical_index()
+    
+    def get_index_manifest(self) -> Dict[str, Dict]:
+        """
+        获取已索引文件的清单: {path: {'file_hash': ..., 'tags': ..., 'ids': set(...)}}
+        
+        同一文件的文档块哈希或标签不一致（如同步中断）时对应字段为 None，下次同步会重新处理该文件。
+        """
+        manifest = {}
+        for item in self.backend.iterate():
+            metadata = item['metadata'] or {}
+            entry = manifest.setdefault(metadata.get('path', ''), {
+                'file_hash': metadata.get('file_hash'),
+                'tags': metadata.get('tags'),
+                'ids': set()
+            })
+            if entry['file_hash'] != metadata.get('file_hash'):
+                entry['file_hash'] = None
+            if entry['tags'] != metadata.get('tags'):
+                entry['tags'] = None
+            entry['ids'].add(item['id'])
+        
+        return manifest
+    
+    def embed_query(self, query_text: str) -> List[float]:
+        """生成查询向量，相同（规范化后）的问题直接命中缓存"""
+        return self.embed_queries([query_text])[0]
+    
+    def embed_queries(self, query_texts: List[str]) -> List[List[float]]:
+        """批量生成查询向量，未命中缓存的问题合并为一次 encode 调用"""
+        return self.encoder.embed_queries(query_texts)
+    
+    def search(self, query_embedding: List[float], top_k: int = 3,
+               search_params: Optional[Dict] = None, query_text: Optional[str] = None,
+               filters: Optional[Dict] = None, include_embeddings: bool = False) -> List[Dict]:
+        """根据查询向量检索相关文档，提供 query_text 时启用混合检索"""
+        query_texts = [query_text] if query_text is not None else None
+        return self.search_batch([query_embedding], top_k=top_k, search_params=search_params,
+                                 query_texts=query_texts, filters=filters,
+                                 include_embeddings=include_embeddings)[0]
+    
+    def search_batch(self, query_embeddings: List[List[float]], top_k: int = 3,
+                     search_params: Optional[Dict] = None,
+                     query_texts: Optional[List[str]] = None,
+                     filters: Optional[Dict] = None,
+                     include_embeddings: bool = False) -> List[List[Dict]]:
+        """根据多个查询向量检索相关文档，只执行一次后端查询
+        
+        search_params 为单次请求的检索参数，如 {'nprobe': 16} 或 {'exact': True}
+        提供 query_texts 且启用了混合检索时，稠密结果与BM25结果按倒数排名融合
+        filters 为元数据过滤条件，如 {'type': '.pdf', 'path_prefix': 'knowledge_base/manuals'}，
+        稠密检索和BM25检索都只在满足条件的文档块中进行
+        include_embeddings 为 True 时每个结果附带存储的向量 'embedding'（用于 MMR 等多样性选择）
+        """
+        if not query_embeddings:
+            return []
         
-        # 生成嵌入向量
-        embeddings = self.embedding_model.encode(documents).tolist()
+        metadata_filter = MetadataFilter.from_dict(filters)
+        with self.snapshot() as generation:
+            if generation.lexical_index is None or query_texts is None:
+                batch_results = generation.backend.query(query_embeddings, top_k, search_params=search_params,
+                                                         filters=metadata_filter)
+            else:
+                candidates = max(top_k, settings.hybrid_candidates)
+                dense_batch = generation.backend.query(query_embeddings, candidates, search_params=search_params,
+                                                       filters=metadata_filter)
+                allowed_ids = generation.backend.filter_ids(metadata_filter) if metadata_filter else None
+                batch_results = [
+                    self._fuse(generation, query_text, dense_results, top_k, candidates, allowed_ids)
+                    for query_text, dense_results in zip(query_texts, dense_batch)
+                ]
+            
+            if include_embeddings:
+                self._attach_embeddings(generation, batch_results)
+            return batch_results
+    
+    @staticmethod
+    def _attach_embeddings(generation: IndexGeneration, batch_results: List[List[Dict]]):
+        """在同一代索引中一次取回所有结果的向量"""
+        ids = list({result['id'] for results in batch_results for result in results})
+        if not ids:
+            return
+        embeddings = {item['id']: item['embedding'] for item in generation.backend.get(ids, include_embeddings=True)}
+        for results in batch_results:
+            for i, result in enumerate(results):
+                results[i] = dict(result, embedding=embeddings.get(result['id']))
+    
+    @staticmethod
+    def _fuse(generation: IndexGeneration, query_text: str, dense_results: List[Dict], top_k: int,
+              candidates: int, allowed_ids: Optional[Set[str]] = None) -> List[Dict]:
+        """融合稠密与BM25检索结果"""
+        lexical_results = generation.lexical_index.search(query_text, top_k=candidates, allowed_ids=allowed_ids)
+        if not lexical_results:
+            return dense_results[:top_k]
         
-        # 添加到ChromaDB
-        self.collection.add(
-            documents=documents,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            ids=ids
-        )
+        fused = reciprocal_rank_fusion(
+            [[result['id'] for result in dense_results], [doc_id for doc_id, _ in lexical_results]],
+            k=settings.hybrid_rrf_k
+        )[:top_k]
         
-        print(f"成功添加 {len(chunks)} 个文档块")
+        by_id = {result['id']: result for result in dense_results}
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        if missing:
+            for item in generation.backend.get(missing):
+                by_id[item['id']] = dict(item, distance=None)
+        
+        results = []
+        for doc_id, score in fused:
+            if doc_id in by_id:
+                results.append(dict(by_id[doc_id], score=score))
+        return results
     
-    def query(self, query_text: str, top_k: int = 3) -> List[Dict]:
+    def query(self, query_text: str, top_k: int = 3, search_params: Optional[Dict] = None,
+              filters: Optional[Dict] = None) -> List[Dict]:
         """查询相关文档"""
-        # 生成查询向量
-        query_embedding = self.embedding_model.encode([query_text]).tolist()
-        
-        # 查询ChromaDB
-        results = self.collection.query(
-            query_embeddings=query_embedding,
-            n_results=top_k
-        )
-        
-        # 格式化结果
-        formatted_results = []
-        if results['documents']:
-            for i in range(len(results['documents'][0])):
-                formatted_results.append({
-                    'content': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i] if 'distances' in results else None
-                })
-        
-        return formatted_results
+        return self.search(self.embed_query(query_text), top_k=top_k, search_params=search_params,
+                           query_text=query_text, filters=filters)
+    
+    def query_batch(self, query_texts: List[str], top_k: int = 3,
+                    search_params: Optional[Dict] = None,
+                    filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """批量查询相关文档，结果顺序与输入一致"""
+        return self.search_batch(self.embed_queries(query_texts), top_k=top_k, search_params=search_params,
+                                 query_texts=query_texts, filters=filters)
     
     def clear(self):
         """清空集合"""
-        self.client.delete_collection(name=self.collection_name)
-        self.collection = self.client.get_or_create_collection(
-            name=self.collection_name,
-            metadata={"description": "文档知识库"}
-        )
+        with self.write_lock:
+            generation = self._generation
+            with generation.lock.write():
+                generation.backend.clear()
+                if generation.lexical_index is not None:
+                    generation.lexical_index.clear()
+            self._bump_version()
         print("向量数据库已清空")
     
     def count(self) -> int:
         """获取文档数量"""
-        return self.collection.count()
+        return self.backend.count()
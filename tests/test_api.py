@@ -5,6 +5,7 @@ import time
 import subprocess
 import sys
 import os
+import threading
 from pathlib import Path
 
 
@@ -118,6 +119,8 @@ def test_query(question):
         result = response.json()
         print(f"   回答: {result['answer'][:200]}...")
         print(f"   相关文档数: {len(result['retrieved_docs'])}")
+        if result.get('compression'):
+            print(f"   压缩比: {result['compression']['ratio']:.2f}")
         
         if result['retrieved_docs']:
             print("   相关文档:")
@@ -150,12 +153,171 @@ def test_query_with_history():
     if response.status_code == 200:
         result = response.json()
         print(f"   回答: {result['answer'][:200]}...")
+        usage = result.get('token_usage')
+        if usage:
+            print(f"   提示词 token: {usage}")
+            assert not usage['budget'] or usage['total'] <= usage['budget']
+    print()
+
+
+def test_query_batch(questions):
+    """测试批量查询"""
+    print(f"6. 测试批量查询: {len(questions)} 个问题")
+    response = requests.post(
+        f"{BASE_URL}/query/batch",
+        json={"queries": questions, "max_concurrency": 2}
+    )
+    print(f"   状态码: {response.status_code}")
+    
+    if response.status_code == 200:
+        results = response.json()["results"]
+        assert len(results) == len(questions)
+        for question, result in zip(questions, results):
+            print(f"   {question} -> {result['answer'][:50]}...")
+    else:
+        print(f"   错误: {response.text}")
+    print()
+
+
+def test_query_with_filters(question):
+    """测试带元数据过滤的查询"""
+    print(f"7. 测试带过滤条件的查询: '{question}'")
+    response = requests.post(
+        f"{BASE_URL}/query",
+        json={"query": question, "filters": {"type": [".md", ".txt"]}}
+    )
+    print(f"   状态码: {response.status_code}")
+    
+    if response.status_code == 200:
+        result = response.json()
+        for doc in result['retrieved_docs']:
+            assert doc['metadata'].get('type') in (".md", ".txt")
+        print(f"   相关文档数: {len(result['retrieved_docs'])}")
+    else:
+        print(f"   错误: {response.text}")
+    
+    # 不支持的过滤字段返回 400
+    response = requests.post(
+        f"{BASE_URL}/query",
+        json={"query": question, "filters": {"author": "someone"}}
+    )
+    assert response.status_code == 400
+    print()
+
+
+def test_cache_stats():
+    """测试缓存统计"""
+    print("8. 测试缓存统计...")
+    response = requests.get(f"{BASE_URL}/cache/stats")
+    print(f"   状态码: {response.status_code}")
+    if response.status_code == 200:
+        result = response.json()
+        stats = result["query_embedding"]
+        print(f"   集合 {result['collection']} 查询向量缓存: 命中 {stats['hits']} / 未命中 {stats['misses']}")
+    
+    # 按集合查看答案缓存，不存在的集合返回 404
+    response = requests.get(f"{BASE_URL}/cache/stats", params={"collection": "no-such-tenant"})
+    assert response.status_code == 404
+    print()
+
+
+def test_metrics():
+    """测试查询编码微批处理指标"""
+    print("9. 测试微批处理指标...")
+    response = requests.get(f"{BASE_URL}/metrics")
+    print(f"   状态码: {response.status_code}")
+    if response.status_code == 200:
+        stats = response.json()["query_encoding"]
+        if stats:
+            print(f"   批次数: {stats['batch_size']['count']}，平均批大小: {stats['batch_size']['mean']:.2f}")
+            print(f"   平均排队等待: {stats['queue_wait_ms']['mean']:.2f} ms")
+    
+    response = requests.get(f"{BASE_URL}/metrics", params={"format": "prometheus"})
+    assert response.status_code == 200
+    response = requests.get(f"{BASE_URL}/metrics", params={"collection": "no-such-tenant"})
+    assert response.status_code == 404
+    print()
+
+
+def test_collections():
+    """测试多集合路由"""
+    print("10. 测试多集合...")
+    response = requests.get(f"{BASE_URL}/collections")
+    print(f"   状态码: {response.status_code}")
+    if response.status_code == 200:
+        result = response.json()
+        print(f"   默认集合: {result['default']}，集合: {result['collections']}")
+    
+    response = requests.get(f"{BASE_URL}/status", params={"collection": result['default']})
+    assert response.status_code == 200
+    assert response.json()['collection'] == result['default']
+    
+    # 不存在的集合返回 404，不合法的名称返回 400
+    response = requests.post(f"{BASE_URL}/query", json={"query": "测试", "collection": "no-such-tenant"})
+    assert response.status_code == 404
+    response = requests.get(f"{BASE_URL}/status", params={"collection": "../x"})
+    assert response.status_code == 400
+    print()
+
+
+def test_full_reload():
+    """测试全量重建期间查询不中断"""
+    print("11. 测试全量重建期间的查询...")
+    before = requests.get(f"{BASE_URL}/status").json()
+    
+    # 重建期间并发查询，每个查询都应读取到完整的旧索引或新索引
+    results = []
+    def query_loop():
+        while not done.is_set():
+            response = requests.post(f"{BASE_URL}/query", json={"query": "RAG 是什么？"})
+            results.append((response.status_code, len(response.json().get('retrieved_docs', []))))
+    
+    done = threading.Event()
+    workers = [threading.Thread(target=query_loop) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    response = requests.post(f"{BASE_URL}/reload", params={"full": "true"})
+    done.set()
+    for worker in workers:
+        worker.join()
+    
+    print(f"   状态码: {response.status_code}，重建期间查询 {len(results)} 次")
+    assert response.status_code == 200
+    assert all(status == 200 for status, _ in results)
+    if before['document_count']:
+        assert all(count > 0 for _, count in results)
+    
+    after = requests.get(f"{BASE_URL}/status").json()
+    print(f"   索引: {before['index']['generation']} -> {after['index']['generation']}")
+    assert after['index']['generation'] != before['index']['generation']
+    print()
+
+
+def test_snapshot():
+    """测试索引快照导出和导入"""
+    print("12. 测试索引快照...")
+    response = requests.post(f"{BASE_URL}/snapshot/export")
+    print(f"   导出状态码: {response.status_code}")
+    assert response.status_code == 200
+    exported = response.json()
+    print(f"   快照 {exported['snapshot']}: {exported['manifest']['count']} 个文档块")
+    
+    # 导入为另一个集合，文档块数与导出时一致
+    response = requests.post(f"{BASE_URL}/snapshot/import",
+                             params={"collection": "snapshot-test", "name": exported['snapshot']})
+    print(f"   导入状态码: {response.status_code}")
+    assert response.status_code == 200
+    status = requests.get(f"{BASE_URL}/status", params={"collection": "snapshot-test"}).json()
+    assert status['document_count'] == exported['manifest']['count']
+    
+    response = requests.post(f"{BASE_URL}/snapshot/import", params={"name": "no-such-snapshot"})
+    assert response.status_code == 404
     print()
 
 
 def test_upload(file_path):
     """测试上传文档"""
-    print(f"6. 测试上传文档: {file_path}")
+    print(f"13. 测试上传文档: {file_path}")
     try:
         with open(file_path, 'rb') as f:
             files = {'file': f}
@@ -211,6 +373,13 @@ def run_all_tests():
         test_query("这个系统有什么功能？")
         test_query("RAG 是什么？")
         test_query_with_history()
+        test_query_batch(["这个系统有什么功能？", "RAG 是什么？"])
+        test_query_with_filters("RAG 是什么？")
+        test_cache_stats()
+        test_metrics()
+        test_collections()
+        test_full_reload()
+        test_snapshot()
         
         print("=" * 60)
         print("✓ 所有测试通过！")
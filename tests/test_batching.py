@@ -0,0 +1,74 @@
+"""微批调度器测试"""
+import random
+import threading
+import time
+
+import numpy as np
+
+from src.services.batching import MicroBatcher
+
+
+def slow_encode(texts):
+    """模拟耗时的批量编码：每条文本编码为 [len(text)]"""
+    time.sleep(0.01)
+    return np.array([[len(text)] for text in texts], dtype=np.float32)
+
+
+def test_results_match_requests():
+    batcher = MicroBatcher(slow_encode, max_batch_size=8, window_ms=5)
+    try:
+        results = {}
+
+        def worker(i):
+            results[i] = batcher.submit(["x" * i, "y" * (i + 1)])
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(1, 21)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i, result in results.items():
+            assert result.tolist() == [[i], [i + 1]]
+    finally:
+        batcher.close()
+
+
+def test_concurrent_requests_are_batched():
+    """编码期间排队的请求应合并进下一批，而不是退化为每批一个请求"""
+    batcher = MicroBatcher(slow_encode, max_batch_size=64, window_ms=2)
+    callers, rounds = 16, 10
+    try:
+        def worker():
+            rng = random.Random()
+            for _ in range(rounds):
+                # 错开提交时间，使大部分请求在上一批编码期间到达
+                time.sleep(rng.uniform(0, 0.01))
+                batcher.submit(["问题"])
+
+        threads = [threading.Thread(target=worker) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = batcher.stats()['batch_size']
+        assert stats['sum'] == callers * rounds
+        assert stats['mean'] >= 3
+    finally:
+        batcher.close()
+
+
+def test_max_batch_size_is_respected():
+    batcher = MicroBatcher(slow_encode, max_batch_size=4, window_ms=50)
+    try:
+        threads = [threading.Thread(target=batcher.submit, args=(["a"],)) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        buckets = batcher.stats()['batch_size']['buckets']
+        assert buckets['4'] == buckets['+Inf']
+    finally:
+        batcher.close()
@@ -0,0 +1,47 @@
+"""抽取式压缩测试"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.core.retrieval import RetrievedChunk
+from src.services.compression import GAP_MARKER, SentenceCompressor, split_sentences
+
+
+class ReadOnlyEmbedder:
+    """按关键词编码的嵌入器，与远程嵌入服务一样返回只读数组"""
+
+    def encode(self, texts):
+        embeddings = np.array([[1.0, 0.0] if "向量" in text else [0.0, 1.0] for text in texts],
+                              dtype=np.float32)
+        return np.frombuffer(embeddings.tobytes(), dtype=np.float32).reshape(embeddings.shape)
+
+
+def make_compressor(**kwargs):
+    return SentenceCompressor(SimpleNamespace(embedder=ReadOnlyEmbedder()), **kwargs)
+
+
+def test_split_sentences_roundtrip():
+    text = "第一句。第二句！Third one. 第四句\n第五句"
+    assert "".join(split_sentences(text)) == text
+
+
+def test_compress_read_only_embeddings():
+    content = "天气很好。今天下雨。向量检索很快。午饭吃面。晚上看书。周末爬山。"
+    chunk = RetrievedChunk("a", content, {"source": "a.txt"})
+    compressor = make_compressor(keep_ratio=0.1, neighbours=0, min_sentences=4)
+
+    compressed, stats = compressor.compress([1.0, 0.0], [chunk])
+
+    assert compressed[0].content == f"{GAP_MARKER}向量检索很快。{GAP_MARKER}"
+    assert compressed[0].metadata["compressed"] is True
+    assert chunk.content == content
+    assert stats["sentences"] == 6
+    assert stats["kept_sentences"] == 1
+
+
+def test_short_chunks_are_not_compressed():
+    chunk = RetrievedChunk("a", "向量检索。很快。", {})
+    compressed, stats = make_compressor(min_sentences=4).compress([1.0, 0.0], [chunk])
+
+    assert compressed[0] is chunk
+    assert stats["sentences"] == 0
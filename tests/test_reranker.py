@@ -0,0 +1,75 @@
+"""重排序器测试"""
+import threading
+import time
+from types import SimpleNamespace
+
+from src.services.reranker import Reranker
+
+
+class SlowModel:
+    """按内容长度打分的交叉编码器，每次调用耗时固定"""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.calls = 0
+
+    def predict(self, pairs, batch_size=32):
+        self.calls += 1
+        time.sleep(self.delay)
+        return [len(content) for _, content in pairs]
+
+
+def make_chunks(prefix: str):
+    return [SimpleNamespace(id=f"{prefix}-{i}", content="x" * i, score=None) for i in range(1, 6)]
+
+
+def make_reranker(model, **kwargs):
+    reranker = Reranker("fake", **kwargs)
+    reranker._model = model
+    return reranker
+
+
+def test_rerank_orders_by_score():
+    reranker = make_reranker(SlowModel(delay=0))
+    ranked, reranked = reranker.rerank("问题", make_chunks("a"), top_k=2)
+
+    assert reranked
+    assert [chunk.id for chunk in ranked] == ["a-5", "a-4"]
+    assert ranked[0].score == 5
+
+
+def test_concurrent_requests_are_queued_and_reranked():
+    """并发请求在队列容量内排队执行，而不是直接跳过重排序"""
+    model = SlowModel(delay=0.02)
+    reranker = make_reranker(model, budget_ms=1000, queue_size=8)
+    results = [None] * 8
+
+    def worker(i):
+        results[i] = reranker.rerank(f"问题{i}", make_chunks(str(i)), top_k=3)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(reranked for _, reranked in results)
+    assert all([chunk.content for chunk in ranked] == ["xxxxx", "xxxx", "xxx"] for ranked, _ in results)
+    assert reranker.skipped == 0
+    assert model.calls == 8
+
+
+def test_full_queue_keeps_retrieval_order():
+    model = SlowModel(delay=0.1)
+    reranker = make_reranker(model, budget_ms=1000, queue_size=1)
+    blocker = threading.Thread(target=reranker.rerank, args=("慢问题", make_chunks("slow"), 3))
+    blocker.start()
+    time.sleep(0.02)
+
+    chunks = make_chunks("b")
+    ranked, reranked = reranker.rerank("问题", chunks, top_k=2)
+    blocker.join()
+
+    assert not reranked
+    assert ranked == chunks[:2]
+    assert reranker.skipped == 1